@@ -33,6 +33,12 @@ Fonctionnalités principales :
         "base_geolocalize",
     ],
     "data": [
+        "security/ifn_security.xml",
+        "security/ir.model.access.csv",
+        "data/ifn_cron_data.xml",
+        "data/ifn_mail_template_data.xml",
+        "views/ifn_import_job_views.xml",
+        "wizard/ifn_import_partner_views.xml",
     ],
     "demo": [
     ],
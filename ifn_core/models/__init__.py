@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from . import ifn_mixin
+from . import ifn_geo
+from . import ifn_search
 from . import res_partner
 from . import ifn_market
 from . import ifn_coop
@@ -8,4 +11,9 @@ from . import ifn_product_category_ref
 from . import ifn_settings
 from . import ifn_audit_log
 from . import ifn_kpi_snapshot
-from . import ifn_mixin
\ No newline at end of file
+from . import ifn_data_check
+from . import ifn_partner_import
+from . import ifn_import_job
+from . import ifn_qr_regeneration_job
+from . import ifn_qr_backup
+from . import ifn_attestation_cache
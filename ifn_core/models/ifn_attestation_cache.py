@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+import psycopg2
+from lxml import etree
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class IFNAttestationCache(models.Model):
+    """Cache des attestations PDF rendues, stockées dans le filestore
+
+    Une entrée est valable pour une version IFN du partenaire et une variante
+    de rendu (rapport, empreinte du template, options, société) : toute
+    modification du partenaire, du template ou de la société produit une
+    nouvelle clé. Une entrée rendue avant la dernière modification du marché
+    ou de la coopérative du partenaire est périmée. L'éviction supprime
+    les entrées périmées puis les moins récemment utilisées. Un PDF servi
+    depuis le cache porte la date de génération de son premier rendu.
+    """
+    _name = 'ifn.attestation.cache'
+    _description = 'Cache des attestations IFN'
+    _order = 'last_access desc, id desc'
+    _sql_constraints = [
+        ('unique_partner_version_variant', 'unique(partner_id, version, variant_key)',
+         'Cette attestation est déjà en cache !'),
+    ]
+
+    partner_id = fields.Many2one('res.partner', string='Partenaire', required=True, index=True,
+                                 ondelete='cascade', readonly=True)
+    version = fields.Integer('Version IFN', required=True, readonly=True)
+    attestation_type = fields.Char('Type d\'attestation', readonly=True)
+    layout = fields.Char('Mise en page', readonly=True)
+    report_name = fields.Char('Rapport', readonly=True)
+    template_checksum = fields.Char('Empreinte du template', readonly=True)
+    variant_key = fields.Char('Clé de variante', required=True, index=True, readonly=True,
+                              help='Empreinte du rapport, du template et des options de rendu')
+    attachment_id = fields.Many2one('ir.attachment', string='PDF', required=True,
+                                    ondelete='cascade', readonly=True)
+    related_write_date = fields.Datetime('Référentiels au', readonly=True,
+                                         help='Dernière modification du marché et de la coopérative '
+                                              'du partenaire au moment du rendu')
+    file_size = fields.Integer('Taille (octets)', readonly=True)
+    last_access = fields.Datetime('Dernier accès', required=True, index=True,
+                                  default=fields.Datetime.now, readonly=True)
+
+    @api.model
+    def _ifn_template_checksum(self, report):
+        """Empreinte SHA1 de l'architecture combinée du template du rapport"""
+        view = self.env['ir.ui.view'].sudo().search([('key', '=', report.report_name)], limit=1)
+        arch = etree.tostring(view._get_combined_arch()) if view else b''
+        return hashlib.sha1(arch).hexdigest()
+
+    @api.model
+    def _ifn_variant(self, report, data=None):
+        """Composantes de la clé de cache communes à tous les partenaires d'un rendu"""
+        options = (data or {}).get('options', {})
+        checksum = self._ifn_template_checksum(report)
+        company = self.env.company
+        variant_key = hashlib.sha1(json.dumps({
+            'report': report.report_name,
+            'checksum': checksum,
+            'options': options,
+            'company': [company.id, company.write_date],
+        }, sort_keys=True, default=str).encode()).hexdigest()
+        return {
+            'attestation_type': options.get('attestation_type'),
+            'layout': options.get('layout_template'),
+            'report_name': report.report_name,
+            'template_checksum': checksum,
+            'variant_key': variant_key,
+        }
+
+    @api.model
+    def _ifn_related_write_date(self, partner):
+        """Dernière modification du marché et de la coopérative imprimés sur l'attestation"""
+        dates = [record.write_date for record in (partner.x_ifn_market_id, partner.x_ifn_coop_id) if record]
+        return max(dates) if dates else False
+
+    def _ifn_is_fresh(self):
+        """L'entrée correspond à la version du partenaire et à l'état de ses référentiels"""
+        self.ensure_one()
+        if self.version != self.partner_id.x_ifn_version:
+            return False
+        related_date = self._ifn_related_write_date(self.partner_id)
+        return not related_date or bool(self.related_write_date and self.related_write_date >= related_date)
+
+    @api.model
+    def _ifn_lookup(self, partners, variant):
+        """Entrées à jour des partenaires pour la variante : {partner_id: entrée}"""
+        entries = self.search([
+            ('partner_id', 'in', partners.ids),
+            ('variant_key', '=', variant['variant_key']),
+        ])
+        hits = entries.filtered(lambda entry: entry._ifn_is_fresh())
+        if hits:
+            hits.write({'last_access': fields.Datetime.now()})
+        return {entry.partner_id.id: entry for entry in hits}
+
+    @api.model
+    def _ifn_store(self, partners, variant, pdfs):
+        """Met en cache les PDF rendus {partner_id: pdf} : retourne {partner_id: entrée}"""
+        partners = partners.filtered(lambda partner: pdfs.get(partner.id))
+        if not partners:
+            return {}
+
+        # Entrées de même clé périmées par une modification du marché ou de la coopérative
+        stale = self.search([
+            ('partner_id', 'in', partners.ids),
+            ('variant_key', '=', variant['variant_key']),
+        ]).filtered(lambda entry: entry.version == entry.partner_id.x_ifn_version)
+        if stale:
+            stale_attachments = stale.attachment_id
+            stale.unlink()
+            stale_attachments.unlink()
+
+        attachments = self.env['ir.attachment'].sudo().create([{
+            'name': f"attestation_{partner.x_ifn_uid or partner.id}_v{partner.x_ifn_version}.pdf",
+            'type': 'binary',
+            'raw': pdfs[partner.id],
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+        } for partner in partners])
+        try:
+            with self.env.cr.savepoint():
+                entries = self.create([dict(
+                    variant,
+                    partner_id=partner.id,
+                    version=partner.x_ifn_version,
+                    related_write_date=self._ifn_related_write_date(partner),
+                    attachment_id=attachment.id,
+                    file_size=len(pdfs[partner.id]),
+                ) for partner, attachment in zip(partners, attachments)])
+        except psycopg2.IntegrityError:
+            # Rendu concurrent des mêmes attestations : les entrées existent déjà
+            attachments.unlink()
+            return self._ifn_lookup(partners, variant)
+        return {entry.partner_id.id: entry for entry in entries}
+
+    @api.model
+    def _cron_evict_attestation_cache(self):
+        """Supprime les entrées périmées ou inutilisées, puis les plus anciennes au-delà de la taille maximale
+
+        Une entrée est périmée quand la version IFN du partenaire a changé ou
+        que son marché ou sa coopérative a été modifié depuis le rendu ;
+        la taille totale est ramenée sous la limite en conservant les entrées
+        les plus récemment utilisées (LRU).
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_idle_days = int(ICP.get_param('ifn_core.attestation_cache_max_idle_days', '30'))
+        max_size = int(ICP.get_param('ifn_core.attestation_cache_max_size_mb', '500')) * 1024 * 1024
+
+        self.flush_model()
+        self.env['res.partner'].flush_model(['x_ifn_version', 'x_ifn_market_id', 'x_ifn_coop_id'])
+        self.env['ifn.market'].flush_model(['write_date'])
+        self.env['ifn.coop'].flush_model(['write_date'])
+        # Taille cumulée calculée sur les seules entrées conservées par les deux premiers critères
+        self.env.cr.execute("""
+            WITH entries AS (
+                SELECT c.id, c.file_size, c.last_access,
+                       (c.version != COALESCE(p.x_ifn_version, 0)
+                        OR m.write_date > COALESCE(c.related_write_date, '-infinity')
+                        OR co.write_date > COALESCE(c.related_write_date, '-infinity')
+                        OR (%(days)s > 0 AND c.last_access < %(cutoff)s)) AS stale
+                  FROM ifn_attestation_cache c
+                  JOIN res_partner p ON p.id = c.partner_id
+             LEFT JOIN ifn_market m ON m.id = p.x_ifn_market_id
+             LEFT JOIN ifn_coop co ON co.id = p.x_ifn_coop_id
+            ), ranked AS (
+                SELECT id, sum(file_size) OVER (ORDER BY last_access DESC, id DESC) AS cumulated_size
+                  FROM entries
+                 WHERE NOT stale
+            )
+            SELECT id FROM entries WHERE stale
+             UNION ALL
+            SELECT id FROM ranked WHERE %(max_size)s > 0 AND cumulated_size > %(max_size)s
+        """, {
+            'days': max_idle_days,
+            'cutoff': fields.Datetime.now() - timedelta(days=max_idle_days),
+            'max_size': max_size,
+        })
+        evicted = self.browse([row[0] for row in self.env.cr.fetchall()])
+        attachments = evicted.attachment_id
+        evicted.unlink()
+        attachments.unlink()
+
+        # PDF dont l'entrée a disparu (partenaire supprimé)
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM ir_attachment a
+             WHERE a.res_model = %s
+               AND NOT EXISTS (SELECT 1 FROM ifn_attestation_cache c WHERE c.attachment_id = a.id)
+        """, [self._name])
+        orphans = self.env['ir.attachment'].sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        orphans.unlink()
+        _logger.info(f"Attestation cache eviction: {len(evicted)} entries and {len(orphans)} orphan PDFs removed")
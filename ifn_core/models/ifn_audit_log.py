@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import base64
+from collections import defaultdict
+from datetime import timedelta
 from odoo import models, fields, api, _
 import json
 import logging
@@ -141,28 +143,29 @@ class IFNAuditLog(models.Model):
             else:
                 log.object_reference = ''
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """Création avec génération d'ID événement unique"""
-        if not vals.get('event_id'):
-            vals['event_id'] = self._generate_event_id()
+        for vals in vals_list:
+            if not vals.get('event_id'):
+                vals['event_id'] = self._generate_event_id()
 
-        # Auto-détection IP et User Agent depuis le contexte
-        if not vals.get('ip_address') and self.env.context.get('audit_ip'):
-            vals['ip_address'] = self.env.context['audit_ip']
-        if not vals.get('user_agent') and self.env.context.get('audit_user_agent'):
-            vals['user_agent'] = self.env.context['audit_user_agent']
+            # Auto-détection IP et User Agent depuis le contexte
+            if not vals.get('ip_address') and self.env.context.get('audit_ip'):
+                vals['ip_address'] = self.env.context['audit_ip']
+            if not vals.get('user_agent') and self.env.context.get('audit_user_agent'):
+                vals['user_agent'] = self.env.context['audit_user_agent']
 
-        # Auto-détection de la sévérité selon l'action
-        if not vals.get('severity'):
-            vals['severity'] = self._detect_severity(vals.get('action'))
+            # Auto-détection de la sévérité selon l'action
+            if not vals.get('severity'):
+                vals['severity'] = self._detect_severity(vals.get('action'))
 
-        log = super().create(vals)
+        logs = super().create(vals_list)
 
         # Vérification d'anomalies
-        log._check_for_anomalies()
+        logs._check_for_anomalies()
 
-        return log
+        return logs
 
     def _generate_event_id(self):
         """Génère un ID d'événement unique"""
@@ -193,28 +196,37 @@ class IFNAuditLog(models.Model):
 
     def _check_for_anomalies(self):
         """Vérifie les anomalies potentielles"""
-        self.ensure_one()
+        # Les logs d'un même lot partagent utilisateur, IP et date de création :
+        # une seule vérification par groupe au lieu d'une recherche par log
+        groups = defaultdict(lambda: self.browse())
+        for log in self:
+            groups[(log.user_id, log.ip_address, log.create_date)] |= log
+
+        for (user, ip_address, create_date), logs in groups.items():
+            vals = {}
+
+            # Anomalie: accès depuis nouvelle IP
+            recent_logs = self.search([
+                ('user_id', '=', user.id),
+                ('create_date', '>=', fields.Datetime.now() - timedelta(hours=24)),
+                ('ip_address', '!=', ip_address),
+            ], limit=5)
+
+            if ip_address and not any(log.ip_address == ip_address for log in recent_logs):
+                vals.update(is_anomaly=True, requires_action=True)
+
+            # Anomalie: activité suspecte (horaires inhabituels)
+            hour = create_date.hour
+            if hour < 6 or hour > 22:  # Activité nocturne
+                vals['is_suspicious'] = True
+
+            if vals:
+                logs.write(vals)
 
-        # Anomalie: accès depuis nouvelle IP
-        recent_logs = self.search([
-            ('user_id', '=', self.user_id.id),
-            ('create_date', '>=', fields.Datetime.now() - timedelta(hours=24)),
-            ('ip_address', '!=', self.ip_address),
-        ], limit=5)
-
-        if self.ip_address and not any(log.ip_address == self.ip_address for log in recent_logs):
-            self.is_anomaly = True
-            self.requires_action = True
-
-        # Anomalie: activité suspecte (horaires inhabituels)
-        hour = self.create_date.hour
-        if hour < 6 or hour > 22:  # Activité nocturne
-            self.is_suspicious = True
-
-        # Critique: modification de permissions par non-admin
-        if self.action in ['role_changed', 'permission_change'] and not self.user_id.has_group('base.group_system'):
-            self.severity = 'critical'
-            self.requires_action = True
+            # Critique: modification de permissions par non-admin
+            permission_logs = logs.filtered(lambda l: l.action in ['role_changed', 'permission_change'])
+            if permission_logs and not user.has_group('base.group_system'):
+                permission_logs.write({'severity': 'critical', 'requires_action': True})
 
     def action_mark_reviewed(self):
         """Marque le log comme vérifié"""
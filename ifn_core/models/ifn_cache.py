@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def _version_sequence(name):
+    return f'ifn_cache_version_{name}_seq'
+
+
+def ensure_cache_version(cr, name):
+    """Crée la séquence de version du cache `name` (à appeler depuis init())"""
+    cr.execute(f'CREATE SEQUENCE IF NOT EXISTS "{_version_sequence(name)}"')
+
+
+def get_cache_version(cr, name):
+    """Version courante du cache `name`, partagée par tous les workers"""
+    cr.execute(f'SELECT last_value FROM "{_version_sequence(name)}"')
+    return cr.fetchone()[0]
+
+
+def bump_cache_version(env, name):
+    """Change la version du cache `name` après le commit de la transaction courante
+
+    Les séquences ne sont pas transactionnelles : incrémenter avant le commit
+    ferait reconstruire les autres lecteurs depuis des données non validées,
+    et l'incrément survivrait à un rollback. Jusqu'au commit, la transaction
+    courante lit une reconstruction locale (voir get_versioned_cache).
+    """
+    data = env.cr.postcommit.data
+    bumped = data.setdefault('ifn_cache_versions', set())
+    if not bumped:
+        registry = env.registry
+
+        def bump_after_commit():
+            with registry.cursor() as cr:
+                for bumped_name in bumped:
+                    cr.execute("SELECT nextval(%s)", [_version_sequence(bumped_name)])
+
+        env.cr.postcommit.add(bump_after_commit)
+    bumped.add(name)
+    data.setdefault('ifn_cache_local', {}).pop(name, None)
+
+
+def get_versioned_cache(env, name, build):
+    """Valeur du cache `name` dans ce processus, reconstruite par `build()` quand sa version change
+
+    Une seule valeur est conservée par cache (pas d'accumulation des versions
+    successives) ; l'invalidation ne touche que ce cache, pas l'ormcache.
+    Une transaction qui a modifié les données du cache lit une valeur
+    reconstruite pour elle seule, abandonnée au commit ou au rollback.
+    """
+    data = env.cr.postcommit.data
+    if name in data.get('ifn_cache_versions', ()):
+        local = data.setdefault('ifn_cache_local', {})
+        if name not in local:
+            local[name] = build()
+        return local[name]
+
+    version = get_cache_version(env.cr, name)
+    caches = env.registry.__dict__.setdefault('_ifn_versioned_caches', {})
+    cached = caches.get(name)
+    if cached and cached[0] == version:
+        return cached[1]
+    value = build()
+    caches[name] = (version, value)
+    return value
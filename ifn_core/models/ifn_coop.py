@@ -6,6 +6,7 @@ from odoo.exceptions import ValidationError
 
 class IFNCoop(models.Model):
     _name = 'ifn.coop'
+    _inherit = ['ifn.geo.mixin', 'ifn.search.mixin']
     _description = 'Coopérative IFN'
     _order = 'market_id, code'
     _rec_name = 'display_name'
@@ -14,8 +15,8 @@ class IFNCoop(models.Model):
     ]
 
     # Informations générales
-    name = fields.Char('Nom de la coopérative', required=True, translate=True)
-    code = fields.Char('Code coopérative', required=True, size=10,
+    name = fields.Char('Nom de la coopérative', required=True, translate=True, index='trigram')
+    code = fields.Char('Code coopérative', required=True, size=10, index='trigram',
                       help='Code interne unique de la coopérative')
     display_name = fields.Char('Nom affiché', compute='_compute_display_name', store=True)
 
@@ -69,10 +70,10 @@ class IFNCoop(models.Model):
     zone_ids = fields.Many2many('ifn.zone', string='Zones couvertes')
 
     # Statistiques
-    member_count = fields.Integer('Nombre de membres',
-                                 compute='_compute_counts', store=True)
-    active_member_count = fields.Integer('Membres actifs',
-                                        compute='_compute_counts', store=True)
+    member_count = fields.Integer('Nombre de membres', readonly=True, copy=False,
+                                 help='Membres actifs et archivés, tenu à jour par res.partner')
+    active_member_count = fields.Integer('Membres actifs', readonly=True, copy=False,
+                                        help='Membres actifs, tenu à jour par res.partner')
 
     @api.depends('name', 'code', 'market_id')
     def _compute_display_name(self):
@@ -86,21 +87,7 @@ class IFNCoop(models.Model):
 
     @api.depends('partner_latitude', 'partner_longitude')
     def _compute_geo_point(self):
-        for coop in self:
-            if coop.partner_latitude and coop.partner_longitude:
-                coop.geo_point = fields.GeoPoint.from_latlon(
-                    cr=self.env.cr,
-                    latitude=coop.partner_latitude,
-                    longitude=coop.partner_longitude
-                )
-            else:
-                coop.geo_point = False
-
-    @api.depends('partner_ids', 'partner_ids.active')
-    def _compute_counts(self):
-        for coop in self:
-            coop.member_count = len(coop.partner_ids)
-            coop.active_member_count = len(coop.partner_ids.filtered('active'))
+        self._ifn_compute_geo_points()
 
     @api.constrains('partner_latitude', 'partner_longitude')
     def _check_coordinates(self):
@@ -174,10 +161,13 @@ class IFNCoop(models.Model):
         return result
 
     @api.model
-    def name_search(self, name='', args=None, operator='ilike', limit=100):
-        args = args or []
-        domain = []
-        if name:
-            domain = ['|', ('name', operator, name), ('code', operator, name)]
-        coops = self.search(domain + args, limit=limit)
-        return coops.name_get()
\ No newline at end of file
+    def find_nearest_coops(self, lat, lng, k=5, radius_km=None, market_id=None):
+        """Retourne les k coopératives actives les plus proches d'un point, avec leur distance"""
+        domain = [('market_id', '=', market_id)] if market_id else []
+        return [{
+            'id': coop.id,
+            'name': coop.display_name,
+            'code': coop.code,
+            'market_id': coop.market_id.id,
+            'distance_km': round(distance, 3),
+        } for coop, distance in self._ifn_find_nearest(lat, lng, k=k, radius_km=radius_km, domain=domain)]
\ No newline at end of file
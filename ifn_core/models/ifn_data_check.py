@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from datetime import timedelta
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class IFNDataCheckResult(models.Model):
+    _name = 'ifn.data.check.result'
+    _description = 'Résultat contrôle de cohérence IFN'
+    _order = 'run_date desc, rule_code'
+    _rec_name = 'rule_name'
+
+    # Exécution
+    run_date = fields.Datetime('Date du contrôle', required=True, index=True,
+                               default=fields.Datetime.now, readonly=True)
+
+    # Règle
+    rule_code = fields.Char('Code règle', required=True, index=True, readonly=True)
+    rule_name = fields.Char('Règle', readonly=True)
+    object_model = fields.Char('Modèle objet', readonly=True,
+                               help='Modèle des enregistrements en anomalie')
+    severity = fields.Selection([
+        ('low', 'Faible'),
+        ('medium', 'Moyen'),
+        ('high', 'Élevé'),
+    ], string='Sévérité', default='medium', readonly=True)
+
+    # Résultats
+    record_count = fields.Integer('Nombre d\'anomalies', readonly=True)
+    sample_ids = fields.Text('Exemples', readonly=True,
+                             help='JSON des IDs d\'un échantillon d\'enregistrements en anomalie')
+
+    @api.model
+    def _get_consistency_rules(self):
+        """Retourne les règles de cohérence
+
+        Chaque règle est une requête SQL ensembliste qui retourne la colonne
+        `id` des enregistrements en anomalie.
+        """
+        return [
+            {
+                'code': 'partner_coop_market_mismatch',
+                'name': _('Marché de la coopérative différent du marché du partenaire'),
+                'model': 'res.partner',
+                'severity': 'medium',
+                'query': """
+                    SELECT p.id
+                      FROM res_partner p
+                      JOIN ifn_coop c ON c.id = p.x_ifn_coop_id
+                     WHERE p.active AND p.x_ifn_role IS NOT NULL
+                       AND c.market_id IS DISTINCT FROM p.x_ifn_market_id
+                """,
+            },
+            {
+                'code': 'partner_geo_point_missing',
+                'name': _('Coordonnées renseignées sans position géographique'),
+                'model': 'res.partner',
+                'severity': 'low',
+                'query': """
+                    SELECT id
+                      FROM res_partner
+                     WHERE active AND x_ifn_role IS NOT NULL
+                       AND x_ifn_geo_lat IS NOT NULL AND x_ifn_geo_lat != 0
+                       AND x_ifn_geo_lng IS NOT NULL AND x_ifn_geo_lng != 0
+                       AND x_ifn_geo_point IS NULL
+                """,
+            },
+            {
+                'code': 'partner_duplicate_uid',
+                'name': _('UID IFN partagé par plusieurs partenaires'),
+                'model': 'res.partner',
+                'severity': 'high',
+                'query': """
+                    SELECT id
+                      FROM res_partner
+                     WHERE x_ifn_uid IN (
+                            SELECT x_ifn_uid
+                              FROM res_partner
+                             WHERE x_ifn_uid IS NOT NULL
+                          GROUP BY x_ifn_uid
+                            HAVING count(*) > 1)
+                """,
+            },
+            {
+                'code': 'partner_validated_incomplete',
+                'name': _('Profil validé sans marché ou sans consentement données'),
+                'model': 'res.partner',
+                'severity': 'high',
+                'query': """
+                    SELECT id
+                      FROM res_partner
+                     WHERE active AND x_ifn_profile_status = 'validated'
+                       AND (x_ifn_market_id IS NULL
+                            OR NOT COALESCE(x_ifn_data_processing_consent, FALSE))
+                """,
+            },
+            {
+                'code': 'coop_manager_without_coop',
+                'name': _('Gestionnaire de coopérative sans coopérative'),
+                'model': 'res.partner',
+                'severity': 'medium',
+                'query': """
+                    SELECT id
+                      FROM res_partner
+                     WHERE active AND x_ifn_role = 'coop_manager'
+                       AND x_ifn_coop_id IS NULL
+                """,
+            },
+            {
+                'code': 'market_geo_point_missing',
+                'name': _('Marché avec coordonnées sans position géographique'),
+                'model': 'ifn.market',
+                'severity': 'low',
+                'query': """
+                    SELECT id
+                      FROM ifn_market
+                     WHERE active
+                       AND partner_latitude IS NOT NULL AND partner_latitude != 0
+                       AND partner_longitude IS NOT NULL AND partner_longitude != 0
+                       AND geo_point IS NULL
+                """,
+            },
+            {
+                'code': 'coop_geo_point_missing',
+                'name': _('Coopérative avec coordonnées sans position géographique'),
+                'model': 'ifn.coop',
+                'severity': 'low',
+                'query': """
+                    SELECT id
+                      FROM ifn_coop
+                     WHERE active
+                       AND partner_latitude IS NOT NULL AND partner_latitude != 0
+                       AND partner_longitude IS NOT NULL AND partner_longitude != 0
+                       AND geo_point IS NULL
+                """,
+            },
+        ]
+
+    @api.model
+    def run_consistency_checks(self, sample_size=None):
+        """Exécute toutes les règles de cohérence et enregistre les résultats"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        if sample_size is None:
+            sample_size = int(ICP.get_param('ifn_core.data_check_sample_size', '20'))
+
+        # Les données à contrôler doivent être en base
+        self.env.flush_all()
+
+        run_date = fields.Datetime.now()
+        vals_list = []
+        for rule in self._get_consistency_rules():
+            # Une requête par règle : total des anomalies et échantillon d'IDs
+            self.env.cr.execute(f"""
+                SELECT count(*) OVER (), anomalies.id
+                  FROM ({rule['query']}) AS anomalies
+              ORDER BY anomalies.id
+                 LIMIT %s
+            """, [sample_size or 1])
+            rows = self.env.cr.fetchall()
+            record_count = rows[0][0] if rows else 0
+            sample_ids = [row[1] for row in rows] if sample_size else []
+
+            if record_count:
+                _logger.warning(f"Data check {rule['code']}: {record_count} inconsistent {rule['model']} records")
+
+            vals_list.append({
+                'run_date': run_date,
+                'rule_code': rule['code'],
+                'rule_name': rule['name'],
+                'object_model': rule['model'],
+                'severity': rule['severity'],
+                'record_count': record_count,
+                'sample_ids': json.dumps(sample_ids),
+            })
+
+        results = self.create(vals_list)
+        self._cleanup_old_results()
+        return results
+
+    @api.model
+    def _cleanup_old_results(self):
+        """Supprime les résultats de contrôle au-delà de la durée de rétention"""
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.data_check_retention_days', '90'
+        ))
+        if retention_days > 0:
+            self.search([
+                ('run_date', '<', fields.Datetime.now() - timedelta(days=retention_days))
+            ]).unlink()
+
+    def action_view_records(self):
+        """Affiche l'échantillon d'enregistrements en anomalie"""
+        self.ensure_one()
+        return {
+            'name': self.rule_name,
+            'view_mode': 'tree,form',
+            'res_model': self.object_model,
+            'domain': [('id', 'in', json.loads(self.sample_ids or '[]'))],
+            'type': 'ir.actions.act_window',
+            'context': {'active_test': False},
+        }
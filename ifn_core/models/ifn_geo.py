@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+import math
+import logging
+from collections import defaultdict
+
+from odoo import models, api, tools
+from odoo.tools import sql, split_every
+
+from .ifn_cache import ensure_cache_version, bump_cache_version, get_versioned_cache
+
+_logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+GEO_POINT_BATCH_SIZE = 10000
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distance orthodromique en km entre deux points (degrés décimaux)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGrid:
+    """Index spatial en mémoire : grille régulière de cellules lat/lng
+
+    Utilisé quand PostGIS n'est pas disponible. La recherche parcourt les
+    cellules en anneaux concentriques autour du point et s'arrête dès que
+    les k plus proches sont plus près que tout point non encore visité.
+    """
+
+    def __init__(self, points, cell_deg=0.1):
+        self.cell_deg = cell_deg
+        self.cells = defaultdict(list)
+        for record_id, lat, lng in points:
+            self.cells[self._cell(lat, lng)].append((record_id, lat, lng))
+        self.size = len(points)
+        if self.cells:
+            rows = [cell[0] for cell in self.cells]
+            cols = [cell[1] for cell in self.cells]
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _ring(self, row, col, radius):
+        """Cellules à exactement `radius` cellules (distance de Tchebychev) de (row, col)"""
+        if radius == 0:
+            yield row, col
+            return
+        for j in range(col - radius, col + radius + 1):
+            yield row - radius, j
+            yield row + radius, j
+        for i in range(row - radius + 1, row + radius):
+            yield i, col - radius
+            yield i, col + radius
+
+    def nearest(self, lat, lng, k=None, radius_km=None):
+        """Retourne [(id, distance_km)] triés par distance
+
+        `k` limite le nombre de résultats, `radius_km` la distance maximale ;
+        au moins l'un des deux doit être fourni.
+        """
+        if not self.size:
+            return []
+
+        row, col = self._cell(lat, lng)
+        # Plus petite dimension d'une cellule à cette latitude
+        cell_km = KM_PER_DEGREE * self.cell_deg * max(math.cos(math.radians(lat)), 0.01)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        if radius_km is not None:
+            max_ring = min(max_ring, int(math.ceil(radius_km / cell_km)) + 1)
+
+        found = []
+        for ring in range(max_ring + 1):
+            for cell in self._ring(row, col, ring):
+                for record_id, point_lat, point_lng in self.cells.get(cell, ()):
+                    distance = haversine_km(lat, lng, point_lat, point_lng)
+                    if radius_km is None or distance <= radius_km:
+                        found.append((distance, record_id))
+            # Tout point hors des anneaux visités est à plus de ring * cell_km
+            if k and len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= ring * cell_km:
+                    break
+
+        found.sort()
+        if k:
+            found = found[:k]
+        return [(record_id, distance) for distance, record_id in found]
+
+
+class IFNGeoMixin(models.AbstractModel):
+    """Mixin géographique IFN : index spatial et recherche de proximité"""
+    _name = 'ifn.geo.mixin'
+    _description = 'Mixin géographique IFN'
+
+    # Champs de coordonnées du modèle (à surcharger si différents)
+    _ifn_geo_lat_field = 'partner_latitude'
+    _ifn_geo_lng_field = 'partner_longitude'
+    _ifn_geo_point_field = 'geo_point'
+
+    def init(self):
+        super().init()
+        if not self._abstract:
+            self._ifn_ensure_spatial_index()
+            ensure_cache_version(self.env.cr, self._ifn_geo_cache_name())
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(self._ifn_geo_lat_field in vals or self._ifn_geo_lng_field in vals for vals in vals_list):
+            self._ifn_invalidate_geo_index()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if self._ifn_geo_lat_field in vals or self._ifn_geo_lng_field in vals:
+            self._ifn_invalidate_geo_index()
+        return result
+
+    def _ifn_compute_geo_points(self):
+        """Calcule la position géographique de tout le recordset en une requête par lot
+
+        Remplace les appels unitaires à `GeoPoint.from_latlon`, qui coûtent
+        un aller-retour en base par enregistrement.
+        """
+        lat_field, lng_field = self._ifn_geo_lat_field, self._ifn_geo_lng_field
+        point_field = self._fields[self._ifn_geo_point_field]
+
+        located_ids = []
+        for record in self:
+            if record[lat_field] and record[lng_field]:
+                located_ids.append(record.id)
+            else:
+                record[point_field.name] = False
+        located = self.browse(located_ids)
+
+        srid = getattr(point_field, 'srid', 3857)
+        for batch in split_every(GEO_POINT_BATCH_SIZE, located, self.browse):
+            # WITH ORDINALITY : les enregistrements nouveaux (NewId) n'ont pas d'id SQL
+            self.env.cr.execute("""
+                SELECT ST_Transform(ST_SetSRID(ST_MakePoint(t.lng, t.lat), 4326), %s)
+                  FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS t(lat, lng, idx)
+              ORDER BY t.idx
+            """, [srid, batch.mapped(lat_field), batch.mapped(lng_field)])
+            for record, (wkb,) in zip(batch, self.env.cr.fetchall()):
+                record[point_field.name] = point_field.load_geo(wkb)
+
+    @tools.ormcache()
+    def _ifn_has_postgis(self):
+        """Indique si l'extension PostGIS est installée sur la base"""
+        self.env.cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+        return bool(self.env.cr.fetchone())
+
+    def _ifn_ensure_spatial_index(self, column=None):
+        """Crée l'index GiST sur la position géographique (ou `column`) si PostGIS est présent"""
+        if not self._ifn_has_postgis():
+            return
+        column = column or self._ifn_geo_point_field
+        index_name = f'{self._table}_{column}_gist_index'
+        if not sql.index_exists(self.env.cr, index_name):
+            sql.create_index(self.env.cr, index_name, self._table, [f'"{column}"'], method='gist')
+
+    def _ifn_geo_cache_name(self):
+        return f'{self._table}_geo'
+
+    def _ifn_invalidate_geo_index(self):
+        """Invalide la grille en mémoire (inutile avec PostGIS) en changeant sa version"""
+        if not self._ifn_has_postgis():
+            bump_cache_version(self.env, self._ifn_geo_cache_name())
+
+    def _ifn_get_geo_grid(self):
+        """Grille en mémoire des enregistrements géolocalisés, reconstruite quand sa version change"""
+        return get_versioned_cache(self.env, self._ifn_geo_cache_name(), self._ifn_build_geo_grid)
+
+    def _ifn_build_geo_grid(self):
+        """Construit la grille en mémoire des enregistrements géolocalisés"""
+        lat_field, lng_field = self._ifn_geo_lat_field, self._ifn_geo_lng_field
+        self.flush_model([lat_field, lng_field])
+        self.env.cr.execute(f"""
+            SELECT id, "{lat_field}", "{lng_field}"
+              FROM "{self._table}"
+             WHERE "{lat_field}" IS NOT NULL AND "{lat_field}" != 0
+               AND "{lng_field}" IS NOT NULL AND "{lng_field}" != 0
+        """)
+        points = [(record_id, float(lat), float(lng)) for record_id, lat, lng in self.env.cr.fetchall()]
+        _logger.info(f"Built in-memory geo grid for {self._name} ({len(points)} points)")
+        return GeoGrid(points)
+
+    def _ifn_postgis_nearest(self, lat, lng, limit, offset=0, radius_km=None):
+        """Candidats les plus proches via l'index GiST : [(id, distance_km)]"""
+        column = self._ifn_geo_point_field
+        params = {
+            'lat': lat,
+            'lng': lng,
+            'srid': getattr(self._fields[column], 'srid', 3857),
+            'limit': limit,
+            'offset': offset,
+        }
+        radius_clause = ''
+        if radius_km is not None:
+            # Préfiltre indexé dans la projection (mètres Mercator = mètres / cos(lat)),
+            # puis contrôle exact de la distance sur la sphère
+            params['radius_m'] = radius_km * 1000.0
+            params['radius_proj'] = radius_km * 1000.0 / max(math.cos(math.radians(lat)), 0.01)
+            radius_clause = f"""
+               AND ST_DWithin(t."{column}", target.geom, %(radius_proj)s)
+               AND ST_DistanceSphere(ST_Transform(t."{column}", 4326), target.geom_4326) <= %(radius_m)s
+            """
+        self.env.cr.execute(f"""
+            WITH target AS (
+                SELECT ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326) AS geom_4326,
+                       ST_Transform(ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326), %(srid)s) AS geom
+            )
+            SELECT t.id, ST_DistanceSphere(ST_Transform(t."{column}", 4326), target.geom_4326) / 1000.0
+              FROM "{self._table}" t, target
+             WHERE t."{column}" IS NOT NULL {radius_clause}
+          ORDER BY t."{column}" <-> target.geom
+             LIMIT %(limit)s OFFSET %(offset)s
+        """, params)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _ifn_find_nearest(self, lat, lng, k=5, radius_km=None, domain=None):
+        """Retourne [(enregistrement, distance_km)] des plus proches, triés par distance
+
+        `k` limite le nombre de résultats (None : tous ceux du rayon) ; le
+        domaine et les règles d'accès sont appliqués aux candidats de l'index.
+        """
+        if lat is None or lng is None or (not k and radius_km is None):
+            return []
+
+        use_postgis = self._ifn_has_postgis()
+        grid = None if use_postgis else self._ifn_get_geo_grid()
+        batch_size = max((k or 100) * 4, 50)
+
+        results = []
+        offset = 0
+        while True:
+            if use_postgis:
+                candidates = self._ifn_postgis_nearest(lat, lng, batch_size, offset, radius_km)
+            else:
+                candidates = grid.nearest(lat, lng, k=offset + batch_size, radius_km=radius_km)[offset:]
+            offset += batch_size
+
+            if candidates:
+                distances = dict(candidates)
+                allowed = self.search([('id', 'in', list(distances))] + (domain or []))
+                results.extend((record, distances[record.id]) for record in allowed)
+
+            if len(candidates) < batch_size or (k and len(results) >= k):
+                break
+
+        results.sort(key=lambda item: item[1])
+        return results[:k] if k else results
@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import gzip
+import io
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .ifn_partner_import import MAX_ERROR_LINES, is_concurrency_error
+
+_logger = logging.getLogger(__name__)
+
+# Cron de pré-passe (en premier) puis crons workers traitant les plages en parallèle
+IMPORT_CRON_XMLIDS = (
+    'ifn_core.ir_cron_ifn_import_jobs',
+    'ifn_core.ir_cron_ifn_import_worker_2',
+    'ifn_core.ir_cron_ifn_import_worker_3',
+    'ifn_core.ir_cron_ifn_import_worker_4',
+)
+# Délai sans activité après lequel une plage « en cours » est reprise par un autre worker
+RANGE_STALE_MINUTES = 30
+# Nombre d'essais d'un lot en cas de conflit de concurrence entre workers
+CHUNK_MAX_TRIES = 5
+
+
+class IFNImportJob(models.Model):
+    _name = 'ifn.import.job'
+    _inherit = ['ifn.partner.import.mixin']
+    _description = 'Tâche d\'import partenaires IFN'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char('Nom', required=True, default=lambda self: _('Import partenaires'))
+    state = fields.Selection([
+        ('queued', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+        ('cancelled', 'Annulé'),
+    ], string='État', default='queued', required=True, index=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='Lancé par', readonly=True,
+                              default=lambda self: self.env.user)
+
+    # Fichier
+    attachment_id = fields.Many2one('ir.attachment', string='Fichier', required=True,
+                                    ondelete='cascade', readonly=True)
+    import_filename = fields.Char('Nom du fichier', readonly=True)
+
+    # Avancement : cumul des plages traitées en parallèle
+    range_ids = fields.One2many('ifn.import.job.range', 'job_id', string='Plages de lignes', readonly=True)
+    rows_expected = fields.Integer('Lignes du fichier', readonly=True)
+    rows_done = fields.Integer('Lignes traitées', compute='_compute_range_stats',
+                               help='Nombre de lignes déjà traitées et validées en base')
+    progress = fields.Float('Progression (%)', compute='_compute_progress')
+    imported_count = fields.Integer('Importés', compute='_compute_range_stats',
+                                    help='En simulation : lignes qui seraient importées')
+    skipped_count = fields.Integer('Ignorés', compute='_compute_range_stats')
+    error_count = fields.Integer('Erreurs', compute='_compute_range_stats')
+    result_line_ids = fields.One2many('ifn.import.result.line', 'job_id', string='Résultats par ligne',
+                                      readonly=True)
+    errors = fields.Text('Erreurs détaillées', compute='_compute_errors')
+    last_error = fields.Text('Dernière erreur bloquante', readonly=True)
+    date_started = fields.Datetime('Début', readonly=True)
+    date_finished = fields.Datetime('Fin', readonly=True)
+
+    @api.depends('range_ids.rows_done', 'range_ids.imported_count', 'range_ids.skipped_count',
+                 'range_ids.error_count')
+    def _compute_range_stats(self):
+        for job in self:
+            job.rows_done = sum(job.range_ids.mapped('rows_done'))
+            job.imported_count = sum(job.range_ids.mapped('imported_count'))
+            job.skipped_count = sum(job.range_ids.mapped('skipped_count'))
+            job.error_count = sum(job.range_ids.mapped('error_count'))
+
+    @api.depends('error_count')
+    def _compute_errors(self):
+        """Résumé des premières erreurs ; le détail complet est téléchargeable en CSV"""
+        ResultLine = self.env['ifn.import.result.line']
+        for job in self:
+            lines = ResultLine.search_read(
+                [('job_id', '=', job.id), ('status', '=', 'error')],
+                ['row_num', 'message'], limit=MAX_ERROR_LINES,
+            ) if job.id else []
+            text = '\n'.join(f"Ligne {line['row_num']}: {line['message']}" for line in lines)
+            if job.error_count > len(lines):
+                text += '\n' + _('... et %s autres erreurs') % (job.error_count - len(lines))
+            job.errors = text or False
+
+    @api.depends('rows_done', 'rows_expected', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.rows_expected:
+                job.progress = min(100.0, 100.0 * job.rows_done / job.rows_expected)
+            else:
+                job.progress = 0.0
+
+    def action_cancel(self):
+        """Annule les tâches non terminées (les lignes déjà importées sont conservées)"""
+        self.filtered(lambda job: job.state in ('queued', 'running', 'failed')).write({
+            'state': 'cancelled',
+            'date_finished': fields.Datetime.now(),
+        })
+
+    def action_resume(self):
+        """Relance une tâche en échec : plages en échec reprises à leur curseur"""
+        jobs = self.filtered(lambda job: job.state == 'failed')
+        if not jobs:
+            raise UserError(_('Seules les tâches en échec peuvent être relancées'))
+        jobs.range_ids.filtered(lambda r: r.state == 'failed').write({'state': 'pending', 'last_error': False})
+        for job in jobs:
+            # Sans plages, l'échec est survenu pendant la pré-passe : la rejouer
+            job.write({'state': 'running' if job.range_ids else 'queued', 'last_error': False})
+        jobs._ifn_trigger_processing()
+
+    def action_download_results(self):
+        """Télécharge le rapport ligne à ligne (erreurs, avertissements, doublons) en CSV"""
+        self.ensure_one()
+        self.env['ifn.import.result.line'].flush_model()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([_('Ligne'), _('Statut'), _('Message')])
+        status_labels = dict(self.env['ifn.import.result.line']._fields['status']._description_selection(self.env))
+        self.env.cr.execute("""
+            SELECT row_num, status, message
+              FROM ifn_import_result_line
+             WHERE job_id = %s
+          ORDER BY row_num, id
+        """, [self.id])
+        while True:
+            rows = self.env.cr.fetchmany(10000)
+            if not rows:
+                break
+            writer.writerows((row_num, status_labels.get(status, status), message)
+                             for row_num, status, message in rows)
+
+        attachment = self.env['ir.attachment'].create({
+            'name': f"{self.import_filename or 'ifn_import'}_rapport.csv",
+            'type': 'binary',
+            'datas': base64.b64encode(buffer.getvalue().encode('utf-8-sig')),
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
+
+    def action_import_after_dry_run(self):
+        """Lance l'import réel d'un fichier validé par simulation"""
+        self.ensure_one()
+        if not self.dry_run or self.state != 'done':
+            raise UserError(_('Seule une simulation terminée peut être importée'))
+        job = self.create(dict(
+            self._get_import_options(),
+            dry_run=False,
+            name=self.name,
+            import_filename=self.import_filename,
+            attachment_id=self.attachment_id.copy({'res_id': False}).id,
+        ))
+        job.attachment_id.res_id = job.id
+        job._ifn_trigger_processing()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Import en cours'),
+            'view_mode': 'form',
+            'res_model': self._name,
+            'res_id': job.id,
+            'target': 'current',
+        }
+
+    def _ifn_trigger_processing(self):
+        """Demande l'exécution immédiate du cron de pré-passe et des crons de traitement
+
+        Échoue si le cron principal est absent ou désactivé : la tâche ne
+        serait jamais traitée.
+        """
+        crons = [self.sudo().env.ref(xmlid, raise_if_not_found=False) for xmlid in IMPORT_CRON_XMLIDS]
+        if not crons[0] or not crons[0].active:
+            raise UserError(_("Le cron de traitement des imports est absent ou désactivé : "
+                              "l'import ne peut pas être lancé"))
+        for cron in crons:
+            if cron and cron.active:
+                cron._trigger()
+
+    def _get_import_attachment(self):
+        """Fichier joint à la tâche"""
+        return self.attachment_id.sudo()
+
+    @api.model
+    def _get_import_time_budget(self):
+        """Durée maximale (secondes) d'une exécution de cron d'import"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.import_time_budget', '600'
+        ))
+
+    @api.model
+    def _get_import_range_size(self):
+        """Nombre de lignes par plage traitée par un worker"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.import_range_size', '5000'
+        ))
+
+    @api.model
+    def _cron_process_import_jobs(self, time_budget=None):
+        """Prépare les tâches en attente, clôt les tâches terminées puis traite des plages"""
+        if time_budget is None:
+            time_budget = self._get_import_time_budget()
+        deadline = time.monotonic() + time_budget
+
+        while time.monotonic() < deadline:
+            # Verrouiller la tâche pour qu'un seul cron en fasse la pré-passe
+            self.env.cr.execute("""
+                SELECT id FROM ifn_import_job
+                 WHERE state = 'queued'
+              ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            self.browse(row[0])._ifn_plan_ranges()
+
+        self.search([('state', '=', 'running')])._ifn_finalize()
+        self.env['ifn.import.job.range']._cron_process_import_ranges(max(deadline - time.monotonic(), 0))
+
+    def _ifn_plan_ranges(self):
+        """Pré-passe séquentielle puis découpage du fichier en plages de lignes
+
+        La pré-passe crée les marchés/coopératives manquants et relève les
+        doublons (base et fichier) : les plages peuvent ensuite être traitées
+        dans n'importe quel ordre, par plusieurs workers, sans conflit. Les
+        lignes de chaque plage sont conservées dans un instantané : le
+        fichier n'est analysé qu'une fois, quel que soit le nombre de plages.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.write({'state': 'running', 'date_started': fields.Datetime.now()})
+        try:
+            range_size = max(self._get_import_range_size(), 1)
+            ranges = []
+            pending_rows = []
+
+            def snapshot_row(row_num, row):
+                pending_rows.append((row_num, row))
+                if len(pending_rows) >= range_size:
+                    ranges.append(self._ifn_create_range(len(ranges) * range_size, pending_rows))
+                    pending_rows.clear()
+
+            resolver = self._build_resolver(dedupe_index=self._build_dedupe_index(), row_sink=snapshot_row)
+            if pending_rows:
+                ranges.append(self._ifn_create_range(len(ranges) * range_size, pending_rows))
+
+            duplicates_by_range = defaultdict(list)
+            for row_num, position in resolver['duplicate_rows'].items():
+                duplicates_by_range[position // range_size].append(row_num)
+            for index, row_nums in duplicates_by_range.items():
+                ranges[index].duplicate_rows = json.dumps(sorted(row_nums))
+            self.rows_expected = resolver['row_count']
+        except Exception as e:
+            _logger.exception(f"Import job {self.id} failed during pre-pass")
+            if auto_commit:
+                self.env.cr.rollback()
+            self.write({'state': 'failed', 'last_error': str(e)})
+            if auto_commit:
+                self.env.cr.commit()
+            return
+
+        if auto_commit:
+            self.env.cr.commit()
+        _logger.info(f"Import job {self.id} planned: {self.rows_expected} rows in {len(self.range_ids)} ranges, "
+                     f"{len(resolver['duplicate_rows'])} duplicates")
+        self._ifn_trigger_processing()
+
+    def _ifn_create_range(self, row_start, rows):
+        """Crée une plage et l'instantané (JSON compressé) de ses lignes analysées"""
+        return self.env['ifn.import.job.range'].create({
+            'job_id': self.id,
+            'row_start': row_start,
+            'row_end': row_start + len(rows),
+            'rows_snapshot': base64.b64encode(gzip.compress(json.dumps(rows).encode())),
+        })
+
+    def _ifn_get_range_state(self, import_range):
+        """État d'import d'une plage : référentiels résolus par la pré-passe et doublons relevés"""
+        return {
+            'duplicate_rows': set(json.loads(import_range.duplicate_rows or '[]')),
+            'resolver': {
+                'markets': self._seed_resolver('ifn.market'),
+                'coops': self._seed_resolver('ifn.coop'),
+            },
+        }
+
+    def _ifn_finalize(self):
+        """Clôt les tâches dont toutes les plages sont traitées
+
+        Les effectifs des marchés, coopératives et zones, non mis à jour par
+        les workers, sont recalés en une passe à la clôture.
+        """
+        for job in self:
+            states = set(job.range_ids.mapped('state'))
+            if states & {'pending', 'running'}:
+                continue
+            if not job.dry_run:
+                self.env['res.partner']._ifn_reconcile_member_counts()
+            job.write({
+                'state': 'failed' if 'failed' in states else 'done',
+                'last_error': '\n'.join(job.range_ids.filtered('last_error').mapped('last_error')) or False,
+                'date_finished': fields.Datetime.now(),
+            })
+            job._ifn_send_progress()
+            _logger.info(f"Import job {job.id} {job.state}: {job.imported_count} imported, "
+                         f"{job.skipped_count} skipped, {job.error_count} errors")
+
+    def _ifn_send_progress(self):
+        """Publie l'avancement cumulé de la tâche à son auteur sur le bus"""
+        elapsed = (fields.Datetime.now() - self.date_started).total_seconds() if self.date_started else 0
+        rows_per_sec = self.rows_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.rows_expected - self.rows_done, 0)
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'ifn_import_progress', {
+            'job_id': self.id,
+            'state': self.state,
+            'rows_done': self.rows_done,
+            'rows_expected': self.rows_expected,
+            'imported_count': self.imported_count,
+            'skipped_count': self.skipped_count,
+            'error_count': self.error_count,
+            'rows_per_sec': round(rows_per_sec, 1),
+            'eta_seconds': round(remaining / rows_per_sec) if rows_per_sec else None,
+        })
+
+
+class IFNImportJobRange(models.Model):
+    _name = 'ifn.import.job.range'
+    _description = 'Plage de lignes d\'une tâche d\'import IFN'
+    _order = 'job_id, row_start'
+
+    job_id = fields.Many2one('ifn.import.job', string='Tâche', required=True, index=True,
+                             ondelete='cascade', readonly=True)
+    row_start = fields.Integer('Première position', required=True, readonly=True,
+                               help='Position (à partir de 0) de la première ligne de données de la plage')
+    row_end = fields.Integer('Position de fin', required=True, readonly=True,
+                             help='Position de la ligne suivant la plage (exclue)')
+    state = fields.Selection([
+        ('pending', 'À traiter'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échec'),
+    ], string='État', default='pending', required=True, index=True, readonly=True)
+    duplicate_rows = fields.Text('Lignes en doublon', readonly=True,
+                                 help='JSON des numéros de ligne ignorés, relevés par la pré-passe')
+    rows_snapshot = fields.Binary('Lignes de la plage', attachment=True, readonly=True,
+                                  help='Lignes analysées par la pré-passe (JSON compressé), supprimées une fois la plage terminée')
+
+    # Avancement (rows_done sert de curseur de reprise dans la plage)
+    rows_done = fields.Integer('Lignes traitées', readonly=True)
+    imported_count = fields.Integer('Importés', readonly=True)
+    skipped_count = fields.Integer('Ignorés', readonly=True)
+    error_count = fields.Integer('Erreurs', readonly=True)
+    last_error = fields.Text('Dernière erreur bloquante', readonly=True)
+    heartbeat = fields.Datetime('Dernière activité', readonly=True,
+                                help='Mis à jour à chaque lot ; une plage inactive est reprise par un autre worker')
+
+    @api.model
+    def _cron_process_import_ranges(self, time_budget=None):
+        """Worker : réserve et traite des plages de lignes jusqu'à épuisement du temps imparti
+
+        Plusieurs crons exécutent cette méthode en parallèle ; chacun réserve
+        ses plages avec SKIP LOCKED et les valide lot par lot.
+        """
+        if time_budget is None:
+            time_budget = self.env['ifn.import.job']._get_import_time_budget()
+        deadline = time.monotonic() + time_budget
+
+        while time.monotonic() < deadline:
+            import_range = self._ifn_claim_range()
+            if not import_range:
+                return
+            import_range._process(deadline)
+
+    @api.model
+    def _ifn_claim_range(self):
+        """Réserve la prochaine plage à traiter (ou abandonnée par un worker interrompu)"""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        self.env.cr.execute("""
+            SELECT r.id
+              FROM ifn_import_job_range r
+              JOIN ifn_import_job j ON j.id = r.job_id
+             WHERE j.state = 'running'
+               AND (r.state = 'pending' OR (r.state = 'running' AND r.heartbeat < %s))
+          ORDER BY r.job_id, r.row_start
+             LIMIT 1
+               FOR UPDATE OF r SKIP LOCKED
+        """, [fields.Datetime.now() - timedelta(minutes=RANGE_STALE_MINUTES)])
+        row = self.env.cr.fetchone()
+        if not row:
+            return self
+        import_range = self.browse(row[0])
+        import_range.write({'state': 'running', 'heartbeat': fields.Datetime.now()})
+        if auto_commit:
+            self.env.cr.commit()
+        return import_range
+
+    def _process(self, deadline):
+        """Traite la plage depuis son curseur, un commit par lot
+
+        Les effectifs partagés (marchés, coopératives, zones) ne sont pas mis
+        à jour par lot mais recalés à la clôture de la tâche ; les conflits de
+        concurrence résiduels entre workers font rejouer le lot après un
+        court délai.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        job = self.job_id.with_context(ifn_defer_counters=True)
+        chunk_size = job._get_import_chunk_size()
+        try:
+            import_state = job._ifn_get_range_state(self)
+            for chunk in self._ifn_iter_chunks(chunk_size):
+                for attempt in range(1, CHUNK_MAX_TRIES + 1):
+                    try:
+                        stats = {'imported_count': 0, 'skipped_count': 0, 'error_count': 0}
+                        results = []
+                        job._import_chunk(chunk, stats, results, import_state)
+                        self._ifn_record_chunk(len(chunk), stats, results)
+                        if auto_commit:
+                            self.env.cr.commit()
+                        break
+                    except Exception as e:
+                        if not (auto_commit and is_concurrency_error(e)) or attempt == CHUNK_MAX_TRIES:
+                            raise
+                        self.env.cr.rollback()
+                        wait = random.uniform(0.0, 2 ** attempt)
+                        _logger.info(f"Import range {self.id}: concurrent update, retrying chunk in {wait:.1f}s")
+                        time.sleep(wait)
+
+                job.invalidate_recordset(['state'])
+                if job.state != 'running':
+                    return
+                job._ifn_send_progress()
+                if time.monotonic() >= deadline:
+                    # Rendre la plage aux autres workers, reprise au curseur
+                    self.state = 'pending'
+                    if auto_commit:
+                        self.env.cr.commit()
+                    job._ifn_trigger_processing()
+                    return
+        except Exception as e:
+            _logger.exception(f"Import range {self.id} of job {job.id} failed at position "
+                              f"{self.row_start + self.rows_done}")
+            if auto_commit:
+                self.env.cr.rollback()
+            self.write({'state': 'failed', 'last_error': str(e)})
+        else:
+            self.write({'state': 'done', 'rows_snapshot': False})
+        if auto_commit:
+            self.env.cr.commit()
+
+        # La dernière plage terminée fait clore la tâche par le cron principal
+        if not self.search_count([('job_id', '=', job.id), ('state', 'in', ('pending', 'running'))]):
+            cron = self.env.ref(IMPORT_CRON_XMLIDS[0], raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    def _ifn_iter_chunks(self, chunk_size):
+        """Lots de lignes de la plage depuis son curseur, lus dans l'instantané de la pré-passe"""
+        snapshot = self.with_context(bin_size=False).rows_snapshot
+        rows = json.loads(gzip.decompress(base64.b64decode(snapshot))) if snapshot else []
+        for start in range(self.rows_done, len(rows), chunk_size):
+            yield [(row_num, row) for row_num, row in rows[start:start + chunk_size]]
+
+    def _ifn_record_chunk(self, row_count, stats, results):
+        """Avance le curseur, cumule les compteurs et enregistre les résultats d'un lot"""
+        self.write({
+            'rows_done': self.rows_done + row_count,
+            'imported_count': self.imported_count + stats['imported_count'],
+            'skipped_count': self.skipped_count + stats['skipped_count'],
+            'error_count': self.error_count + stats['error_count'],
+            'heartbeat': fields.Datetime.now(),
+        })
+        if results:
+            self.env['ifn.import.result.line'].create([{
+                'job_id': self.job_id.id,
+                'row_num': row_num,
+                'status': status,
+                'message': message,
+            } for row_num, status, message in results])
+
+
+class IFNImportResultLine(models.Model):
+    _name = 'ifn.import.result.line'
+    _description = 'Résultat de ligne d\'import IFN'
+    _order = 'job_id, row_num, id'
+    _rec_name = 'message'
+
+    job_id = fields.Many2one('ifn.import.job', string='Tâche', required=True, index=True,
+                             ondelete='cascade', readonly=True)
+    row_num = fields.Integer('Ligne', readonly=True, help='Numéro de ligne dans le fichier (en-tête compris)')
+    status = fields.Selection([
+        ('error', 'Erreur'),
+        ('warning', 'Avertissement'),
+        ('skipped', 'Ignorée'),
+    ], string='Statut', required=True, index=True, readonly=True)
+    message = fields.Text('Message', readonly=True)
@@ -6,6 +6,7 @@ from odoo.exceptions import ValidationError
 
 class IFNMarket(models.Model):
     _name = 'ifn.market'
+    _inherit = ['ifn.geo.mixin', 'ifn.search.mixin']
     _description = 'Marché IFN'
     _order = 'code'
     _rec_name = 'display_name'
@@ -14,8 +15,8 @@ class IFNMarket(models.Model):
     ]
 
     # Informations générales
-    name = fields.Char('Nom du marché', required=True, translate=True)
-    code = fields.Char('Code marché', required=True, size=10,
+    name = fields.Char('Nom du marché', required=True, translate=True, index='trigram')
+    code = fields.Char('Code marché', required=True, size=10, index='trigram',
                       help='Code interne unique du marché')
     display_name = fields.Char('Nom affiché', compute='_compute_display_name', store=True)
 
@@ -47,9 +48,9 @@ class IFNMarket(models.Model):
 
     # Statistiques
     coop_count = fields.Integer('Nombre de coopératives',
-                               compute='_compute_counts', store=True)
-    partner_count = fields.Integer('Nombre de partenaires',
-                                  compute='_compute_counts', store=True)
+                               compute='_compute_coop_count', store=True)
+    partner_count = fields.Integer('Nombre de partenaires', readonly=True, copy=False,
+                                  help='Partenaires actifs, tenu à jour par res.partner')
 
     @api.depends('name', 'code')
     def _compute_display_name(self):
@@ -61,21 +62,12 @@ class IFNMarket(models.Model):
 
     @api.depends('partner_latitude', 'partner_longitude')
     def _compute_geo_point(self):
-        for market in self:
-            if market.partner_latitude and market.partner_longitude:
-                market.geo_point = fields.GeoPoint.from_latlon(
-                    cr=self.env.cr,
-                    latitude=market.partner_latitude,
-                    longitude=market.partner_longitude
-                )
-            else:
-                market.geo_point = False
+        self._ifn_compute_geo_points()
 
-    @api.depends('coop_ids', 'partner_ids')
-    def _compute_counts(self):
+    @api.depends('coop_ids')
+    def _compute_coop_count(self):
         for market in self:
             market.coop_count = len(market.coop_ids)
-            market.partner_count = len(market.partner_ids)
 
     @api.constrains('partner_latitude', 'partner_longitude')
     def _check_coordinates(self):
@@ -125,10 +117,11 @@ class IFNMarket(models.Model):
         return result
 
     @api.model
-    def name_search(self, name='', args=None, operator='ilike', limit=100):
-        args = args or []
-        domain = []
-        if name:
-            domain = ['|', ('name', operator, name), ('code', operator, name)]
-        markets = self.search(domain + args, limit=limit)
-        return markets.name_get()
\ No newline at end of file
+    def find_nearest_markets(self, lat, lng, k=5, radius_km=None):
+        """Retourne les k marchés actifs les plus proches d'un point, avec leur distance"""
+        return [{
+            'id': market.id,
+            'name': market.display_name,
+            'code': market.code,
+            'distance_km': round(distance, 3),
+        } for market, distance in self._ifn_find_nearest(lat, lng, k=k, radius_km=radius_km)]
\ No newline at end of file
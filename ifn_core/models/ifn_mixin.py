@@ -3,9 +3,30 @@
 import qrcode
 import io
 import base64
+import json
+from collections import defaultdict
 from datetime import datetime
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+
+def render_qr_image(qr_string):
+    """Rend le texte en image QR PNG encodée en base64 (sans accès base)"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(qr_string)
+    qr.make(fit=True)
+
+    # Convertir en image puis en base64
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
 
 
 class IFNMixin(models.AbstractModel):
@@ -20,7 +41,7 @@ class IFNMixin(models.AbstractModel):
                             help='Code QR généré pour cet enregistrement')
     x_ifn_qr_ref = fields.Char('Référence QR', copy=False, index=True,
                               help='Hash de référence du QR')
-    x_ifn_qr_generated_date = fields.Datetime('Date génération QR', readonly=True)
+    x_ifn_qr_generated_date = fields.Datetime('Date génération QR', readonly=True, index=True)
 
     # Métadonnées IFN
     x_ifn_created_date = fields.Datetime('Date création IFN', readonly=True,
@@ -30,33 +51,45 @@ class IFNMixin(models.AbstractModel):
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Surcharge pour générer UID/QR et publier événement"""
+        """Surcharge pour générer UID/QR et publier événement
+
+        L'UID et la date de création sont fournis à la création ; le QR est
+        rendu pour tout le lot ensuite, ou différé avec le contexte
+        `ifn_defer_qr` (l'appelant le génère alors par lot).
+        """
+        now = fields.Datetime.now()
+        for vals in vals_list:
+            vals['x_ifn_created_date'] = now
+            if not vals.get('x_ifn_uid'):
+                vals['x_ifn_uid'] = self._ifn_generate_uid()
         records = super().create(vals_list)
-        for record in records:
-            if hasattr(record, '_ifn_assign_uid_and_qr'):
-                record._ifn_assign_uid_and_qr()
-            if hasattr(record, '_ifn_publish_event'):
-                record._ifn_publish_event('ifn.record.created')
-            record.x_ifn_created_date = fields.Datetime.now()
+        if not self.env.context.get('ifn_defer_qr'):
+            records.with_context(ifn_no_track=True)._ifn_generate_qr()
+        records._ifn_publish_events('ifn.record.created')
         return records
 
     def write(self, vals):
         """Surcharge pour mettre à jour les métadonnées et publier événement"""
-        # Détecter les changements de champs sensibles
-        sensitive_fields = self._get_sensitive_fields()
-        has_sensitive_changes = any(field in vals for field in sensitive_fields)
+        # Écritures techniques (QR de création) : ni audit, ni événement, ni version
+        if self.env.context.get('ifn_no_track'):
+            return super().write(vals)
+
+        # Lire en une requête les anciennes valeurs des champs suivis de tout le lot
+        tracked_fields = self._ifn_get_tracked_fields(vals)
+        old_values = self._ifn_read_tracked_values(tracked_fields) if tracked_fields else {}
 
         result = super().write(vals)
 
-        if has_sensitive_changes and hasattr(self, '_ifn_log_sensitive_change'):
-            self._ifn_log_sensitive_change(vals)
+        if tracked_fields:
+            changes = self._ifn_diff_tracked_values(tracked_fields, old_values)
+            if changes:
+                self._ifn_log_sensitive_changes(changes)
+                self._ifn_publish_change_events(changes)
 
-        if hasattr(self, '_ifn_publish_event'):
-            self._ifn_publish_event('ifn.record.updated')
+        self._ifn_publish_events('ifn.record.updated')
 
         # Mettre à jour les métadonnées IFN
-        self.write({'x_ifn_updated_date': fields.Datetime.now(),
-                   'x_ifn_version': self.x_ifn_version + 1})
+        self._ifn_bump_version()
 
         return result
 
@@ -67,61 +100,105 @@ class IFNMixin(models.AbstractModel):
             'x_ifn_geo_lat', 'x_ifn_geo_lng', 'email', 'phone'
         ]
 
+    def _ifn_get_change_events(self):
+        """Retourne les événements à publier par champ modifié {champ: événement}"""
+        return {}
+
+    def _ifn_get_tracked_fields(self, vals):
+        """Retourne les champs stockés de vals à suivre (audit et événements)"""
+        candidates = set(self._get_sensitive_fields()) | set(self._ifn_get_change_events())
+        return [
+            fname for fname in vals
+            if fname in candidates
+            and fname in self._fields
+            and self._fields[fname].store
+            and self._fields[fname].column_type
+        ]
+
+    def _ifn_read_tracked_values(self, fnames):
+        """Lit les valeurs en base des champs suivis pour tout le lot
+
+        Retourne {id: (valeur champ 1, valeur champ 2, ...)} dans l'ordre de fnames.
+        """
+        if not self.ids:
+            return {}
+        self.flush_recordset(fnames)
+        columns = ', '.join(f'"{fname}"' for fname in fnames)
+        values = {}
+        for sub_ids in split_every(self.env.cr.IN_MAX, self.ids):
+            self.env.cr.execute(
+                f'SELECT id, {columns} FROM "{self._table}" WHERE id IN %s',
+                [tuple(sub_ids)]
+            )
+            values.update((row[0], row[1:]) for row in self.env.cr.fetchall())
+        return values
+
+    def _ifn_diff_tracked_values(self, fnames, old_values):
+        """Compare les valeurs après écriture et retourne {champ: [(id, ancien, nouveau)]}"""
+        new_values = self._ifn_read_tracked_values(fnames)
+        changes = defaultdict(list)
+        for record_id, old_row in old_values.items():
+            new_row = new_values.get(record_id)
+            if new_row is None:
+                continue
+            for fname, old_value, new_value in zip(fnames, old_row, new_row):
+                if old_value != new_value:
+                    changes[fname].append((record_id, old_value, new_value))
+        return changes
+
+    def _ifn_bump_version(self):
+        """Incrémente la version IFN et la date de mise à jour de tout le lot en une requête"""
+        if not self.ids:
+            return
+        self.flush_recordset(['x_ifn_version', 'x_ifn_updated_date'])
+        now = fields.Datetime.now()
+        for sub_ids in split_every(self.env.cr.IN_MAX, self.ids):
+            self.env.cr.execute(
+                f'UPDATE "{self._table}" '
+                f'SET x_ifn_version = COALESCE(x_ifn_version, 0) + 1, x_ifn_updated_date = %s '
+                f'WHERE id IN %s',
+                [now, tuple(sub_ids)]
+            )
+        self.invalidate_recordset(['x_ifn_version', 'x_ifn_updated_date'])
+
     def _ifn_assign_uid_and_qr(self):
-        """Génère et assigne un UID et QR uniques"""
-        self.ensure_one()
-        if not self.x_ifn_uid:
-            self.x_ifn_uid = self._ifn_generate_uid()
+        """Génère et assigne un UID et QR uniques à tout le lot"""
+        for record in self.filtered(lambda r: not r.x_ifn_uid):
+            record.x_ifn_uid = record._ifn_generate_uid()
         self._ifn_generate_qr()
 
     def _ifn_generate_uid(self):
         """Génère un UID IFN unique"""
-        self.ensure_one()
         # Format: IFN-YYYYMMDD-XXXXX
         date_str = datetime.now().strftime('%Y%m%d')
         sequence = self.env['ir.sequence'].next_by_code('ifn.uid.sequence') or '00001'
         return f"IFN-{date_str}-{sequence.zfill(5)}"
 
-    def _ifn_generate_qr(self):
-        """Génère le code QR pour l'enregistrement"""
+    def _ifn_get_qr_payload(self):
+        """Texte JSON encodé dans le QR de l'enregistrement"""
         self.ensure_one()
-        if not self.x_ifn_uid:
-            return
-
-        # Données à encoder dans le QR
         qr_data = {
             'uid': self.x_ifn_uid,
             'type': self._name,
             'id': self.id,
             'generated': datetime.now().isoformat(),
         }
+        return json.dumps(qr_data, separators=(',', ':'))
 
-        # Convertir en string JSON
-        import json
-        qr_string = json.dumps(qr_data, separators=(',', ':'))
-
-        # Générer le QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_string)
-        qr.make(fit=True)
-
-        # Convertir en image
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        # Convertir en base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
-
-        # Sauvegarder
-        self.x_ifn_qr = qr_base64
-        self.x_ifn_qr_ref = self._ifn_generate_qr_ref(qr_string)
-        self.x_ifn_qr_generated_date = fields.Datetime.now()
+    def _ifn_generate_qr(self):
+        """Génère les codes QR du lot : rendu de toutes les images puis une écriture par enregistrement"""
+        records = self.filtered('x_ifn_uid')
+        if not records:
+            return
+        now = fields.Datetime.now()
+        payloads = [(record, record._ifn_get_qr_payload()) for record in records]
+        rendered = [(record, qr_string, render_qr_image(qr_string)) for record, qr_string in payloads]
+        for record, qr_string, qr_base64 in rendered:
+            record.write({
+                'x_ifn_qr': qr_base64,
+                'x_ifn_qr_ref': self._ifn_generate_qr_ref(qr_string),
+                'x_ifn_qr_generated_date': now,
+            })
 
     def _ifn_generate_qr_ref(self, qr_string):
         """Génère une référence unique pour le QR"""
@@ -131,36 +208,53 @@ class IFNMixin(models.AbstractModel):
     def _ifn_publish_event(self, event_type):
         """Publie un événement sur le bus IFN"""
         self.ensure_one()
-        if hasattr(self.env, 'bus') and self.env.bus:
-            self.env.bus.sendmany(
-                [(self.env.cr.dbname, 'ifn_events', event_type, {
-                    'model': self._name,
-                    'id': self.id,
-                    'uid': self.x_ifn_uid,
-                    'user_id': self.env.uid,
-                    'timestamp': fields.Datetime.now().isoformat(),
-                })]
-            )
+        self._ifn_publish_events(event_type)
 
-    def _ifn_log_sensitive_change(self, vals):
-        """Enregistre les changements sensibles dans l'audit"""
-        self.ensure_one()
-        if not hasattr(self.env, 'ifn.audit.log'):
+    def _ifn_publish_events(self, event_type):
+        """Publie un événement par enregistrement du lot, en un seul envoi sur le bus IFN"""
+        if not self or not (hasattr(self.env, 'bus') and self.env.bus):
             return
+        timestamp = fields.Datetime.now().isoformat()
+        self.env.bus.sendmany([
+            (self.env.cr.dbname, 'ifn_events', event_type, {
+                'model': self._name,
+                'id': record.id,
+                'uid': record.x_ifn_uid,
+                'user_id': self.env.uid,
+                'timestamp': timestamp,
+            })
+            for record in self
+        ])
 
-        for field_name, new_value in vals.items():
-            if field_name in self._get_sensitive_fields():
-                old_value = getattr(self, field_name)
-                if old_value != new_value:
-                    self.env['ifn.audit.log'].create({
-                        'object_model': self._name,
-                        'object_id': self.id,
-                        'user_id': self.env.uid,
-                        'action': 'update',
-                        'field_name': field_name,
-                        'old_value': str(old_value) if old_value else '',
-                        'new_value': str(new_value) if new_value else '',
-                    })
+    def _ifn_publish_change_events(self, changes):
+        """Publie les événements métier des champs modifiés, groupés par type"""
+        for field_name, event_type in self._ifn_get_change_events().items():
+            changed_ids = [record_id for record_id, _old, _new in changes.get(field_name, [])]
+            if changed_ids:
+                self.browse(changed_ids)._ifn_publish_events(event_type)
+
+    def _ifn_log_sensitive_changes(self, changes):
+        """Enregistre en une fois les changements sensibles dans l'audit"""
+        if 'ifn.audit.log' not in self.env:
+            return
+
+        sensitive_fields = set(self._get_sensitive_fields())
+        vals_list = [
+            {
+                'object_model': self._name,
+                'object_id': record_id,
+                'user_id': self.env.uid,
+                'action': 'write',
+                'field_name': field_name,
+                'old_value': str(old_value) if old_value else '',
+                'new_value': str(new_value) if new_value else '',
+            }
+            for field_name, field_changes in changes.items()
+            if field_name in sensitive_fields
+            for record_id, old_value, new_value in field_changes
+        ]
+        if vals_list:
+            self.env['ifn.audit.log'].sudo().create(vals_list)
 
     def action_regenerate_qr(self):
         """Action pour régénérer le QR code"""
@@ -0,0 +1,694 @@
+# -*- coding: utf-8 -*-
+
+import codecs
+import csv
+import io
+import logging
+import re
+import unicodedata
+import zipfile
+import zlib
+
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import phonenumbers
+except ImportError:
+    phonenumbers = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Nombre maximal de lignes d'erreur affichées dans le résumé (le rapport CSV est complet)
+MAX_ERROR_LINES = 1000
+# Indicatif par défaut pour la normalisation E.164 (Côte d'Ivoire)
+DEFAULT_COUNTRY_CODE = '225'
+# Taille des blocs lus dans le fichier importé
+FILE_BLOCK_SIZE = 256 * 1024
+# Signatures des formats reconnus (XLSX est une archive ZIP)
+GZIP_SIGNATURE = b'\x1f\x8b'
+ZIP_SIGNATURE = b'PK\x03\x04'
+# Extensions des fichiers texte recherchés dans une archive ZIP
+ZIP_TEXT_EXTENSIONS = ('.csv', '.txt', '.tsv')
+
+
+def normalize_email(email):
+    """Clé de comparaison d'un email"""
+    return (email or '').strip().lower() or None
+
+
+def normalize_phone(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Normalise un numéro au format E.164 (+225XXXXXXXXXX), None si inexploitable"""
+    if not phone or not phone.strip():
+        return None
+    phone = phone.strip()
+    if phonenumbers:
+        try:
+            number = phonenumbers.parse(phone, phonenumbers.region_code_for_country_code(int(country_code)))
+            if phonenumbers.is_possible_number(number):
+                return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+        except phonenumbers.NumberParseException:
+            pass
+
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
+    if phone.startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    if digits.startswith(country_code) and len(digits) > 10:
+        return f'+{digits}'
+    return f'+{country_code}{digits}'
+
+
+def is_concurrency_error(error):
+    """Indique si l'erreur est un conflit de concurrence PostgreSQL, à rejouer"""
+    return isinstance(error, psycopg2.OperationalError) and error.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY
+
+
+def iter_gunzip(blocks):
+    """Décompresse à la volée un flux gzip (éventuellement multi-membres) découpé en blocs"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for block in blocks:
+        while block:
+            data = decompressor.decompress(block)
+            if data:
+                yield data
+            if decompressor.eof:
+                block = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                block = b''
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def format_cell(value):
+    """Texte d'une cellule Excel, comme elle apparaîtrait dans un export CSV"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def normalize_name(name):
+    """Clé de comparaison d'un nom : sans accents, casse ni espaces multiples"""
+    if not name:
+        return None
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    return ' '.join(name.casefold().split()) or None
+
+
+class IFNPartnerImportMixin(models.AbstractModel):
+    """Options et pipeline d'import de partenaires, partagés par l'assistant et les tâches d'import"""
+    _name = 'ifn.partner.import.mixin'
+    _description = 'Mixin import partenaires IFN'
+
+    # Options recopiées de l'assistant vers la tâche d'import
+    _ifn_import_option_fields = (
+        'has_header', 'delimiter', 'encoding', 'dry_run',
+        'create_missing_markets', 'create_missing_coops',
+        'generate_uid_qr', 'validate_profiles', 'send_welcome_email',
+        'default_role', 'default_language', 'default_market_id', 'default_data_consent',
+    )
+
+    # Configuration de l'import
+    has_header = fields.Boolean('Première ligne = en-têtes', default=True,
+                               help='Indique si la première ligne du fichier contient les noms des colonnes')
+    delimiter = fields.Selection([
+        (',', 'Virgule (,)'),
+        (';', 'Point-virgule (;)'),
+        ('\\t', 'Tabulation'),
+    ], string='Séparateur', default=',', required=True)
+
+    encoding = fields.Selection([
+        ('utf-8', 'UTF-8'),
+        ('iso-8859-1', 'ISO-8859-1 (Latin-1)'),
+        ('windows-1252', 'Windows-1252'),
+    ], string='Encodage', default='utf-8', required=True)
+
+    # Options d'import
+    dry_run = fields.Boolean('Simulation (sans écriture)', default=False,
+                             help='Valide tout le fichier et produit le rapport ligne à ligne '
+                                  'sans créer de partenaire, marché ni coopérative')
+    create_missing_markets = fields.Boolean('Créer marchés manquants', default=True)
+    create_missing_coops = fields.Boolean('Créer coopératives manquantes', default=True)
+    generate_uid_qr = fields.Boolean('Générer UID et QR', default=True)
+    validate_profiles = fields.Boolean('Valider les profils', default=False)
+    send_welcome_email = fields.Boolean('Envoyer email bienvenue', default=False)
+
+    # Valeurs par défaut
+    default_role = fields.Selection([
+        ('merchant', 'Marchand'),
+        ('producer', 'Producteur'),
+        ('coop_manager', 'Gestionnaire Coop'),
+        ('agent', 'Agent'),
+        ('admin', 'Administrateur'),
+    ], string='Rôle par défaut', default='producer', required=True)
+
+    default_language = fields.Selection([
+        ('fr', 'Français'),
+        ('ba', 'Baoulé'),
+        ('di', 'Dioula'),
+        ('ci', 'Côte d\'Ivoire'),
+        ('en', 'English'),
+    ], string='Langue par défaut', default='fr', required=True)
+
+    default_market_id = fields.Many2one('ifn.market', string='Marché par défaut')
+    default_data_consent = fields.Boolean('Consentement données par défaut', default=True)
+
+    def _get_import_options(self):
+        """Valeurs des options d'import, prêtes pour create/write"""
+        self.ensure_one()
+        return self._convert_to_write({
+            field_name: self[field_name] for field_name in self._ifn_import_option_fields
+        })
+
+    def _get_import_chunk_size(self):
+        """Nombre de lignes validées et créées par lot"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.import_chunk_size', '500'
+        ))
+
+    def _get_import_attachment(self):
+        """Pièce jointe contenant le fichier à importer : par défaut la dernière jointe à l'enregistrement"""
+        self.ensure_one()
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+        ], order='id desc', limit=1)
+
+    def _open_import_file(self):
+        """Ouvre le fichier importé en lecture binaire, positionnable, directement depuis le filestore si possible"""
+        attachment = self._get_import_attachment()
+        if not attachment:
+            raise ValidationError(_('Veuillez sélectionner un fichier à importer'))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
+
+    def _iter_file_blocks(self):
+        """Produit le contenu brut du fichier par blocs d'octets"""
+        with self._open_import_file() as file:
+            while True:
+                block = file.read(FILE_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+    def _detect_file_format(self):
+        """Format du fichier d'après sa signature : 'csv', 'gzip', 'zip' ou 'xlsx'"""
+        with self._open_import_file() as file:
+            signature = file.read(len(ZIP_SIGNATURE))
+            if signature.startswith(GZIP_SIGNATURE):
+                return 'gzip'
+            if signature == ZIP_SIGNATURE:
+                file.seek(0)
+                with zipfile.ZipFile(file) as archive:
+                    return 'xlsx' if 'xl/workbook.xml' in archive.namelist() else 'zip'
+        return 'csv'
+
+    def _iter_text_lines(self, blocks):
+        """Décode les blocs d'octets de façon incrémentale et produit les lignes de texte"""
+        encoding = 'utf-8-sig' if self.encoding == 'utf-8' else self.encoding
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        pending = ''
+        for block in blocks:
+            pending += decoder.decode(block)
+            lines = pending.split('\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+
+    def _get_csv_delimiter(self):
+        """Séparateur CSV réel (la tabulation est stockée échappée)"""
+        return '\t' if self.delimiter == '\\t' else self.delimiter
+
+    def _iter_rows(self):
+        """Générateur des lignes analysées : (numéro de ligne, ligne)
+
+        Le lecteur est choisi d'après la signature du fichier ; tous lisent
+        le fichier en flux, sans le décompresser ni le charger entièrement.
+        """
+        file_format = self._detect_file_format()
+        if file_format == 'xlsx':
+            yield from self._iter_xlsx_rows()
+        elif file_format == 'zip':
+            with self._open_import_file() as file, zipfile.ZipFile(file) as archive:
+                with archive.open(self._get_zip_member(archive)) as member:
+                    yield from self._iter_csv_rows(iter(lambda: member.read(FILE_BLOCK_SIZE), b''))
+        elif file_format == 'gzip':
+            yield from self._iter_csv_rows(iter_gunzip(self._iter_file_blocks()))
+        else:
+            yield from self._iter_csv_rows(self._iter_file_blocks())
+
+    def _get_zip_member(self, archive):
+        """Premier fichier CSV/texte d'une archive ZIP"""
+        for info in archive.infolist():
+            name = info.filename
+            if not info.is_dir() and not name.startswith('__MACOSX/') \
+                    and name.lower().endswith(ZIP_TEXT_EXTENSIONS):
+                return info
+        raise UserError(_('L\'archive ZIP ne contient aucun fichier CSV'))
+
+    def _iter_xlsx_rows(self):
+        """Lignes de la première feuille d'un classeur XLSX, lu en mode flux (read_only)"""
+        if openpyxl is None:
+            raise UserError(_('La lecture des fichiers Excel nécessite la bibliothèque Python openpyxl'))
+        with self._open_import_file() as file:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+            try:
+                header = None
+                # Numéros de ligne de la feuille ; les lignes vides sont ignorées comme en CSV
+                for row_num, cells in enumerate(workbook.active.iter_rows(values_only=True), 1):
+                    values = [format_cell(value) for value in cells]
+                    if not any(values):
+                        continue
+                    if self.has_header and header is None:
+                        header = values
+                    elif header is not None:
+                        yield row_num, dict(zip(header, values))
+                    else:
+                        yield row_num, values
+            finally:
+                workbook.close()
+
+    def _iter_csv_rows(self, blocks):
+        """Lignes CSV analysées à partir des blocs d'octets du texte"""
+        lines = self._iter_text_lines(blocks)
+        delimiter = self._get_csv_delimiter()
+        if self.has_header:
+            csv_reader = csv.DictReader(lines, delimiter=delimiter)
+        else:
+            csv_reader = csv.reader(lines, delimiter=delimiter)
+        first_row_num = 2 if self.has_header else 1
+        for row_num, row in enumerate(csv_reader, first_row_num):
+            yield row_num, row
+
+    def _import_chunk(self, chunk, stats, results, import_state):
+        """Valide un lot de lignes puis crée les partenaires en une fois
+
+        Les anomalies sont ajoutées à `results` sous la forme
+        (numéro de ligne, statut, message). En simulation, rien n'est créé :
+        les lignes valides sont seulement comptées.
+        """
+        to_create = []
+        # Doublons (base ou plus haut dans le fichier) relevés par la pré-passe
+        duplicate_rows = import_state['duplicate_rows']
+        for row_num, row in chunk:
+            try:
+                row_data = self._extract_row_data(row)
+                row_data['phone'] = normalize_phone(row_data['phone']) or row_data['phone']
+
+                if row_num in duplicate_rows:
+                    stats['skipped_count'] += 1
+                    results.append((row_num, 'skipped', _('Partenaire déjà existant (email, téléphone ou nom)')))
+                    _logger.info(f"Partner already exists: {row_data['name']} (skipped)")
+                    continue
+
+                vals = self._prepare_partner_vals(import_state['resolver'], **row_data)
+                self._check_partner_vals(vals)
+                for warning in self._get_row_warnings(import_state['resolver'], row_data):
+                    results.append((row_num, 'warning', warning))
+                to_create.append((row_num, vals))
+            except Exception as e:
+                self._record_import_error(stats, results, row_num, e)
+
+        if self.dry_run:
+            stats['imported_count'] += len(to_create)
+            return
+
+        partners = self._create_partners(to_create, stats, results)
+        if partners:
+            self._post_process_partners(partners)
+
+    def _check_partner_vals(self, vals):
+        """Contrôle sans écriture les valeurs que la création refuserait (sélections)"""
+        Partner = self.env['res.partner']
+        for field_name in ('x_ifn_role', 'x_ifn_lang_pref'):
+            value = vals.get(field_name)
+            field = Partner._fields.get(field_name)
+            if value and field and value not in field.get_values(self.env):
+                raise ValueError(_('Valeur invalide pour %s : %s') % (field.string, value))
+
+    def _get_row_warnings(self, resolver, row_data):
+        """Anomalies non bloquantes d'une ligne : données ignorées ou remplacées par défaut"""
+        warnings = []
+        if row_data['lat'] or row_data['lng']:
+            try:
+                lat, lng = float(row_data['lat']), float(row_data['lng'])
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    warnings.append(_('Coordonnées GPS hors limites'))
+            except (TypeError, ValueError):
+                warnings.append(_('Coordonnées GPS invalides, ignorées'))
+        market_name = row_data['market_name']
+        if market_name and not self.create_missing_markets \
+                and normalize_name(market_name) not in resolver['markets']:
+            warnings.append(_('Marché inconnu : %s') % market_name)
+        coop_name = row_data['coop_name']
+        if coop_name and not self.create_missing_coops \
+                and normalize_name(coop_name) not in resolver['coops']:
+            warnings.append(_('Coopérative inconnue : %s') % coop_name)
+        return warnings
+
+    def _create_partners(self, rows_vals, stats, results):
+        """Crée les partenaires du lot en une fois, ligne par ligne en cas d'échec"""
+        if not rows_vals:
+            return self.env['res.partner']
+        # QR rendus par lot au post-traitement
+        Partner = self.env['res.partner'].with_context(ifn_defer_qr=True)
+        try:
+            with self.env.cr.savepoint():
+                partners = Partner.create([vals for _row_num, vals in rows_vals])
+            stats['imported_count'] += len(partners)
+            return partners
+        except Exception as e:
+            if is_concurrency_error(e):
+                raise
+            _logger.info(f"Bulk create failed for {len(rows_vals)} rows, retrying row by row: {e}")
+
+        partners = Partner.browse()
+        for row_num, vals in rows_vals:
+            try:
+                with self.env.cr.savepoint():
+                    partners |= Partner.create(vals)
+                stats['imported_count'] += 1
+            except Exception as e:
+                if is_concurrency_error(e):
+                    raise
+                self._record_import_error(stats, results, row_num, e)
+        return partners
+
+    def _post_process_partners(self, partners):
+        """Traitements groupés après création du lot : QR, validation, emails en file"""
+        # QR : rendu groupé, sans le second passage qui suivait la création
+        if self.generate_uid_qr:
+            partners.with_context(ifn_no_track=True)._ifn_generate_qr()
+
+        # Valider les profils en une écriture
+        if self.validate_profiles:
+            partners.write({
+                'x_ifn_profile_status': 'validated',
+                'x_ifn_validation_date': fields.Datetime.now(),
+                'x_ifn_validator_id': self.env.user.id,
+            })
+
+        # Emails de bienvenue mis en file (envoyés par le cron de la file d'emails)
+        if self.send_welcome_email:
+            self._queue_welcome_emails(partners.filtered('email'))
+
+        _logger.info(f"Successfully imported {len(partners)} partners")
+
+    def _record_import_error(self, stats, results, row_num, error):
+        """Comptabilise une erreur de ligne et l'ajoute aux résultats"""
+        stats['error_count'] += 1
+        results.append((row_num, 'error', str(error)))
+        _logger.error(f"Import error at row {row_num}: {str(error)}")
+
+    def _extract_row_data(self, row):
+        """Extrait et valide les données d'une ligne de partenaire"""
+        # Extraire les données selon le format
+        if self.has_header:
+            name = self._get_value(row, 'Nom', 'name', 'Name')
+            email = self._get_value(row, 'Email', 'email', 'Email')
+            phone = self._get_value(row, 'Téléphone', 'phone', 'Phone', 'Tel')
+            role = self._get_value(row, 'Rôle', 'role', 'Role') or self.default_role
+            market_name = self._get_value(row, 'Marché', 'market', 'Market')
+            coop_name = self._get_value(row, 'Coopérative', 'coop', 'Coop', 'Cooperative')
+            lat = self._get_value(row, 'Latitude', 'lat', 'latitude')
+            lng = self._get_value(row, 'Longitude', 'lng', 'longitude')
+            city = self._get_value(row, 'Ville', 'city', 'City')
+            lang = self._get_value(row, 'Langue', 'lang', 'language', 'Language') or self.default_language
+            consent = self._get_value(row, 'Consentement', 'consent', 'Consent')
+        else:
+            # Format ordonné
+            if len(row) < 3:
+                raise ValueError('Au minimum Nom, Email et Téléphone sont requis')
+
+            name = row[0]
+            email = row[1] if len(row) > 1 else ''
+            phone = row[2] if len(row) > 2 else ''
+            role = row[3] if len(row) > 3 else self.default_role
+            market_name = row[4] if len(row) > 4 else ''
+            coop_name = row[5] if len(row) > 5 else ''
+            lat = row[6] if len(row) > 6 else ''
+            lng = row[7] if len(row) > 7 else ''
+            city = row[8] if len(row) > 8 else ''
+            lang = row[9] if len(row) > 9 else self.default_language
+            consent = row[10] if len(row) > 10 else ''
+
+        # Validation des champs obligatoires
+        if not name:
+            raise ValueError('Le nom est obligatoire')
+
+        return {
+            'name': name, 'email': email, 'phone': phone, 'role': role,
+            'market_name': market_name, 'coop_name': coop_name,
+            'lat': lat, 'lng': lng, 'city': city, 'lang': lang, 'consent': consent,
+        }
+
+    def _get_value(self, row, *possible_keys):
+        """Récupère une valeur d'une ligne CSV en essayant plusieurs clés"""
+        for key in possible_keys:
+            if key in row and row[key]:
+                return row[key].strip()
+        return None
+
+    def _build_dedupe_index(self):
+        """Charge une fois les clés normalisées (email, téléphone, nom) des partenaires actifs"""
+        self.env['res.partner'].flush_model(['name', 'email', 'phone', 'mobile', 'active'])
+        index = {'emails': set(), 'phones': set(), 'names': set()}
+        self.env.cr.execute("SELECT name, email, phone, mobile FROM res_partner WHERE active")
+        while True:
+            rows = self.env.cr.fetchmany(10000)
+            if not rows:
+                break
+            for name, email, phone, mobile in rows:
+                index['names'].add(normalize_name(name))
+                index['emails'].add(normalize_email(email))
+                index['phones'].add(normalize_phone(phone))
+                index['phones'].add(normalize_phone(mobile))
+        for keys in index.values():
+            keys.discard(None)
+        _logger.info(f"Import dedupe index: {len(index['emails'])} emails, {len(index['phones'])} phones")
+        return index
+
+    def _find_existing_partner(self, dedupe_index, row_data):
+        """Indique si la ligne correspond à un partenaire existant (email OU téléphone)
+
+        Le nom seul n'est comparé que si la ligne n'a ni email ni téléphone,
+        pour ne pas confondre des homonymes.
+        """
+        email = normalize_email(row_data['email'])
+        phone = normalize_phone(row_data['phone'])
+        if email or phone:
+            return email in dedupe_index['emails'] or phone in dedupe_index['phones']
+        return normalize_name(row_data['name']) in dedupe_index['names']
+
+    def _register_in_dedupe_index(self, dedupe_index, row_data):
+        """Ajoute les clés d'une ligne importée pour détecter les doublons du fichier"""
+        for key, value in (('emails', normalize_email(row_data['email'])),
+                           ('phones', normalize_phone(row_data['phone'])),
+                           ('names', normalize_name(row_data['name']))):
+            if value:
+                dedupe_index[key].add(value)
+
+    def _prepare_partner_vals(self, resolver, name, email, phone, role, market_name, coop_name,
+                             lat, lng, city, lang, consent):
+        """Prépare les valeurs pour la création du partenaire"""
+        vals = {
+            'name': name,
+            'email': email,
+            'phone': phone,
+            'x_ifn_role': role,
+            'x_ifn_lang_pref': lang,
+            'is_company': False,
+            'x_ifn_data_processing_consent': self.default_data_consent,
+            'x_ifn_data_processing_consent_date': fields.Datetime.now(),
+        }
+
+        # Géolocalisation
+        if lat and lng:
+            try:
+                vals['x_ifn_geo_lat'] = float(lat)
+                vals['x_ifn_geo_lng'] = float(lng)
+            except ValueError:
+                pass
+
+        # Ville
+        if city:
+            vals['city'] = city
+
+        # Consentement explicite
+        if consent:
+            consent_lower = consent.lower()
+            if consent_lower in ['oui', 'yes', '1', 'true', 'vrai']:
+                vals['x_ifn_data_processing_consent'] = True
+                vals['x_ifn_data_processing_consent_date'] = fields.Datetime.now()
+            elif consent_lower in ['non', 'no', '0', 'false', 'faux']:
+                vals['x_ifn_data_processing_consent'] = False
+                vals['x_ifn_data_processing_consent_date'] = fields.Datetime.now()
+
+        # Marché
+        market_id = self._resolve_market(resolver, market_name)
+        if market_id:
+            vals['x_ifn_market_id'] = market_id
+
+        # Coopérative
+        coop_id = self._resolve_coop(resolver, coop_name)
+        if coop_id:
+            vals['x_ifn_coop_id'] = coop_id
+        elif self._is_coop_uncreatable(resolver, coop_name, market_name):
+            raise ValueError(_('Coopérative %s sans marché : création impossible') % coop_name)
+
+        return vals
+
+    def _build_resolver(self, dedupe_index=None, row_sink=None):
+        """Pré-passe : résout en une fois les marchés et coopératives cités dans le fichier
+
+        Retourne {'markets': {clé: id}, 'coops': {clé: id}, 'row_count': n} où
+        les clés sont les noms (toutes traductions) et codes normalisés. Les marchés et
+        coopératives manquants sont créés par lot si l'option est active.
+        Avec `dedupe_index`, la même passe relève aussi dans 'duplicate_rows' les
+        lignes déjà présentes en base ou plus haut dans le fichier
+        ({numéro de ligne: position}). `row_sink(numéro de ligne, ligne)` reçoit
+        chaque ligne lue, pour les conserver sans relire le fichier.
+        """
+        market_names = {}
+        coop_names = {}
+        duplicate_rows = {}
+        row_count = 0
+        for position, (row_num, row) in enumerate(self._iter_rows()):
+            row_count += 1
+            if row_sink:
+                row_sink(row_num, row)
+            try:
+                row_data = self._extract_row_data(row)
+            except Exception:
+                continue
+            if dedupe_index is not None:
+                row_data['phone'] = normalize_phone(row_data['phone']) or row_data['phone']
+                if self._find_existing_partner(dedupe_index, row_data):
+                    duplicate_rows[row_num] = position
+                else:
+                    self._register_in_dedupe_index(dedupe_index, row_data)
+            market_key = normalize_name(row_data['market_name'])
+            if market_key:
+                market_names.setdefault(market_key, row_data['market_name'].strip())
+            coop_key = normalize_name(row_data['coop_name'])
+            if coop_key:
+                coop_names.setdefault(coop_key, (row_data['coop_name'].strip(), row_data['market_name']))
+
+        resolver = {
+            'markets': self._seed_resolver('ifn.market'),
+            'coops': self._seed_resolver('ifn.coop'),
+            'row_count': row_count,
+            'duplicate_rows': duplicate_rows,
+        }
+
+        missing_markets = [(key, name) for key, name in market_names.items() if key not in resolver['markets']]
+        if missing_markets and self.create_missing_markets and not self.dry_run:
+            markets = self._create_referentials('ifn.market', [{'name': name} for _key, name in missing_markets])
+            resolver['markets'].update(zip([key for key, _name in missing_markets], markets.ids))
+
+        # Une coopérative exige un marché : celles dont le marché n'est pas résolu ne sont pas
+        # créées, les lignes qui les citent sont rejetées une à une (_is_coop_uncreatable)
+        missing_coops = [(key, name, self._resolve_market(resolver, market_name))
+                         for key, (name, market_name) in coop_names.items() if key not in resolver['coops']]
+        creatable_coops = [(key, name, market_id) for key, name, market_id in missing_coops if market_id]
+        if creatable_coops and self.create_missing_coops and not self.dry_run:
+            coops = self._create_referentials('ifn.coop', [
+                {'name': name, 'market_id': market_id} for _key, name, market_id in creatable_coops
+            ])
+            resolver['coops'].update(zip([key for key, _name, _market_id in creatable_coops], coops.ids))
+
+        _logger.info(f"Import resolver: {len(market_names)} markets, {len(coop_names)} coops referenced, "
+                     f"{len(missing_markets)} and {len(missing_coops)} missing")
+        return resolver
+
+    def _seed_resolver(self, model_name):
+        """Charge en une requête les clés normalisées (noms traduits et code) des enregistrements actifs"""
+        model = self.env[model_name]
+        model.flush_model(['name', 'code', 'active'])
+        self.env.cr.execute(f'SELECT id, name, code FROM "{model._table}" WHERE active ORDER BY id DESC')
+        keys = {}
+        # Ordre décroissant : à clé égale, l'enregistrement le plus ancien l'emporte
+        for record_id, names, code in self.env.cr.fetchall():
+            values = names.values() if isinstance(names, dict) else [names]
+            for value in list(values) + [code]:
+                key = normalize_name(value)
+                if key:
+                    keys[key] = record_id
+        return keys
+
+    def _create_referentials(self, model_name, vals_list):
+        """Crée par lot des marchés/coopératives avec des codes uniques dérivés du nom"""
+        model = self.env[model_name]
+        code_size = model._fields['code'].size or 10
+        self.env.cr.execute(f'SELECT code FROM "{model._table}"')
+        used_codes = {code for (code,) in self.env.cr.fetchall()}
+        for vals in vals_list:
+            base = re.sub(r'[^A-Z0-9]', '', (normalize_name(vals['name']) or '').upper())[:code_size] or 'IMP'
+            code, counter = base, 1
+            while code in used_codes:
+                suffix = str(counter)
+                code = f"{base[:code_size - len(suffix)]}{suffix}"
+                counter += 1
+            used_codes.add(code)
+            vals.update({'code': code, 'active': True})
+        return model.create(vals_list)
+
+    def _resolve_market(self, resolver, market_name):
+        """Trouve le marché par nom ou code normalisé (marché par défaut sinon)"""
+        market_id = resolver['markets'].get(normalize_name(market_name))
+        if market_id:
+            return market_id
+        return self.default_market_id.id if self.default_market_id else None
+
+    def _resolve_coop(self, resolver, coop_name):
+        """Trouve la coopérative par nom ou code normalisé"""
+        return resolver['coops'].get(normalize_name(coop_name))
+
+    def _is_coop_uncreatable(self, resolver, coop_name, market_name):
+        """Indique si la coopérative citée, inconnue, ne peut pas être créée faute de marché
+
+        Après la pré-passe, toute coopérative créable est dans le résolveur ; en
+        simulation, rien n'étant créé, on vérifie que son marché serait résolu.
+        """
+        if not self.create_missing_coops or not normalize_name(coop_name):
+            return False
+        if not self.dry_run:
+            return True
+        return not (self._resolve_market(resolver, market_name)
+                    or (self.create_missing_markets and normalize_name(market_name)))
+
+    def _queue_welcome_emails(self, partners):
+        """Met en file les emails de bienvenue du lot"""
+        if not partners:
+            return
+        template = self.env.ref('ifn_core.email_template_partner_welcome', raise_if_not_found=False)
+        if not template:
+            _logger.warning(f"Welcome email template missing: no welcome email queued for partners {partners.ids}")
+            return
+        try:
+            with self.env.cr.savepoint():
+                partners._ifn_enqueue_template_mails(template)
+        except Exception as e:
+            if is_concurrency_error(e):
+                raise
+            _logger.warning(f"Failed to queue welcome emails for partners {partners.ids}: {str(e)}")
@@ -2,10 +2,22 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from collections import deque
+import logging
+
+from .ifn_cache import ensure_cache_version, bump_cache_version, get_versioned_cache
+
+_logger = logging.getLogger(__name__)
+
+# Champs dont la modification change l'arbre des catégories en cache
+CATEGORY_TREE_FIELDS = ('parent_id', 'code', 'active')
+# Nom du cache versionné de l'arbre des catégories (voir ifn_cache)
+CATEGORY_TREE_CACHE = 'ifn_product_category_tree'
 
 
 class IFNProductCategoryRef(models.Model):
     _name = 'ifn.product.category.ref'
+    _inherit = ['ifn.search.mixin']
     _description = 'Catégorie de produit IFN (Référentiel)'
     _order = 'parent_path'
     _parent_name = 'parent_id'
@@ -16,8 +28,8 @@ class IFNProductCategoryRef(models.Model):
     ]
 
     # Informations générales
-    name = fields.Char('Nom de la catégorie', required=True, translate=True)
-    code = fields.Char('Code catégorie', required=True, size=20,
+    name = fields.Char('Nom de la catégorie', required=True, translate=True, index='trigram')
+    code = fields.Char('Code catégorie', required=True, size=20, index='trigram',
                       help='Code interne unique de la catégorie')
     display_name = fields.Char('Nom affiché', compute='_compute_display_name', store=True)
 
@@ -97,6 +109,27 @@ class IFNProductCategoryRef(models.Model):
     excise_tax = fields.Float('Taxe d\'accise (%)', digits=(5, 2))
     import_duty = fields.Float('Droits d\'importation (%)', digits=(5, 2))
 
+    def init(self):
+        super().init()
+        ensure_cache_version(self.env.cr, CATEGORY_TREE_CACHE)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        categories = super().create(vals_list)
+        self._ifn_invalidate_category_tree()
+        return categories
+
+    def write(self, vals):
+        result = super().write(vals)
+        if any(field_name in vals for field_name in CATEGORY_TREE_FIELDS):
+            self._ifn_invalidate_category_tree()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self._ifn_invalidate_category_tree()
+        return result
+
     @api.depends('name', 'code', 'parent_id')
     def _compute_display_name(self):
         for category in self:
@@ -119,15 +152,8 @@ class IFNProductCategoryRef(models.Model):
 
     @api.constrains('parent_id')
     def _check_hierarchy(self):
-        for category in self:
-            if category.parent_id and category.parent_id.id == category.id:
-                raise ValidationError(_('Une catégorie ne peut pas être sa propre parente'))
-            # Vérifier les cycles dans la hiérarchie
-            parent = category.parent_id
-            while parent:
-                if parent.id == category.id:
-                    raise ValidationError(_('Cycle détecté dans la hiérarchie des catégories'))
-                parent = parent.parent_id
+        if not self._check_recursion():
+            raise ValidationError(_('Cycle détecté dans la hiérarchie des catégories'))
 
     @api.constrains('min_price', 'max_price')
     def _check_prices(self):
@@ -173,40 +199,132 @@ class IFNProductCategoryRef(models.Model):
             'type': 'ir.actions.act_window',
         }
 
+    # ------------------------------------------------------------
+    # Arbre des catégories en cache
+    # ------------------------------------------------------------
+
+    @api.model
+    def _ifn_get_category_tree(self):
+        """Arbre complet des catégories en cache, reconstruit quand sa version change"""
+        return get_versioned_cache(self.env, CATEGORY_TREE_CACHE, self._ifn_build_category_tree)
+
+    @api.model
+    def _ifn_build_category_tree(self):
+        """Arbre complet des catégories, construit en une requête
+
+        Retourne un dictionnaire d'IDs (jamais de recordsets) :
+        - nodes : {id: {'parent_id', 'code', 'active', 'depth', 'full_code', 'ancestor_ids'}}
+        - children : {id: (child_id, ...)}
+        - root_ids : (id, ...)
+        """
+        self.flush_model(['parent_id', 'parent_path', 'code', 'active'])
+        self.env.cr.execute(f"""
+            SELECT id, parent_id, code, active, parent_path
+              FROM "{self._table}"
+          ORDER BY parent_path, code
+        """)
+        rows = self.env.cr.fetchall()
+
+        codes = {category_id: code for category_id, _parent, code, _active, _path in rows}
+        nodes = {}
+        children = {}
+        root_ids = []
+        for category_id, parent_id, code, active, parent_path in rows:
+            path_ids = [int(path_id) for path_id in (parent_path or f'{category_id}/').split('/') if path_id]
+            nodes[category_id] = {
+                'parent_id': parent_id,
+                'code': code,
+                'active': active,
+                'depth': len(path_ids) - 1,
+                'full_code': '.'.join(codes.get(path_id) or '' for path_id in path_ids),
+                'ancestor_ids': tuple(path_ids[:-1]),
+            }
+            if parent_id:
+                children.setdefault(parent_id, []).append(category_id)
+            else:
+                root_ids.append(category_id)
+
+        _logger.info(f"Built product category tree cache ({len(nodes)} categories)")
+        return {
+            'nodes': nodes,
+            'children': {parent_id: tuple(child_ids) for parent_id, child_ids in children.items()},
+            'root_ids': tuple(root_ids),
+        }
+
+    @api.model
+    def _ifn_invalidate_category_tree(self):
+        """Invalide l'arbre en cache (tous les workers) en changeant sa version"""
+        bump_cache_version(self.env, CATEGORY_TREE_CACHE)
+
+    def _ifn_get_tree_node(self):
+        """Nœud en cache de la catégorie, None pour un enregistrement non sauvegardé"""
+        self.ensure_one()
+        if not isinstance(self.id, int):
+            return None
+        return self._ifn_get_category_tree()['nodes'].get(self.id)
+
     def get_full_code(self):
         """Retourne le code complet avec hiérarchie"""
         self.ensure_one()
+        node = self._ifn_get_tree_node()
+        if node:
+            return node['full_code']
         if self.parent_id:
             return f"{self.parent_id.get_full_code()}.{self.code}"
         return self.code
 
+    def get_depth(self):
+        """Retourne la profondeur de la catégorie (0 pour une racine)"""
+        self.ensure_one()
+        node = self._ifn_get_tree_node()
+        if node:
+            return node['depth']
+        return self.parent_id.get_depth() + 1 if self.parent_id else 0
+
+    def get_ancestors(self):
+        """Retourne les catégories parentes, de la racine au parent direct"""
+        self.ensure_one()
+        node = self._ifn_get_tree_node()
+        if node:
+            return self.browse(node['ancestor_ids'])
+        ancestors = self.browse()
+        parent = self.parent_id
+        while parent:
+            ancestors = parent | ancestors
+            parent = parent.parent_id
+        return ancestors
+
     def name_get(self):
+        category_types = dict(self._fields['category_type']._description_selection(self.env))
         result = []
         for category in self:
             name = category.display_name
             if category.category_type:
-                name = f"{name} ({dict(category._fields['category_type'].selection).get(category.category_type)})}"
+                name = f"{name} ({category_types.get(category.category_type)})"
             result.append((category.id, name))
         return result
 
-    @api.model
-    def name_search(self, name='', args=None, operator='ilike', limit=100):
-        args = args or []
-        domain = []
-        if name:
-            domain = ['|', ('name', operator, name), ('code', operator, name)]
-        categories = self.search(domain + args, limit=limit)
-        return categories.name_get()
 
     @api.model
     def get_root_categories(self):
         """Retourne les catégories racine"""
-        return self.search([('parent_id', '=', False)])
+        tree = self._ifn_get_category_tree()
+        return self.browse([
+            category_id for category_id in tree['root_ids']
+            if tree['nodes'][category_id]['active']
+        ])
 
     def get_all_children(self):
         """Retourne récursivement tous les enfants"""
         self.ensure_one()
-        children = self.child_ids
-        for child in self.child_ids:
-            children |= child.get_all_children()
-        return children
\ No newline at end of file
+        tree = self._ifn_get_category_tree()
+        # Parcours en largeur des enfants actifs, comme child_ids
+        descendant_ids = []
+        pending = deque(tree['children'].get(self.id, ()))
+        while pending:
+            category_id = pending.popleft()
+            if not tree['nodes'][category_id]['active']:
+                continue
+            descendant_ids.append(category_id)
+            pending.extend(tree['children'].get(category_id, ()))
+        return self.browse(descendant_ids)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class IFNQRBackup(models.Model):
+    """Index des sauvegardes de QR : une ligne par (partenaire, image), une pièce jointe par image distincte"""
+    _name = 'ifn.qr.backup'
+    _description = 'Sauvegarde QR IFN'
+    _order = 'backup_date desc, id desc'
+    _rec_name = 'qr_ref'
+    _sql_constraints = [
+        ('unique_partner_checksum', 'unique(partner_id, checksum)',
+         'Cette image QR est déjà sauvegardée pour ce partenaire !'),
+    ]
+
+    partner_id = fields.Many2one('res.partner', string='Partenaire', required=True, index=True,
+                                 ondelete='cascade', readonly=True)
+    version = fields.Integer('Version IFN', readonly=True,
+                             help='Version IFN du partenaire au moment de la sauvegarde')
+    qr_ref = fields.Char('Référence QR', readonly=True)
+    checksum = fields.Char('Empreinte SHA1', required=True, index=True, readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string='Image', required=True,
+                                    ondelete='restrict', readonly=True,
+                                    help='Image partagée par toutes les sauvegardes de même empreinte')
+    backup_date = fields.Datetime('Date sauvegarde', required=True, index=True,
+                                  default=fields.Datetime.now, readonly=True)
+
+    @api.model
+    def _ifn_backup_partners(self, partners):
+        """Sauvegarde les QR actuels des partenaires, sans doublon d'image ni de ligne
+
+        Une image déjà sauvegardée pour le partenaire n'est pas réindexée ;
+        une image déjà stockée (même empreinte) n'est pas réécrite.
+        """
+        images = {}
+        for partner in partners.filtered('x_ifn_qr'):
+            raw = base64.b64decode(partner.x_ifn_qr)
+            images[partner.id] = (partner, raw, hashlib.sha1(raw).hexdigest())
+        if not images:
+            return self.browse()
+
+        # Paires (partenaire, empreinte) déjà indexées
+        self.flush_model(['partner_id', 'checksum'])
+        self.env.cr.execute("""
+            SELECT partner_id, checksum
+              FROM ifn_qr_backup
+             WHERE partner_id = ANY(%s)
+        """, [list(images)])
+        existing = set(self.env.cr.fetchall())
+        to_backup = [(partner, raw, checksum) for partner, raw, checksum in images.values()
+                     if (partner.id, checksum) not in existing]
+        if not to_backup:
+            return self.browse()
+
+        blobs = self._ifn_get_blobs({checksum: raw for _partner, raw, checksum in to_backup})
+        backups = self.create([{
+            'partner_id': partner.id,
+            'version': partner.x_ifn_version,
+            'qr_ref': partner.x_ifn_qr_ref,
+            'checksum': checksum,
+            'attachment_id': blobs[checksum],
+        } for partner, _raw, checksum in to_backup])
+        _logger.info(f"QR backups: {len(backups)} indexed, {len(images) - len(backups)} already saved")
+        return backups
+
+    @api.model
+    def _ifn_get_blobs(self, raw_by_checksum):
+        """Pièces jointes des images {empreinte: id}, créées seulement pour les empreintes nouvelles"""
+        Attachment = self.env['ir.attachment'].sudo()
+        blobs = {
+            attachment.checksum: attachment.id
+            for attachment in Attachment.search([
+                ('res_model', '=', self._name),
+                ('checksum', 'in', list(raw_by_checksum)),
+            ])
+        }
+        missing = [checksum for checksum in raw_by_checksum if checksum not in blobs]
+        if missing:
+            attachments = Attachment.create([{
+                'name': f"qr_backup_{checksum}.png",
+                'type': 'binary',
+                'raw': raw_by_checksum[checksum],
+                'mimetype': 'image/png',
+                'res_model': self._name,
+            } for checksum in missing])
+            blobs.update(zip(missing, attachments.ids))
+        return blobs
+
+    def action_restore(self):
+        """Restaure l'image QR sauvegardée sur le partenaire"""
+        self.ensure_one()
+        self.partner_id.write({
+            'x_ifn_qr': self.attachment_id.datas,
+            'x_ifn_qr_ref': self.qr_ref,
+        })
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('QR restauré'),
+                'message': _('Le QR de %s a été restauré') % self.partner_id.name,
+                'type': 'success',
+            }
+        }
+
+    @api.model
+    def _cron_cleanup_qr_backups(self):
+        """Applique la rétention des sauvegardes puis supprime les images orphelines
+
+        Une sauvegarde est supprimée si elle dépasse la durée de rétention ou
+        le nombre de versions conservées par partenaire ; la plus récente de
+        chaque partenaire est toujours conservée.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        retention_days = int(ICP.get_param('ifn_core.qr_backup_retention_days', '365'))
+        keep_versions = int(ICP.get_param('ifn_core.qr_backup_keep_versions', '5'))
+
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id
+              FROM (SELECT id, backup_date,
+                           row_number() OVER (PARTITION BY partner_id
+                                              ORDER BY backup_date DESC, id DESC) AS rank
+                      FROM ifn_qr_backup) ranked
+             WHERE rank > 1
+               AND ((%(keep)s > 0 AND rank > %(keep)s)
+                    OR (%(days)s > 0 AND backup_date < %(cutoff)s))
+        """, {
+            'keep': keep_versions,
+            'days': retention_days,
+            'cutoff': fields.Datetime.now() - timedelta(days=retention_days),
+        })
+        expired = self.browse([row[0] for row in self.env.cr.fetchall()])
+        expired.unlink()
+
+        # Images qui ne sont plus référencées (fichiers libérés par le nettoyage du filestore)
+        self.env.cr.execute("""
+            SELECT a.id
+              FROM ir_attachment a
+             WHERE a.res_model = %s
+               AND NOT EXISTS (SELECT 1 FROM ifn_qr_backup b WHERE b.attachment_id = a.id)
+        """, [self._name])
+        orphans = self.env['ir.attachment'].sudo().browse([row[0] for row in self.env.cr.fetchall()])
+        orphans.unlink()
+        _logger.info(f"QR backup cleanup: {len(expired)} backups and {len(orphans)} images removed")
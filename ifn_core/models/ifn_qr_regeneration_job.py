@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import threading
+import time
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .ifn_mixin import render_qr_image
+from .ifn_partner_import import MAX_ERROR_LINES
+
+_logger = logging.getLogger(__name__)
+
+
+class IFNQRRegenerationJob(models.Model):
+    _name = 'ifn.qr.regeneration.job'
+    _description = 'Tâche de régénération des QR IFN'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char('Nom', required=True, default=lambda self: _('Régénération QR'))
+    state = fields.Selection([
+        ('queued', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+        ('cancelled', 'Annulé'),
+    ], string='État', default='queued', required=True, index=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='Lancé par', readonly=True,
+                              default=lambda self: self.env.user)
+
+    # Sélection des partenaires et options
+    partner_domain = fields.Text('Domaine partenaires', required=True, readonly=True, default='[]',
+                                 help='Domaine (JSON) des partenaires à traiter')
+    backup_existing = fields.Boolean('Sauvegarder anciens QR', default=True, readonly=True)
+    update_qr_ref = fields.Boolean('Mettre à jour référence QR', default=True, readonly=True)
+    update_generation_date = fields.Boolean('Mettre à jour date génération', default=True, readonly=True)
+
+    # Avancement (last_partner_id sert de curseur de reprise)
+    last_partner_id = fields.Integer('Dernier partenaire traité', readonly=True)
+    total_count = fields.Integer('Total partenaires', readonly=True)
+    processed_count = fields.Integer('Nombre traité', readonly=True)
+    success_count = fields.Integer('Nombre réussi', readonly=True)
+    error_count = fields.Integer('Nombre erreur', readonly=True)
+    errors = fields.Text('Erreurs', readonly=True)
+    progress = fields.Float('Progression (%)', compute='_compute_progress')
+    last_error = fields.Text('Dernière erreur bloquante', readonly=True)
+    date_started = fields.Datetime('Début', readonly=True)
+    date_finished = fields.Datetime('Fin', readonly=True)
+
+    @api.depends('processed_count', 'total_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.total_count:
+                job.progress = min(100.0, 100.0 * job.processed_count / job.total_count)
+            else:
+                job.progress = 0.0
+
+    @api.model
+    def _ifn_enqueue(self, domain, **options):
+        """Crée une tâche pour les partenaires du domaine et déclenche son traitement"""
+        domain = list(domain) + [('x_ifn_uid', '!=', False)]
+        job = self.create(dict(
+            options,
+            partner_domain=json.dumps(domain),
+            total_count=self.env['res.partner'].with_context(active_test=False).search_count(domain),
+        ))
+        job._ifn_trigger_processing()
+        return job
+
+    def action_cancel(self):
+        """Annule les tâches non terminées (les QR déjà régénérés sont conservés)"""
+        self.filtered(lambda job: job.state in ('queued', 'running', 'failed')).write({
+            'state': 'cancelled',
+            'date_finished': fields.Datetime.now(),
+        })
+
+    def action_resume(self):
+        """Relance une tâche en échec à partir de son curseur"""
+        jobs = self.filtered(lambda job: job.state == 'failed')
+        if not jobs:
+            raise UserError(_('Seules les tâches en échec peuvent être relancées'))
+        jobs.write({'state': 'running', 'last_error': False})
+        jobs._ifn_trigger_processing()
+
+    def _ifn_trigger_processing(self):
+        """Demande l'exécution immédiate du cron de régénération ; échoue s'il est absent ou désactivé"""
+        cron = self.sudo().env.ref('ifn_core.ir_cron_ifn_qr_regeneration_jobs', raise_if_not_found=False)
+        if not cron or not cron.active:
+            raise UserError(_("Le cron de régénération des QR est absent ou désactivé : "
+                              "la régénération ne peut pas être lancée"))
+        cron._trigger()
+
+    @api.model
+    def _get_chunk_size(self):
+        """Nombre de partenaires régénérés et validés (commit) par lot"""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.qr_regeneration_chunk_size', '200'
+        ))
+
+    @api.model
+    def _cron_process_qr_regeneration_jobs(self, time_budget=None):
+        """Traite les tâches de régénération en attente ou interrompues, lot par lot"""
+        if time_budget is None:
+            time_budget = int(self.env['ir.config_parameter'].sudo().get_param(
+                'ifn_core.qr_regeneration_time_budget', '600'
+            ))
+        deadline = time.monotonic() + time_budget
+
+        while time.monotonic() < deadline:
+            self.env.cr.execute("""
+                SELECT id FROM ifn_qr_regeneration_job
+                 WHERE state IN ('queued', 'running')
+              ORDER BY id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                return
+            if not self.browse(row[0])._process(deadline):
+                break
+
+        # Il reste du travail : reprogrammer le cron
+        if self.search_count([('state', 'in', ('queued', 'running'))]):
+            self._ifn_trigger_processing()
+
+    def _process(self, deadline):
+        """Régénère les QR par lots jusqu'à la fin de la sélection ou du temps imparti
+
+        Pour chaque lot : rendu des images en parallèle (fonction pure, sans
+        accès base), puis sauvegardes, écritures et journal d'audit groupés,
+        validés avec le curseur. Retourne True si la tâche est terminée.
+        """
+        self.ensure_one()
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        if self.state == 'queued':
+            self.write({'state': 'running', 'date_started': fields.Datetime.now()})
+
+        Partner = self.env['res.partner'].with_context(active_test=False)
+        domain = json.loads(self.partner_domain)
+        chunk_size = self._get_chunk_size()
+        try:
+            while True:
+                partners = Partner.search(domain + [('id', '>', self.last_partner_id)],
+                                          order='id', limit=chunk_size)
+                if not partners:
+                    break
+                self._regenerate_chunk(partners)
+                self._ifn_send_progress()
+                if auto_commit:
+                    self.env.cr.commit()
+                self.env.invalidate_all()
+                if time.monotonic() >= deadline:
+                    return False
+        except Exception as e:
+            _logger.exception(f"QR regeneration job {self.id} failed after partner {self.last_partner_id}")
+            if auto_commit:
+                self.env.cr.rollback()
+            self.write({'state': 'failed', 'last_error': str(e)})
+            self._ifn_send_progress()
+            if auto_commit:
+                self.env.cr.commit()
+            return True
+
+        self.write({'state': 'done', 'date_finished': fields.Datetime.now()})
+        self._ifn_send_progress()
+        if auto_commit:
+            self.env.cr.commit()
+        _logger.info(f"QR regeneration job {self.id} done: {self.success_count} regenerated, "
+                     f"{self.error_count} errors")
+        return True
+
+    def _regenerate_chunk(self, partners):
+        """Régénère les QR d'un lot de partenaires"""
+        errors = []
+        payloads = {partner.id: partner._ifn_get_qr_payload() for partner in partners}
+
+        images = {}
+        for partner in partners:
+            try:
+                images[partner.id] = render_qr_image(payloads[partner.id])
+            except Exception as e:
+                errors.append(f"Erreur pour {partner.name}: {str(e)}")
+                _logger.error(f"QR rendering error for partner {partner.id}: {str(e)}")
+
+        rendered = partners.filtered(lambda p: p.id in images)
+        if self.backup_existing:
+            self.env['ifn.qr.backup'].sudo()._ifn_backup_partners(rendered)
+
+        self._ifn_write_qr(rendered, images, payloads)
+        rendered._ifn_bump_version()
+        rendered._ifn_publish_events('ifn.qr.refreshed')
+
+        self.env['ifn.audit.log'].sudo().create([{
+            'object_model': 'res.partner',
+            'object_id': partner.id,
+            'action': 'qr_generated',
+            'category': 'system',
+            'user_id': self.user_id.id or self.env.uid,
+            'details': f"QR code regenerated for partner {partner.name} (UID: {partner.x_ifn_uid})",
+        } for partner in rendered])
+
+        self._ifn_record_chunk(partners[-1].id, len(partners), len(rendered), errors)
+
+    def _ifn_write_qr(self, partners, images, payloads):
+        """Enregistre les QR rendus du lot : images par partenaire, références et dates en une requête
+
+        Écritures techniques : version et événements sont traités une fois
+        pour le lot par l'appelant.
+        """
+        for partner in partners.with_context(ifn_no_track=True):
+            partner.write({'x_ifn_qr': images[partner.id]})
+
+        assignments = []
+        if self.update_qr_ref:
+            assignments.append('x_ifn_qr_ref = v.qr_ref')
+        if self.update_generation_date:
+            assignments.append('x_ifn_qr_generated_date = %(now)s')
+        if not partners or not assignments:
+            return
+        partners.flush_recordset(['x_ifn_qr_ref', 'x_ifn_qr_generated_date'])
+        self.env.cr.execute(
+            f'UPDATE "{partners._table}" AS p SET {", ".join(assignments)} '
+            f'FROM unnest(%(ids)s, %(refs)s::varchar[]) AS v(id, qr_ref) '
+            f'WHERE p.id = v.id',
+            {
+                'now': fields.Datetime.now(),
+                'ids': partners.ids,
+                'refs': [partner._ifn_generate_qr_ref(payloads[partner.id]) if self.update_qr_ref else None
+                         for partner in partners],
+            }
+        )
+        partners.invalidate_recordset(['x_ifn_qr_ref', 'x_ifn_qr_generated_date'])
+
+    def _ifn_record_chunk(self, last_partner_id, processed, succeeded, errors):
+        """Avance le curseur et cumule les compteurs d'un lot, en une écriture"""
+        vals = {
+            'last_partner_id': last_partner_id,
+            'processed_count': self.processed_count + processed,
+            'success_count': self.success_count + succeeded,
+            'error_count': self.error_count + len(errors),
+        }
+        kept_lines = self.errors.count('\n') + 1 if self.errors else 0
+        if errors and kept_lines < MAX_ERROR_LINES:
+            new_errors = '\n'.join(errors[:MAX_ERROR_LINES - kept_lines])
+            vals['errors'] = f"{self.errors}\n{new_errors}" if self.errors else new_errors
+        self.write(vals)
+
+    def _ifn_send_progress(self):
+        """Publie l'avancement de la tâche à son auteur sur le bus"""
+        elapsed = (fields.Datetime.now() - self.date_started).total_seconds() if self.date_started else 0
+        rate = self.processed_count / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_count - self.processed_count, 0)
+        self.env['bus.bus']._sendone(self.user_id.partner_id, 'ifn_qr_regeneration_progress', {
+            'job_id': self.id,
+            'state': self.state,
+            'processed_count': self.processed_count,
+            'total_count': self.total_count,
+            'success_count': self.success_count,
+            'error_count': self.error_count,
+            'partners_per_sec': round(rate, 1),
+            'eta_seconds': round(remaining / rate) if rate else None,
+        })
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, api
+from odoo.modules.db import FunctionStatus
+
+_logger = logging.getLogger(__name__)
+
+
+class IFNSearchMixin(models.AbstractModel):
+    """Mixin de recherche IFN : autocomplétion par trigrammes classée par similarité
+
+    Les champs de `_ifn_search_fields` doivent être déclarés avec
+    `index='trigram'` : Odoo crée alors les index GIN pg_trgm (sur
+    l'expression traduite et sans accents le cas échéant) que les requêtes
+    ci-dessous réutilisent.
+    """
+    _name = 'ifn.search.mixin'
+    _description = 'Mixin recherche IFN'
+
+    # Champs interrogés par l'autocomplétion (à surcharger si différents)
+    _ifn_search_fields = ('name', 'code')
+
+    def _ifn_use_unaccent(self):
+        """unaccent n'est appliqué que s'il est indexable, comme pour les index trigrammes d'Odoo"""
+        return self.env.registry.has_unaccent == FunctionStatus.INDEXABLE
+
+    def _ifn_search_expression(self, field_name):
+        """Expression SQL d'un champ, identique à celle de son index trigramme"""
+        field = self._fields[field_name]
+        expression = f'"{self._table}"."{field_name}"'
+        if field.translate:
+            expression = f"(jsonb_path_query_array({expression}, '$.*')::text)"
+        if self._ifn_use_unaccent():
+            expression = self.env.registry.unaccent(expression)
+        return expression
+
+    def _ifn_search_value(self, param):
+        """Expression SQL d'un paramètre nommé de la requête (sans accents si disponible)"""
+        placeholder = f'%({param})s'
+        if self._ifn_use_unaccent():
+            return self.env.registry.unaccent(placeholder)
+        return placeholder
+
+    @api.model
+    def _ifn_ranked_candidates(self, name, limit, offset=0):
+        """IDs correspondant au terme, du plus similaire au moins similaire"""
+        expressions = [self._ifn_search_expression(field_name) for field_name in self._ifn_search_fields]
+        pattern = self._ifn_search_value('pattern')
+        term = self._ifn_search_value('term')
+        # ILIKE servi par les index GIN trigrammes, classement par similarité au terme
+        match_clause = ' OR '.join(f"{expression} ILIKE {pattern}" for expression in expressions)
+        similarity = ', '.join(f"similarity({expression}, {term})" for expression in expressions)
+        self.env.cr.execute(f"""
+            SELECT "{self._table}".id
+              FROM "{self._table}"
+             WHERE {match_clause}
+          ORDER BY greatest({similarity}) DESC, "{self._table}".id
+             LIMIT %(limit)s OFFSET %(offset)s
+        """, {
+            'term': name,
+            'pattern': f'%{name}%',
+            'limit': limit,
+            'offset': offset,
+        })
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _ifn_ranked_search(self, name, args=None, limit=100):
+        """Recherche classée par similarité ; domaine et règles d'accès appliqués aux candidats"""
+        batch_size = max((limit or 100) * 4, 50)
+        results = []
+        offset = 0
+        while True:
+            candidate_ids = self._ifn_ranked_candidates(name, batch_size, offset)
+            offset += batch_size
+            if candidate_ids:
+                allowed_ids = set(self.search([('id', 'in', candidate_ids)] + (args or [])).ids)
+                results.extend(record_id for record_id in candidate_ids if record_id in allowed_ids)
+            if len(candidate_ids) < batch_size or (limit and len(results) >= limit):
+                break
+        return self.browse(results[:limit] if limit else results)
+
+    @api.model
+    def name_search(self, name='', args=None, operator='ilike', limit=100):
+        args = args or []
+        if name and operator == 'ilike' and self.env.registry.has_trigram:
+            self.flush_model(self._ifn_search_fields)
+            return self._ifn_ranked_search(name, args, limit).name_get()
+
+        domain = []
+        if name:
+            domain = ['|'] * (len(self._ifn_search_fields) - 1) + [
+                (field_name, operator, name) for field_name in self._ifn_search_fields
+            ]
+        records = self.search(domain + args, limit=limit)
+        return records.name_get()
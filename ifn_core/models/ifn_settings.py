@@ -35,6 +35,12 @@ class IFNSettings(models.TransientModel):
                                          config_parameter='ifn_core.qr_auto_generate')
     ifn_qr_ttl_days = fields.Integer('Durée de validité QR (jours)',
                                     config_parameter='ifn_core.qr_ttl_days', default=365)
+    ifn_qr_refresh_batch_size = fields.Integer('Taille des lots de rafraîchissement QR',
+                                               config_parameter='ifn_core.qr_refresh_batch_size',
+                                               default=100)
+    ifn_qr_refresh_time_budget = fields.Integer('Budget temps rafraîchissement QR (secondes)',
+                                                config_parameter='ifn_core.qr_refresh_time_budget',
+                                                default=600)
     ifn_uid_sequence_id = fields.Many2one('ir.sequence', string='Séquence UID IFN')
 
     # Internationalisation
@@ -91,6 +97,15 @@ class IFNSettings(models.TransientModel):
     ifn_orange_api_secret = fields.Char('Orange API Secret',
                                        config_parameter='ifn_core.orange_api_secret')
 
+    # Rappels de validation (file mail)
+    ifn_reminder_rate_per_minute = fields.Integer('Rappels par minute',
+                                                  config_parameter='ifn_core.reminder_rate_per_minute',
+                                                  default=100,
+                                                  help='Limite de débit du fournisseur (0 = sans limite)')
+    ifn_reminder_interval_days = fields.Integer('Intervalle entre rappels (jours)',
+                                                config_parameter='ifn_core.reminder_interval_days',
+                                                default=7)
+
     # Services vocaux
     ifn_voice_services_enabled = fields.Boolean('Services vocaux activés',
                                                config_parameter='ifn_core.voice_services_enabled')
@@ -180,6 +195,9 @@ class IFNSettings(models.TransientModel):
         if self.ifn_qr_ttl_days <= 0:
             raise ValidationError(_('La durée de validité QR doit être positive'))
 
+        if self.ifn_qr_refresh_batch_size <= 0 or self.ifn_qr_refresh_time_budget <= 0:
+            raise ValidationError(_('La taille des lots et le budget temps du rafraîchissement QR doivent être positifs'))
+
         if self.ifn_audit_retention_days <= 0:
             raise ValidationError(_('La rétention des logs audit doit être positive'))
 
@@ -262,22 +280,18 @@ class IFNSettings(models.TransientModel):
             }
 
     def action_regenerate_all_qr(self):
-        """Régénère tous les codes QR"""
+        """Régénère tous les codes QR en tâche de fond"""
         self.ensure_one()
-        partners = self.env['res.partner'].search([('x_ifn_uid', '!=', False)])
-
-        total = len(partners)
-        for i, partner in enumerate(partners):
-            partner._ifn_generate_qr()
-            if i % 100 == 0:  # Progress update
-                _logger.info(f"QR regeneration progress: {i}/{total}")
+        job = self.env['ifn.qr.regeneration.job']._ifn_enqueue(
+            [('active', '=', True)], name=_('Régénération de tous les QR'), backup_existing=False,
+        )
 
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _('QR régénérés'),
-                'message': _('%s codes QR ont été régénérés') % total,
+                'title': _('Régénération QR lancée'),
+                'message': _('%s codes QR seront régénérés en tâche de fond') % job.total_count,
                 'type': 'success',
             }
         }
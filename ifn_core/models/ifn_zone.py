@@ -2,20 +2,74 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+import logging
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .ifn_cache import ensure_cache_version, bump_cache_version, get_versioned_cache
+
+_logger = logging.getLogger(__name__)
+
+# Rayon de la sphère de la projection Web Mercator (EPSG:3857)
+MERCATOR_RADIUS_M = 6378137.0
+# Rayon moyen terrestre pour le calcul d'aire sphérique
+EARTH_RADIUS_M = 6371008.8
+# Nom du cache versionné de l'index des zones (voir ifn_cache)
+ZONE_INDEX_CACHE = 'ifn_zone_index'
+
+
+def _ring_area_m2(coords):
+    """Aire sphérique (m²) d'un anneau en coordonnées Web Mercator
+
+    Les points sont ramenés en longitude/latitude puis l'aire est calculée
+    par la formule des trapèzes sphériques (équivalente à une projection
+    équivalente de Lambert).
+    """
+    if len(coords) < 3:
+        return 0.0
+    if numpy is not None:
+        xy = numpy.asarray(coords, dtype=float)[:, :2]
+        lng = xy[:, 0] / MERCATOR_RADIUS_M
+        lat = 2 * numpy.arctan(numpy.exp(xy[:, 1] / MERCATOR_RADIUS_M)) - math.pi / 2
+        lng_next, lat_next = numpy.roll(lng, -1), numpy.roll(lat, -1)
+        total = numpy.sum((lng_next - lng) * (2 + numpy.sin(lat) + numpy.sin(lat_next)))
+    else:
+        points = [(x / MERCATOR_RADIUS_M, 2 * math.atan(math.exp(y / MERCATOR_RADIUS_M)) - math.pi / 2)
+                  for x, y, *_z in coords]
+        total = sum((lng2 - lng1) * (2 + math.sin(lat1) + math.sin(lat2))
+                    for (lng1, lat1), (lng2, lat2) in zip(points, points[1:] + points[:1]))
+    return abs(float(total)) * EARTH_RADIUS_M ** 2 / 2
+
+
+def polygon_area_km2(geometry):
+    """Aire (km²) d'un polygone ou multipolygone Web Mercator, trous déduits"""
+    polygons = getattr(geometry, 'geoms', [geometry])
+    area = 0.0
+    for polygon in polygons:
+        area += _ring_area_m2(list(polygon.exterior.coords))
+        area -= sum(_ring_area_m2(list(interior.coords)) for interior in polygon.interiors)
+    return max(area, 0.0) / 1000000.0
 
 
 class IFNZone(models.Model):
     _name = 'ifn.zone'
+    _inherit = ['ifn.geo.mixin', 'ifn.search.mixin']
     _description = 'Zone IFN'
     _order = 'code'
     _rec_name = 'display_name'
+    _parent_name = 'parent_id'
+    _parent_store = True
     _sql_constraints = [
         ('code_unique', 'unique(code)', 'Le code de la zone doit être unique !'),
     ]
 
     # Informations générales
-    name = fields.Char('Nom de la zone', required=True, translate=True)
-    code = fields.Char('Code zone', required=True, size=10,
+    name = fields.Char('Nom de la zone', required=True, translate=True, index='trigram')
+    code = fields.Char('Code zone', required=True, size=10, index='trigram',
                       help='Code interne unique de la zone')
     display_name = fields.Char('Nom affiché', compute='_compute_display_name', store=True)
 
@@ -29,7 +83,8 @@ class IFNZone(models.Model):
     ], string='Type de zone', default='geographic', required=True)
 
     parent_id = fields.Many2one('ifn.zone', string='Zone parente',
-                               ondelete='cascade')
+                               ondelete='cascade', index=True)
+    parent_path = fields.Char(index=True, unaccent=False)
     child_ids = fields.One2many('ifn.zone', 'parent_id', string='Sous-zones')
     level = fields.Integer('Niveau', compute='_compute_level', store=True)
 
@@ -69,7 +124,45 @@ class IFNZone(models.Model):
     coop_count = fields.Integer('Nombre de coopératives',
                                compute='_compute_counts', store=True)
     partner_count = fields.Integer('Nombre de partenaires',
-                                  compute='_compute_partner_count')
+                                  compute='_compute_partner_count', store=True,
+                                  help='Partenaires actifs distincts des marchés et coopératives de la zone')
+    geo_partner_count = fields.Integer('Partenaires géolocalisés dans la zone',
+                                      compute='_compute_geo_partner_count',
+                                      help='Partenaires actifs dont la position est dans la géométrie de la zone')
+
+    # Statistiques agrégées sur la zone et toutes ses sous-zones
+    subtree_market_count = fields.Integer('Marchés (sous-zones incluses)',
+                                         compute='_compute_subtree_counts')
+    subtree_coop_count = fields.Integer('Coopératives (sous-zones incluses)',
+                                       compute='_compute_subtree_counts')
+    subtree_partner_count = fields.Integer('Partenaires (sous-zones incluses)',
+                                          compute='_compute_subtree_counts')
+
+    def init(self):
+        super().init()
+        self._ifn_ensure_spatial_index('geometry')
+        ensure_cache_version(self.env.cr, ZONE_INDEX_CACHE)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        zones = super().create(vals_list)
+        if any(vals.get('geometry') for vals in vals_list):
+            self._ifn_invalidate_zone_index()
+            self._ifn_assign_partners(zones.ids)
+        return zones
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'geometry' in vals or 'active' in vals:
+            self._ifn_invalidate_zone_index()
+            self._ifn_assign_partners(self.ids)
+        return result
+
+    def unlink(self):
+        # Les affectations partenaires sont supprimées en cascade par la table de relation
+        result = super().unlink()
+        self._ifn_invalidate_zone_index()
+        return result
 
     @api.depends('name', 'code')
     def _compute_display_name(self):
@@ -79,41 +172,56 @@ class IFNZone(models.Model):
             else:
                 zone.display_name = zone.name
 
-    @api.depends('parent_id')
+    @api.depends('parent_id', 'parent_path')
     def _compute_level(self):
         for zone in self:
-            if zone.parent_id:
+            if zone.parent_path:
+                # parent_path = "1/4/9/" : un identifiant par niveau
+                zone.level = zone.parent_path.count('/') - 1
+            elif zone.parent_id:
                 zone.level = zone.parent_id.level + 1
             else:
                 zone.level = 0
 
     @api.depends('partner_latitude', 'partner_longitude')
     def _compute_geo_point(self):
-        for zone in self:
-            if zone.partner_latitude and zone.partner_longitude:
-                zone.geo_point = fields.GeoPoint.from_latlon(
-                    cr=self.env.cr,
-                    latitude=zone.partner_latitude,
-                    longitude=zone.partner_longitude
-                )
-            else:
-                zone.geo_point = False
+        self._ifn_compute_geo_points()
 
     @api.depends('geometry')
     def _compute_area(self):
-        """Calcul de la superficie si géométrie disponible"""
-        for zone in self:
-            if zone.geometry:
-                try:
-                    # Utilisation de PostGIS si disponible
-                    zone.area_km2 = self.env.cr.execute("""
-                        SELECT ST_Area(ST_Transform(geometry, 4326)) / 1000000
-                        FROM ifn_zone WHERE id = %s
-                    """, [zone.id])[0][0] or 0.0
-                except Exception:
-                    zone.area_km2 = 0.0
-            else:
-                zone.area_km2 = 0.0
+        """Calcul de la superficie si géométrie disponible
+
+        Une seule requête PostGIS pour toutes les zones du lot (aire
+        géodésique) ; calcul sphérique en Python si PostGIS est absent.
+        """
+        with_geometry = self.filtered('geometry')
+        (self - with_geometry).area_km2 = 0.0
+        if not with_geometry:
+            return
+
+        areas = None
+        if self._ifn_has_postgis():
+            areas = with_geometry._ifn_postgis_areas()
+        if areas is None:
+            areas = [polygon_area_km2(zone.geometry) for zone in with_geometry]
+        for zone, area in zip(with_geometry, areas):
+            zone.area_km2 = area or 0.0
+
+    def _ifn_postgis_areas(self):
+        """Aires (km²) des géométries du lot, dans l'ordre du recordset, en une requête"""
+        srid = getattr(self._fields['geometry'], 'srid', 3857)
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("""
+                    SELECT ST_Area(ST_Transform(ST_SetSRID(ST_GeomFromWKB(decode(t.wkb, 'hex')), %s),
+                                                4326)::geography) / 1000000.0
+                      FROM unnest(%s::text[]) WITH ORDINALITY AS t(wkb, idx)
+                  ORDER BY t.idx
+                """, [srid, [zone.geometry.wkb_hex for zone in self]])
+                return [area for (area,) in self.env.cr.fetchall()]
+        except Exception as e:
+            _logger.warning(f"PostGIS area computation failed, falling back to Python: {e}")
+            return None
 
     @api.depends('market_ids', 'coop_ids')
     def _compute_counts(self):
@@ -121,19 +229,259 @@ class IFNZone(models.Model):
             zone.market_count = len(zone.market_ids)
             zone.coop_count = len(zone.coop_ids)
 
+    @api.depends('market_ids', 'coop_ids')
     def _compute_partner_count(self):
-        """Compte les partenaires dans les marchés/coops de la zone"""
+        """Compte les partenaires dans les marchés/coops de la zone
+
+        Une seule requête groupée pour toutes les zones ; recalculé aussi par
+        res.partner lorsque le marché, la coopérative ou l'archivage d'un
+        partenaire change.
+        """
+        zone_ids = [zone_id for zone_id in self.ids if isinstance(zone_id, int)]
+        counts = {}
+        if zone_ids:
+            self.flush_model(['market_ids', 'coop_ids'])
+            self.env['res.partner'].flush_model(['x_ifn_market_id', 'x_ifn_coop_id', 'active'])
+            self.env.cr.execute(f"""
+                SELECT links.zone_id, count(*)
+                  FROM ({self._ifn_zone_partner_links_query()}) AS links
+              GROUP BY links.zone_id
+            """, {'zone_ids': zone_ids})
+            counts = dict(self.env.cr.fetchall())
         for zone in self:
-            partners = self.env['res.partner']
-            if zone.market_ids:
-                partners |= self.env['res.partner'].search([
-                    ('x_ifn_market_id', 'in', zone.market_ids.ids)
-                ])
-            if zone.coop_ids:
-                partners |= self.env['res.partner'].search([
-                    ('x_ifn_coop_id', 'in', zone.coop_ids.ids)
-                ])
-            zone.partner_count = len(partners)
+            zone.partner_count = counts.get(zone.id, 0)
+
+    @api.model
+    def _ifn_zone_partner_links_query(self):
+        """Sous-requête SQL des couples (zone_id, partner_id) distincts
+
+        Un partenaire actif est rattaché à une zone par son marché ou sa
+        coopérative ; attend le paramètre nommé `zone_ids`.
+        """
+        market_rel = self._fields['market_ids']
+        coop_rel = self._fields['coop_ids']
+        return f"""
+            SELECT zm."{market_rel.column1}" AS zone_id, p.id AS partner_id
+              FROM "{market_rel.relation}" zm
+              JOIN res_partner p ON p.x_ifn_market_id = zm."{market_rel.column2}"
+             WHERE zm."{market_rel.column1}" = ANY(%(zone_ids)s) AND p.active
+             UNION
+            SELECT zc."{coop_rel.column1}" AS zone_id, p.id AS partner_id
+              FROM "{coop_rel.relation}" zc
+              JOIN res_partner p ON p.x_ifn_coop_id = zc."{coop_rel.column2}"
+             WHERE zc."{coop_rel.column1}" = ANY(%(zone_ids)s) AND p.active
+        """
+
+    def _compute_geo_partner_count(self):
+        """Compte en une requête les partenaires affectés géographiquement à chaque zone"""
+        zone_ids = [zone_id for zone_id in self.ids if isinstance(zone_id, int)]
+        counts = {}
+        if zone_ids:
+            self.env.cr.execute("""
+                SELECT rel.zone_id, count(*)
+                  FROM ifn_partner_zone_rel rel
+                  JOIN res_partner p ON p.id = rel.partner_id AND p.active
+                 WHERE rel.zone_id = ANY(%s)
+              GROUP BY rel.zone_id
+            """, [zone_ids])
+            counts = dict(self.env.cr.fetchall())
+        for zone in self:
+            zone.geo_partner_count = counts.get(zone.id, 0)
+
+    def _compute_subtree_counts(self):
+        """Agrège marchés, coopératives et partenaires de chaque zone et de ses sous-zones"""
+        root_ids = [zone_id for zone_id in self.ids if isinstance(zone_id, int)]
+        counts = {}
+        if root_ids:
+            self.flush_model(['parent_path', 'market_ids', 'coop_ids'])
+            self.env['res.partner'].flush_model(['x_ifn_market_id', 'x_ifn_coop_id', 'active'])
+            subtree_ids = self.with_context(active_test=False).search([('id', 'child_of', root_ids)]).ids
+            market_rel = self._fields['market_ids']
+            coop_rel = self._fields['coop_ids']
+            links_queries = {
+                'subtree_market_count': f"""
+                    SELECT "{market_rel.column1}" AS zone_id, "{market_rel.column2}" AS item_id
+                      FROM "{market_rel.relation}"
+                     WHERE "{market_rel.column1}" = ANY(%(zone_ids)s)
+                """,
+                'subtree_coop_count': f"""
+                    SELECT "{coop_rel.column1}" AS zone_id, "{coop_rel.column2}" AS item_id
+                      FROM "{coop_rel.relation}"
+                     WHERE "{coop_rel.column1}" = ANY(%(zone_ids)s)
+                """,
+                'subtree_partner_count': f"""
+                    SELECT zone_id, partner_id AS item_id
+                      FROM ({self._ifn_zone_partner_links_query()}) AS partner_links
+                """,
+            }
+            for field_name, links_query in links_queries.items():
+                # Sous-arbre par préfixe de parent_path (index), dédoublonné par racine
+                self.env.cr.execute(f"""
+                    SELECT root.id, count(DISTINCT links.item_id)
+                      FROM ifn_zone root
+                      JOIN ifn_zone sub ON sub.parent_path LIKE root.parent_path || '%%'
+                      JOIN ({links_query}) AS links ON links.zone_id = sub.id
+                     WHERE root.id = ANY(%(root_ids)s)
+                  GROUP BY root.id
+                """, {'root_ids': root_ids, 'zone_ids': subtree_ids})
+                counts[field_name] = dict(self.env.cr.fetchall())
+        for zone in self:
+            for field_name in ('subtree_market_count', 'subtree_coop_count', 'subtree_partner_count'):
+                zone[field_name] = counts.get(field_name, {}).get(zone.id, 0)
+
+    @api.model
+    def _ifn_recompute_partner_counts(self, markets, coops):
+        """Programme le recalcul du nombre de partenaires des zones couvrant ces marchés/coops"""
+        if not markets and not coops:
+            return
+        zones = self.sudo().with_context(active_test=False).search([
+            '|', ('market_ids', 'in', markets.ids), ('coop_ids', 'in', coops.ids)
+        ])
+        if zones:
+            self.env.add_to_compute(self._fields['partner_count'], zones)
+
+    # ------------------------------------------------------------
+    # Affectation géographique des partenaires (point dans polygone)
+    # ------------------------------------------------------------
+
+    @api.model
+    def _ifn_load_zone_geometries(self, zone_ids=None):
+        """Retourne [(zone_id, géométrie)] des zones actives ayant une géométrie"""
+        self.flush_model(['active', 'geometry'])
+        query = "SELECT id, geometry FROM ifn_zone WHERE active AND geometry IS NOT NULL"
+        params = []
+        if zone_ids is not None:
+            query += " AND id = ANY(%s)"
+            params.append(list(zone_ids))
+        self.env.cr.execute(query, params)
+        geometry_field = self._fields['geometry']
+        return [(zone_id, geometry_field.load_geo(wkb)) for zone_id, wkb in self.env.cr.fetchall()]
+
+    @api.model
+    def _ifn_build_zone_index(self, zone_geometries):
+        """Construit un STR-tree des géométries de zones"""
+        from shapely.prepared import prep
+        from shapely.strtree import STRtree
+
+        geometries = [geometry for _zone_id, geometry in zone_geometries]
+        entries = [(zone_id, prep(geometry)) for zone_id, geometry in zone_geometries]
+        # Shapely < 2 retourne les géométries, Shapely >= 2 leurs positions
+        positions = {id(geometry): position for position, geometry in enumerate(geometries)}
+        return {
+            'tree': STRtree(geometries) if geometries else None,
+            'entries': entries,
+            'positions': positions,
+        }
+
+    @api.model
+    def _ifn_get_zone_index(self):
+        """STR-tree en mémoire des zones actives, pour les recherches unitaires"""
+        return get_versioned_cache(self.env, ZONE_INDEX_CACHE, self._ifn_load_zone_index)
+
+    @api.model
+    def _ifn_load_zone_index(self):
+        """Construit le STR-tree de toutes les zones actives"""
+        index = self._ifn_build_zone_index(self._ifn_load_zone_geometries())
+        _logger.info(f"Built in-memory zone index ({len(index['entries'])} zones)")
+        return index
+
+    @api.model
+    def _ifn_invalidate_zone_index(self):
+        """Invalide l'index des zones (tous les workers) en changeant sa version"""
+        bump_cache_version(self.env, ZONE_INDEX_CACHE)
+
+    @api.model
+    def _ifn_find_zone_ids(self, point, index=None):
+        """Retourne les IDs des zones contenant le point (même SRID que les zones)"""
+        index = index or self._ifn_get_zone_index()
+        if not point or index['tree'] is None:
+            return []
+        zone_ids = []
+        for candidate in index['tree'].query(point):
+            position = index['positions'][id(candidate)] if hasattr(candidate, 'geom_type') else int(candidate)
+            zone_id, prepared = index['entries'][position]
+            if prepared.contains(point):
+                zone_ids.append(zone_id)
+        return zone_ids
+
+    @api.model
+    def _ifn_set_partner_zones(self, partner_zone_ids):
+        """Remplace les zones des partenaires : {partner_id: [zone_id, ...]}"""
+        if not partner_zone_ids:
+            return
+        partner_ids = list(partner_zone_ids)
+        pairs = [(partner_id, zone_id)
+                 for partner_id, zone_ids in partner_zone_ids.items() for zone_id in zone_ids]
+        self.env.cr.execute("DELETE FROM ifn_partner_zone_rel WHERE partner_id = ANY(%s)", [partner_ids])
+        if pairs:
+            self.env.cr.execute("""
+                INSERT INTO ifn_partner_zone_rel (partner_id, zone_id)
+                SELECT * FROM unnest(%s::int[], %s::int[])
+            """, [[pair[0] for pair in pairs], [pair[1] for pair in pairs]])
+        self.env['res.partner'].browse(partner_ids).invalidate_recordset(['x_ifn_zone_ids'])
+
+    @api.model
+    def _ifn_assign_partners(self, zone_ids=None):
+        """Affecte en masse les partenaires géolocalisés aux zones qui les contiennent
+
+        Avec PostGIS : un INSERT ... SELECT sur ST_Contains servi par les index
+        GiST des zones et des positions. Sinon : STR-tree en mémoire parcouru
+        par lots de positions. `zone_ids` restreint le recalcul à ces zones.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        zone_filter = ""
+        params = {}
+        if zone_ids is not None:
+            zone_ids = [zone_id for zone_id in zone_ids if isinstance(zone_id, int)]
+            if not zone_ids:
+                return 0
+            zone_filter = "AND z.id = ANY(%(zone_ids)s)"
+            params['zone_ids'] = zone_ids
+            cr.execute("DELETE FROM ifn_partner_zone_rel WHERE zone_id = ANY(%(zone_ids)s)", params)
+        else:
+            cr.execute("DELETE FROM ifn_partner_zone_rel")
+
+        if self._ifn_has_postgis():
+            cr.execute(f"""
+                INSERT INTO ifn_partner_zone_rel (partner_id, zone_id)
+                SELECT p.id, z.id
+                  FROM ifn_zone z
+                  JOIN res_partner p ON ST_Contains(z.geometry, p.x_ifn_geo_point)
+                 WHERE z.active AND z.geometry IS NOT NULL {zone_filter}
+            """, params)
+            assigned = cr.rowcount
+        else:
+            index = self._ifn_build_zone_index(self._ifn_load_zone_geometries(zone_ids))
+            point_field = self.env['res.partner']._fields['x_ifn_geo_point']
+            assigned = 0
+            last_id = 0
+            while index['tree'] is not None:
+                # Parcours des positions par pages d'IDs pour borner la mémoire
+                cr.execute("""
+                    SELECT id, x_ifn_geo_point
+                      FROM res_partner
+                     WHERE x_ifn_geo_point IS NOT NULL AND id > %s
+                  ORDER BY id
+                     LIMIT 5000
+                """, [last_id])
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                pairs = [(partner_id, zone_id)
+                         for partner_id, wkb in rows
+                         for zone_id in self._ifn_find_zone_ids(point_field.load_geo(wkb), index)]
+                if pairs:
+                    cr.execute("""
+                        INSERT INTO ifn_partner_zone_rel (partner_id, zone_id)
+                        SELECT * FROM unnest(%s::int[], %s::int[])
+                    """, [[pair[0] for pair in pairs], [pair[1] for pair in pairs]])
+                    assigned += len(pairs)
+
+        self.env['res.partner'].invalidate_model(['x_ifn_zone_ids'])
+        _logger.info(f"Zone assignment: {assigned} partner/zone links")
+        return assigned
 
     @api.constrains('partner_latitude', 'partner_longitude')
     def _check_coordinates(self):
@@ -145,15 +493,8 @@ class IFNZone(models.Model):
 
     @api.constrains('parent_id')
     def _check_hierarchy(self):
-        for zone in self:
-            if zone.parent_id and zone.parent_id.id == zone.id:
-                raise ValidationError(_('Une zone ne peut pas être sa propre parente'))
-            # Vérifier les cycles dans la hiérarchie
-            parent = zone.parent_id
-            while parent:
-                if parent.id == zone.id:
-                    raise ValidationError(_('Cycle détecté dans la hiérarchie des zones'))
-                parent = parent.parent_id
+        if not self._check_recursion():
+            raise ValidationError(_('Cycle détecté dans la hiérarchie des zones'))
 
     def action_view_markets(self):
         """Action pour voir les marchés de la zone"""
@@ -177,12 +518,38 @@ class IFNZone(models.Model):
             'type': 'ir.actions.act_window',
         }
 
+    def action_view_subtree_partners(self):
+        """Action pour voir les partenaires de la zone et de ses sous-zones"""
+        self.ensure_one()
+        return {
+            'name': _('Partenaires de %s') % self.name,
+            'view_mode': 'tree,form',
+            'res_model': 'res.partner',
+            'domain': self.get_subtree_partner_domain(),
+            'type': 'ir.actions.act_window',
+        }
+
+    def get_subtree_partner_domain(self):
+        """Domaine des partenaires rattachés aux zones et à toutes leurs sous-zones
+
+        Sous-zones, marchés et coopératives archivés compris, comme dans les
+        compteurs de _compute_subtree_counts.
+        """
+        subtree = self.with_context(active_test=False).search([('id', 'child_of', self.ids)])
+        return ['|',
+                ('x_ifn_market_id', 'in', subtree.market_ids.ids),
+                ('x_ifn_coop_id', 'in', subtree.coop_ids.ids)]
+
     def get_full_name(self):
         """Retourne le nom complet avec hiérarchie"""
         self.ensure_one()
-        if self.parent_id:
-            return f"{self.parent_id.get_full_name()} / {self.name}"
-        return self.name
+        if not self.parent_path:
+            if self.parent_id:
+                return f"{self.parent_id.get_full_name()} / {self.name}"
+            return self.name
+        # Ancêtres lus en une fois depuis le chemin matérialisé
+        ancestors = self.browse([int(zone_id) for zone_id in self.parent_path.split('/') if zone_id])
+        return ' / '.join(ancestors.mapped('name'))
 
     def name_get(self):
         result = []
@@ -191,13 +558,4 @@ class IFNZone(models.Model):
             if zone.level > 0:
                 name = f"{name} ({zone.zone_type})"
             result.append((zone.id, name))
-        return result
-
-    @api.model
-    def name_search(self, name='', args=None, operator='ilike', limit=100):
-        args = args or []
-        domain = []
-        if name:
-            domain = ['|', ('name', operator, name), ('code', operator, name)]
-        zones = self.search(domain + args, limit=limit)
-        return zones.name_get()
\ No newline at end of file
+        return result
\ No newline at end of file
@@ -2,7 +2,11 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import split_every
+from collections import defaultdict
 import logging
+import threading
+import time
 from datetime import timedelta
 
 _logger = logging.getLogger(__name__)
@@ -10,9 +14,16 @@ _logger = logging.getLogger(__name__)
 
 class ResPartner(models.Model):
     _name = 'res.partner'
-    _inherit = ['res.partner', 'ifn.mixin']
+    _inherit = ['res.partner', 'ifn.mixin', 'ifn.geo.mixin']
     _description = 'Partenaire IFN'
 
+    _ifn_geo_lat_field = 'x_ifn_geo_lat'
+    _ifn_geo_lng_field = 'x_ifn_geo_lng'
+    _ifn_geo_point_field = 'x_ifn_geo_point'
+
+    # Champs déterminant l'appartenance d'un partenaire à un marché/une coopérative
+    _ifn_membership_fields = {'x_ifn_market_id', 'x_ifn_coop_id', 'active'}
+
     # Rôle et profil IFN
     x_ifn_role = fields.Selection([
         ('merchant', 'Marchand'),
@@ -38,6 +49,9 @@ class ResPartner(models.Model):
     x_ifn_geo_lng = fields.Float('Longitude IFN', digits=(10, 6), copy=False)
     x_ifn_geo_point = fields.GeoPoint('Position géographique IFN',
                                      compute='_compute_ifn_geo_point', store=True)
+    x_ifn_zone_ids = fields.Many2many('ifn.zone', 'ifn_partner_zone_rel', 'partner_id', 'zone_id',
+                                      string='Zones géographiques', copy=False, readonly=True,
+                                      help='Zones dont la géométrie contient la position du partenaire')
 
     # Préférences linguistiques et vocales
     x_ifn_lang_pref = fields.Selection([
@@ -91,6 +105,8 @@ class ResPartner(models.Model):
     ], string='Statut du profil', default='draft', required=True, index=True)
 
     x_ifn_validation_date = fields.Datetime('Date validation')
+    x_ifn_last_reminder_date = fields.Datetime('Dernier rappel de validation', index=True,
+                                               copy=False, readonly=True)
     x_ifn_validator_id = fields.Many2one('res.users', string='Validé par')
     x_ifn_notes = fields.Text('Notes IFN')
 
@@ -117,15 +133,7 @@ class ResPartner(models.Model):
 
     @api.depends('x_ifn_geo_lat', 'x_ifn_geo_lng')
     def _compute_ifn_geo_point(self):
-        for partner in self:
-            if partner.x_ifn_geo_lat and partner.x_ifn_geo_lng:
-                partner.x_ifn_geo_point = fields.GeoPoint.from_latlon(
-                    cr=self.env.cr,
-                    latitude=partner.x_ifn_geo_lat,
-                    longitude=partner.x_ifn_geo_lng
-                )
-            else:
-                partner.x_ifn_geo_point = False
+        self._ifn_compute_geo_points()
 
     @api.constrains('x_ifn_geo_lat', 'x_ifn_geo_lng')
     def _check_ifn_coordinates(self):
@@ -142,6 +150,17 @@ class ResPartner(models.Model):
             if partner.x_ifn_role == 'coop_manager' and not partner.x_ifn_coop_id:
                 raise ValidationError(_('Un gestionnaire de coopérative doit être rattaché à une coopérative'))
 
+    @api.onchange('x_ifn_geo_lat', 'x_ifn_geo_lng')
+    def _onchange_ifn_geo_suggest_market(self):
+        """Propose le marché le plus proche lors de l'enregistrement sur le terrain"""
+        if self.x_ifn_market_id or not (self.x_ifn_geo_lat and self.x_ifn_geo_lng):
+            return
+        radius_km = self._ifn_get_suggestion_radius()
+        nearest = self.env['ifn.market']._ifn_find_nearest(
+            self.x_ifn_geo_lat, self.x_ifn_geo_lng, k=1, radius_km=radius_km)
+        if nearest:
+            self.x_ifn_market_id = nearest[0][0]
+
     @api.onchange('x_ifn_voice_consent')
     def _onchange_voice_consent(self):
         """Auto-remplit la date de consentement vocal"""
@@ -244,6 +263,33 @@ class ResPartner(models.Model):
             return 'all'
         return 'email'  # Par défaut
 
+    def _ifn_get_suggestion_radius(self):
+        """Rayon (km) des suggestions de proximité"""
+        return float(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.suggestion_radius_km', '25'
+        ))
+
+    @api.model
+    def ifn_get_location_suggestions(self, lat, lng, k=5):
+        """Retourne les marchés et coopératives proches d'un point (enregistrement terrain)"""
+        radius_km = self._ifn_get_suggestion_radius()
+        return {
+            'markets': self.env['ifn.market'].find_nearest_markets(lat, lng, k=k, radius_km=radius_km),
+            'coops': self.env['ifn.coop'].find_nearest_coops(lat, lng, k=k, radius_km=radius_km),
+        }
+
+    @api.model
+    def find_partners_within_radius(self, lat, lng, radius_km, domain=None, limit=None):
+        """Retourne les partenaires situés dans un rayon autour d'un point, du plus proche au plus loin"""
+        return [{
+            'id': partner.id,
+            'name': partner.name,
+            'uid': partner.x_ifn_uid,
+            'role': partner.x_ifn_role,
+            'distance_km': round(distance, 3),
+        } for partner, distance in self._ifn_find_nearest(
+            lat, lng, k=limit, radius_km=radius_km, domain=domain)]
+
     def _ifn_get_display_name_with_role(self):
         """Retourne le nom d'affichage avec rôle IFN"""
         if self.x_ifn_role:
@@ -251,41 +297,167 @@ class ResPartner(models.Model):
             return f"{self.name} ({role_label})"
         return self.name
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """Surcharge pour la logique IFN spécifique"""
         # Auto-assigner le rôle depuis le contexte si disponible
-        if 'x_ifn_role' not in vals and self.env.context.get('default_ifn_role'):
-            vals['x_ifn_role'] = self.env.context['default_ifn_role']
+        default_role = self.env.context.get('default_ifn_role')
+        if default_role:
+            for vals in vals_list:
+                vals.setdefault('x_ifn_role', default_role)
 
-        partner = super().create(vals)
+        partners = super().create(vals_list)
 
         # Publier événement création partenaire IFN
-        if partner.x_ifn_role:
-            partner._ifn_publish_event('ifn.partner.created')
+        partners.filtered('x_ifn_role')._ifn_publish_events('ifn.partner.created')
 
-        return partner
+        if any(vals.get('x_ifn_market_id') or vals.get('x_ifn_coop_id') for vals in vals_list):
+            partners._ifn_update_membership_counters({}, partners._ifn_get_membership())
+
+        if any(vals.get('x_ifn_geo_lat') or vals.get('x_ifn_geo_lng') for vals in vals_list):
+            partners._ifn_assign_zones()
+
+        return partners
 
     def write(self, vals):
-        """Surcharge pour la logique IFN spécifique"""
-        # Tracker changements de rôle
-        old_role = self.x_ifn_role if len(self) == 1 else None
-        old_market = self.x_ifn_market_id if len(self) == 1 else None
-        old_coop = self.x_ifn_coop_id if len(self) == 1 else None
+        """Met à jour les effectifs des marchés, coopératives et zones lorsque le rattachement change"""
+        membership_changed = bool(self._ifn_membership_fields & set(vals))
+        if membership_changed:
+            old_membership = self._ifn_get_membership()
 
         result = super().write(vals)
 
-        # Publier événements pour changements importants
-        if len(self) == 1:
-            if 'x_ifn_role' in vals and vals['x_ifn_role'] != old_role:
-                self._ifn_publish_event('ifn.partner.role_changed')
-            if 'x_ifn_market_id' in vals and vals['x_ifn_market_id'] != old_market:
-                self._ifn_publish_event('ifn.partner.market_changed')
-            if 'x_ifn_coop_id' in vals and vals['x_ifn_coop_id'] != old_coop:
-                self._ifn_publish_event('ifn.partner.coop_changed')
+        if membership_changed:
+            self._ifn_update_membership_counters(old_membership, self._ifn_get_membership())
+        if 'x_ifn_geo_lat' in vals or 'x_ifn_geo_lng' in vals:
+            self._ifn_assign_zones()
+        return result
+
+    def _ifn_assign_zones(self):
+        """Affecte les partenaires aux zones contenant leur position (index STR-tree en mémoire)"""
+        Zone = self.env['ifn.zone']
+        Zone._ifn_set_partner_zones({
+            partner.id: Zone._ifn_find_zone_ids(partner.x_ifn_geo_point)
+            for partner in self
+        })
 
+    def unlink(self):
+        old_membership = self._ifn_get_membership()
+        result = super().unlink()
+        self._ifn_update_membership_counters(old_membership, {})
         return result
 
+    def _ifn_get_membership(self):
+        """Retourne {partner_id: (market_id, coop_id, active)} des partenaires rattachés"""
+        return {
+            partner.id: (partner.x_ifn_market_id.id, partner.x_ifn_coop_id.id, partner.active)
+            for partner in self
+            if partner.x_ifn_market_id or partner.x_ifn_coop_id
+        }
+
+    @api.model
+    def _ifn_update_membership_counters(self, old_membership, new_membership):
+        """Applique les variations d'effectifs des marchés et coopératives
+
+        Les compteurs sont incrémentés en SQL (`count = count + delta`) au
+        lieu d'être recalculés sur toute la liste des membres. Avec le
+        contexte `ifn_defer_counters` (imports parallèles), rien n'est fait :
+        l'appelant recale les compteurs en fin de traitement
+        (`_ifn_reconcile_member_counts`).
+        """
+        if self.env.context.get('ifn_defer_counters'):
+            return
+        market_deltas = defaultdict(int)
+        member_deltas = defaultdict(int)
+        active_member_deltas = defaultdict(int)
+        for membership, sign in ((old_membership, -1), (new_membership, 1)):
+            for market_id, coop_id, active in membership.values():
+                if market_id and active:
+                    market_deltas[market_id] += sign
+                if coop_id:
+                    member_deltas[coop_id] += sign
+                    if active:
+                        active_member_deltas[coop_id] += sign
+
+        self._ifn_apply_counter_deltas('ifn.market', 'partner_count', market_deltas)
+        self._ifn_apply_counter_deltas('ifn.coop', 'member_count', member_deltas)
+        self._ifn_apply_counter_deltas('ifn.coop', 'active_member_count', active_member_deltas)
+
+        memberships = list(old_membership.values()) + list(new_membership.values())
+        self.env['ifn.zone']._ifn_recompute_partner_counts(
+            self.env['ifn.market'].browse({market_id for market_id, _coop, _active in memberships if market_id}),
+            self.env['ifn.coop'].browse({coop_id for _market, coop_id, _active in memberships if coop_id}),
+        )
+
+    @api.model
+    def _ifn_apply_counter_deltas(self, model_name, field_name, deltas):
+        """Ajoute en une requête les variations non nulles à un compteur"""
+        deltas = {record_id: delta for record_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        model = self.env[model_name]
+        # Verrouiller dans l'ordre des ids : pas d'interblocage entre imports parallèles
+        self.env.cr.execute(f"""
+            SELECT id FROM "{model._table}" WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+        """, [list(deltas)])
+        self.env.cr.execute(f"""
+            UPDATE "{model._table}" t
+               SET "{field_name}" = COALESCE(t."{field_name}", 0) + d.delta
+              FROM unnest(%s::int[], %s::int[]) AS d(id, delta)
+             WHERE t.id = d.id
+        """, [list(deltas), list(deltas.values())])
+        model.browse(list(deltas)).invalidate_recordset([field_name])
+
+    @api.model
+    def _ifn_reconcile_member_counts(self):
+        """Recalage des compteurs d'effectifs (et des effectifs des zones concernées) sur les données réelles"""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE ifn_market m
+               SET partner_count = c.partner_count
+              FROM (SELECT m2.id, count(p.id) AS partner_count
+                      FROM ifn_market m2
+                 LEFT JOIN res_partner p ON p.x_ifn_market_id = m2.id AND p.active
+                  GROUP BY m2.id) AS c
+             WHERE m.id = c.id AND m.partner_count IS DISTINCT FROM c.partner_count
+         RETURNING m.id
+        """)
+        market_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.execute("""
+            UPDATE ifn_coop c
+               SET member_count = counts.member_count,
+                   active_member_count = counts.active_member_count
+              FROM (SELECT c2.id,
+                           count(p.id) AS member_count,
+                           count(p.id) FILTER (WHERE p.active) AS active_member_count
+                      FROM ifn_coop c2
+                 LEFT JOIN res_partner p ON p.x_ifn_coop_id = c2.id
+                  GROUP BY c2.id) AS counts
+             WHERE c.id = counts.id
+               AND (c.member_count IS DISTINCT FROM counts.member_count
+                    OR c.active_member_count IS DISTINCT FROM counts.active_member_count)
+         RETURNING c.id
+        """)
+        coop_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env['ifn.market'].invalidate_model(['partner_count'])
+        self.env['ifn.coop'].invalidate_model(['member_count', 'active_member_count'])
+        self.env['ifn.zone']._ifn_recompute_partner_counts(
+            self.env['ifn.market'].browse(market_ids), self.env['ifn.coop'].browse(coop_ids))
+
+        if market_ids or coop_ids:
+            _logger.warning(f"Reconciled member counters: {len(market_ids)} markets, {len(coop_ids)} coops drifted")
+        return len(market_ids) + len(coop_ids)
+
+    def _ifn_get_change_events(self):
+        """Événements publiés lors des changements de rôle, marché ou coopérative"""
+        events = super()._ifn_get_change_events()
+        events.update({
+            'x_ifn_role': 'ifn.partner.role_changed',
+            'x_ifn_market_id': 'ifn.partner.market_changed',
+            'x_ifn_coop_id': 'ifn.partner.coop_changed',
+        })
+        return events
+
     def _get_sensitive_fields(self):
         """Retourne les champs sensibles pour l'audit"""
         return super()._get_sensitive_fields() + [
@@ -295,80 +467,197 @@ class ResPartner(models.Model):
         ]
 
     @api.model
-    def _ifn_refresh_expired_qr_codes(self):
-        """CRON Job: Rafraîchit les QR codes expirés"""
-        ttl_days = int(self.env['ir.config_parameter'].sudo().get_param(
-            'ifn_core.qr_ttl_days', '365'
-        ))
+    def _ifn_refresh_expired_qr_codes(self, batch_size=None, chunk_size=None, time_budget=None):
+        """CRON Job: Rafraîchit les QR codes expirés
+
+        Traite au plus `chunk_size` partenaires par exécution, par lots de
+        `batch_size` validés séparément, dans l'ordre de x_ifn_qr_generated_date.
+        La position est sauvegardée après chaque lot pour reprendre au même
+        endroit ; si le budget de temps est épuisé, le CRON est relancé.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl_days = int(ICP.get_param('ifn_core.qr_ttl_days', '365'))
 
         if ttl_days <= 0:
-            return
+            return 0
 
-        cutoff_date = fields.Datetime.now() - timedelta(days=ttl_days)
-        expired_partners = self.search([
-            ('x_ifn_qr_generated_date', '<', cutoff_date),
-            ('x_ifn_uid', '!=', False),
-            ('active', '=', True)
-        ])
+        batch_size = batch_size or int(ICP.get_param('ifn_core.qr_refresh_batch_size', '100'))
+        chunk_size = chunk_size or int(ICP.get_param('ifn_core.qr_refresh_chunk_size', '5000'))
+        time_budget = time_budget or int(ICP.get_param('ifn_core.qr_refresh_time_budget', '600'))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
 
-        _logger.info(f"Refreshing {len(expired_partners)} expired QR codes")
+        started = time.monotonic()
+        cutoff_date = fields.Datetime.now() - timedelta(days=ttl_days)
+        cursor = self._ifn_get_qr_refresh_cursor()
+
+        processed = refreshed = 0
+        finished = False
+        while processed < chunk_size and time.monotonic() - started < time_budget:
+            domain = [
+                ('x_ifn_qr_generated_date', '<', cutoff_date),
+                ('x_ifn_uid', '!=', False),
+                ('active', '=', True),
+            ]
+            if cursor:
+                cursor_date, cursor_id = cursor
+                domain += [
+                    '|', ('x_ifn_qr_generated_date', '>', cursor_date),
+                    '&', ('x_ifn_qr_generated_date', '=', cursor_date), ('id', '>', cursor_id),
+                ]
+            batch = self.search(domain, order='x_ifn_qr_generated_date, id',
+                                limit=min(batch_size, chunk_size - processed))
+            if not batch:
+                finished = True
+                break
+
+            # Position avant régénération (la date du QR va changer)
+            cursor = (batch[-1].x_ifn_qr_generated_date, batch[-1].id)
 
-        for partner in expired_partners:
             try:
-                partner._ifn_generate_qr()
-                partner._ifn_publish_event('ifn.qr.refreshed')
+                with self.env.cr.savepoint():
+                    batch._ifn_generate_qr()
+                refreshed_partners = batch
             except Exception as e:
-                _logger.error(f"Failed to refresh QR for partner {partner.id}: {str(e)}")
-
-        return len(expired_partners)
+                # Lot en échec : reprise partenaire par partenaire pour isoler les erreurs
+                _logger.warning(f"Batch QR refresh failed, retrying partner by partner: {str(e)}")
+                refreshed_partners = self.browse()
+                for partner in batch:
+                    try:
+                        with self.env.cr.savepoint():
+                            partner._ifn_generate_qr()
+                        refreshed_partners |= partner
+                    except Exception as e:
+                        _logger.error(f"Failed to refresh QR for partner {partner.id}: {str(e)}")
+            refreshed_partners._ifn_publish_events('ifn.qr.refreshed')
+
+            processed += len(batch)
+            refreshed += len(refreshed_partners)
+            self._ifn_set_qr_refresh_cursor(cursor)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+        if finished:
+            self._ifn_set_qr_refresh_cursor(None)
+        else:
+            # Reste du travail : relancer le CRON plutôt que prolonger cette exécution
+            cron = self.env.ref('ifn_core.ir_cron_ifn_qr_refresh_monthly', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+        _logger.info(f"Refreshed {refreshed}/{processed} expired QR codes "
+                     f"({'completed' if finished else 'to be continued'})")
+        return refreshed
+
+    def _ifn_get_qr_refresh_cursor(self):
+        """Retourne la position (date QR, id) du dernier lot rafraîchi, ou None"""
+        value = self.env['ir.config_parameter'].sudo().get_param('ifn_core.qr_refresh_cursor')
+        if not value:
+            return None
+        date_str, partner_id = value.rsplit(',', 1)
+        return fields.Datetime.to_datetime(date_str), int(partner_id)
+
+    def _ifn_set_qr_refresh_cursor(self, cursor):
+        """Sauvegarde la position du rafraîchissement des QR (None pour réinitialiser)"""
+        value = f"{fields.Datetime.to_string(cursor[0])},{cursor[1]}" if cursor else False
+        self.env['ir.config_parameter'].sudo().set_param('ifn_core.qr_refresh_cursor', value)
 
     @api.model
     def _ifn_daily_data_sync(self):
         """CRON Job: Synchronisation quotidienne des données"""
-        # Synchroniser les données des partenaires avec les systèmes externes
+        # Contrôles de cohérence ensemblistes (voir ifn.data.check.result)
         _logger.info("Starting daily IFN data synchronization")
 
-        partenaires_sync_count = 0
-        partners = self.search([('x_ifn_role', '!=', False), ('active', '=', True)])
+        results = self.env['ifn.data.check.result'].run_consistency_checks()
+        inconsistency_count = sum(results.mapped('record_count'))
 
-        for partner in partners:
-            try:
-                # Vérifier la cohérence des données
-                if partner.x_ifn_coop_id and partner.x_ifn_coop_id.market_id != partner.x_ifn_market_id:
-                    _logger.warning(f"Inconsistent data for partner {partner.name}: coop market doesn't match partner market")
+        _logger.info(f"Daily sync completed: {inconsistency_count} inconsistencies "
+                     f"found by {len(results)} consistency rules")
+        return inconsistency_count
 
-                partenaires_sync_count += 1
+    @api.model
+    def _ifn_send_validation_reminders(self):
+        """CRON Job: Envoie des rappels de validation de profil
 
-            except Exception as e:
-                _logger.error(f"Sync error for partner {partner.id}: {str(e)}")
+        Les rappels sont rendus par lots et mis en file dans mail.mail (envoyés
+        ensuite par le CRON de la file mail), étalés selon la limite du
+        fournisseur. Les partenaires relancés récemment sont ignorés.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        batch_size = int(ICP.get_param('ifn_core.reminder_batch_size', '200'))
+        rate_per_minute = int(ICP.get_param('ifn_core.reminder_rate_per_minute', '100'))
+        max_per_run = int(ICP.get_param('ifn_core.reminder_max_per_run', '5000'))
+        interval_days = int(ICP.get_param('ifn_core.reminder_interval_days', '7'))
 
-        _logger.info(f"Daily sync completed for {partenaires_sync_count} partners")
-        return partenaires_sync_count
+        template = self.env.ref('ifn_core.email_template_validation_reminder')
 
-    @api.model
-    def _ifn_send_validation_reminders(self):
-        """CRON Job: Envoie des rappels de validation de profil"""
         # Envoyer des rappels pour les profils en attente depuis plus de 7 jours
-        cutoff_date = fields.Datetime.now() - timedelta(days=7)
+        now = fields.Datetime.now()
+        cutoff_date = now - timedelta(days=7)
+        reminded_cutoff = now - timedelta(days=interval_days)
         pending_partners = self.search([
             ('x_ifn_profile_status', '=', 'pending_validation'),
             ('x_ifn_created_date', '<', cutoff_date),
             ('email', '!=', False),
-            ('active', '=', True)
-        ])
+            ('active', '=', True),
+            '|', ('x_ifn_last_reminder_date', '=', False),
+                 ('x_ifn_last_reminder_date', '<', reminded_cutoff),
+        ], order='x_ifn_last_reminder_date asc nulls first, id', limit=max_per_run)
 
-        _logger.info(f"Sending validation reminders to {len(pending_partners)} partners")
+        _logger.info(f"Queuing validation reminders for {len(pending_partners)} partners")
 
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
         reminder_count = 0
-        for partner in pending_partners:
+        for batch in split_every(batch_size, pending_partners.ids, self.browse):
+            # Étalement email par email selon le débit autorisé par le fournisseur
+            scheduled_dates = {}
+            if rate_per_minute > 0:
+                scheduled_dates = {
+                    partner_id: now + timedelta(minutes=(reminder_count + index) // rate_per_minute)
+                    for index, partner_id in enumerate(batch.ids)
+                }
             try:
-                # TODO: Envoyer email de rappel
-                # template = self.env.ref('ifn_core.email_template_validation_reminder')
-                # if template:
-                #     template.send_mail(partner.id, force_send=True)
-                reminder_count += 1
-
+                with self.env.cr.savepoint():
+                    batch._ifn_enqueue_template_mails(template, scheduled_dates=scheduled_dates)
+                    batch.write({'x_ifn_last_reminder_date': now})
+                reminder_count += len(batch)
             except Exception as e:
-                _logger.error(f"Failed to send validation reminder to {partner.email}: {str(e)}")
+                _logger.error(f"Failed to queue validation reminders for partners {batch.ids}: {str(e)}")
+                continue
+            if auto_commit:
+                self.env.cr.commit()
 
-        return reminder_count
\ No newline at end of file
+        return reminder_count
+
+    def _ifn_enqueue_template_mails(self, template, scheduled_date=False, scheduled_dates=None):
+        """Rend un modèle d'email pour tout le lot et met les emails en file
+
+        Le rendu est fait en une passe par champ du modèle et les mail.mail sont
+        créés en une fois, sans envoi SMTP synchrone. `scheduled_dates`
+        ({partner_id: date}) planifie chaque email et prime sur `scheduled_date`.
+        """
+        scheduled_dates = scheduled_dates or {}
+        if not self:
+            return self.env['mail.mail']
+
+        subjects = template._render_field('subject', self.ids, compute_lang=True)
+        bodies = template._render_field('body_html', self.ids, compute_lang=True)
+        senders = template._render_field('email_from', self.ids) if template.email_from else {}
+
+        vals_list = []
+        for partner in self:
+            vals = {
+                'subject': subjects.get(partner.id) or '',
+                'body_html': bodies.get(partner.id) or '',
+                'recipient_ids': [(4, partner.id)],
+                'model': self._name,
+                'res_id': partner.id,
+                'auto_delete': template.auto_delete,
+                'mail_server_id': template.mail_server_id.id,
+                'scheduled_date': scheduled_dates.get(partner.id, scheduled_date),
+            }
+            if senders.get(partner.id):
+                vals['email_from'] = senders[partner.id]
+            vals_list.append(vals)
+
+        return self.env['mail.mail'].sudo().create(vals_list)
@@ -2,23 +2,50 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import split_every
+from odoo.tools.misc import DotDict
 import io
 import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 
+_logger = logging.getLogger(__name__)
+
+DEFAULT_ATTESTATION_REPORT = 'ifn_core.action_report_ifn_attestation'
+# Taille des blocs lus pour calculer l'empreinte de l'archive ZIP
+FILE_BLOCK_SIZE = 256 * 1024
+
+
+def render_partner_pdf(env, report_id, partner_id, data=None):
+    """Rend l'attestation d'un seul partenaire : retourne (pdf, erreur)"""
+    try:
+        pdf, _report_format = env['ir.actions.report']._render_qweb_pdf(report_id, [partner_id], data=data)
+        return pdf, None
+    except Exception as e:
+        _logger.error(f"Attestation rendering error for partner {partner_id}: {str(e)}")
+        return None, str(e)
+
 
 class IFNAttestationReport(models.AbstractModel):
-    _name = 'report.ifn_core.ifn_attestation_template'
+    _name = 'report.ifn_core.ifn_attestation_modern_template'
     _description = 'Rapport Attestation IFN'
 
     @api.model
     def _get_report_values(self, docids, data=None):
-        """Prépare les valeurs pour le template d'attestation"""
+        """Prépare les valeurs pour le template d'attestation (un article par partenaire)"""
         docs = self.env['res.partner'].browse(docids)
 
         report_data = {
             'docs': docs,
+            'attestation_data': {partner.id: self._get_partner_attestation_data(partner) for partner in docs},
+            'options': (data or {}).get('options', {}),
             'date_today': fields.Date.today(),
             'generation_time': fields.Datetime.now(),
             'company': self.env.company,
@@ -29,20 +56,252 @@ class IFNAttestationReport(models.AbstractModel):
 
     def _get_partner_attestation_data(self, partner):
         """Retourne les données spécifiques pour l'attestation d'un partenaire"""
-        return {
+        qr_code = partner.x_ifn_qr
+        return DotDict({
             'partner': partner,
             'uid': partner.x_ifn_uid,
             'role_label': dict(partner._fields['x_ifn_role'].selection).get(partner.x_ifn_role, ''),
             'market_name': partner.x_ifn_market_id.name if partner.x_ifn_market_id else '',
             'coop_name': partner.x_ifn_coop_id.name if partner.x_ifn_coop_id else '',
             'validation_date': partner.x_ifn_validation_date,
-            'qr_code': partner.x_ifn_qr,
+            'qr_code': qr_code.decode() if isinstance(qr_code, bytes) else qr_code,
             'qr_ref': partner.x_ifn_qr_ref,
+            'has_photo': bool(partner.x_ifn_photo),
             'has_geo': bool(partner.x_ifn_geo_lat and partner.x_ifn_geo_lng),
             'geo_lat': partner.x_ifn_geo_lat,
             'geo_lng': partner.x_ifn_geo_lng,
             'language_label': dict(partner._fields['x_ifn_lang_pref'].selection).get(partner.x_ifn_lang_pref, ''),
-        }
+        })
+
+
+class IFNAttestationClassicReport(models.AbstractModel):
+    _name = 'report.ifn_core.ifn_attestation_classic_template'
+    _inherit = 'report.ifn_core.ifn_attestation_modern_template'
+    _description = 'Rapport Attestation IFN (classique)'
+
+
+class IFNAttestationMinimalReport(models.AbstractModel):
+    _name = 'report.ifn_core.ifn_attestation_minimal_template'
+    _inherit = 'report.ifn_core.ifn_attestation_modern_template'
+    _description = 'Rapport Attestation IFN (minimal)'
+
+
+class IFNAttestationRenderer(models.AbstractModel):
+    """Rendu groupé des attestations PDF
+
+    Chaque lot de partenaires est rendu en une seule passe wkhtmltopdf puis
+    découpé par partenaire (un article par document). Si le découpage
+    échoue, le lot est rendu partenaire par partenaire par un pool borné
+    de threads, chacun avec son propre curseur (wkhtmltopdf tourne dans un
+    sous-processus). Les PDF sont écrits dans l'archive ZIP au fur et à mesure.
+    """
+    _name = 'ifn.attestation.renderer'
+    _description = 'Rendu des attestations IFN'
+
+    @api.model
+    def _get_batch_size(self):
+        """Nombre de partenaires rendus par passe wkhtmltopdf"""
+        return max(int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.attestation_batch_size', '100'
+        )), 1)
+
+    @api.model
+    def _get_render_workers(self):
+        """Nombre de rendus unitaires simultanés en cas d'échec du découpage"""
+        return max(int(self.env['ir.config_parameter'].sudo().get_param(
+            'ifn_core.attestation_render_workers', '4'
+        )), 1)
+
+    @api.model
+    def _get_report(self, template_ref):
+        """Action de rapport du template, ou l'attestation standard s'il n'en a pas"""
+        report = self.env['ir.actions.report']._get_report_from_name(template_ref)
+        return report or self.env.ref(DEFAULT_ATTESTATION_REPORT)
+
+    @api.model
+    def _ifn_render_attestations(self, report, partners, data=None):
+        """Rend les attestations par lots : génère (partenaire, pdf, erreur, depuis le cache) dans l'ordre
+
+        Les attestations déjà en cache pour la version IFN du partenaire et la
+        variante de rendu sont relues du filestore ; seules les autres sont
+        rendues, puis mises en cache.
+        """
+        Partner = self.env['res.partner']
+        Cache = self.env['ifn.attestation.cache'].sudo()
+        variant = Cache._ifn_variant(report, data)
+        for partner_ids in split_every(self._get_batch_size(), partners.ids):
+            cached = Cache._ifn_lookup(Partner.browse(partner_ids), variant)
+            pdfs = {partner_id: (entry.attachment_id.raw, None) for partner_id, entry in cached.items()}
+            missing_ids = [partner_id for partner_id in partner_ids if partner_id not in cached]
+            if missing_ids:
+                rendered = self._ifn_render_batch(report, missing_ids, data)
+                if rendered is None:
+                    rendered = self._ifn_render_parallel(report, missing_ids, data)
+                Cache._ifn_store(Partner.browse(missing_ids), variant,
+                                 {partner_id: pdf for partner_id, (pdf, _error) in rendered.items()})
+                pdfs.update(rendered)
+            for partner_id in partner_ids:
+                pdf, error = pdfs[partner_id]
+                yield Partner.browse(partner_id), pdf, error, partner_id in cached
+
+    @api.model
+    def _ifn_get_attestation_attachment(self, partner, template_ref, data=None):
+        """PDF en cache de l'attestation d'un partenaire, rendu et mis en cache si absent"""
+        report = self._get_report(template_ref)
+        Cache = self.env['ifn.attestation.cache'].sudo()
+        variant = Cache._ifn_variant(report, data)
+        entry = Cache._ifn_lookup(partner, variant).get(partner.id)
+        if not entry:
+            pdf, error = render_partner_pdf(self.env, report.id, partner.id, data)
+            if error:
+                raise UserError(_('Erreur lors du rendu de l\'attestation de %s: %s') % (partner.name, error))
+            entry = Cache._ifn_store(partner, variant, {partner.id: pdf})[partner.id]
+        return entry.attachment_id
+
+    @api.model
+    def _ifn_render_batch(self, report, partner_ids, data=None):
+        """Rend un lot en une passe et le découpe : {id: (pdf, None)}, ou None si impossible"""
+        try:
+            streams = self.env['ir.actions.report']._render_qweb_pdf_prepare_streams(
+                report, data, res_ids=list(partner_ids))
+        except Exception as e:
+            _logger.warning(f"Batch attestation rendering failed ({len(partner_ids)} partners): {str(e)}")
+            return None
+
+        try:
+            # Clé False : le PDF n'a pas pu être découpé par partenaire
+            if set(streams) != set(partner_ids):
+                _logger.warning(f"Batch attestation PDF could not be split ({len(partner_ids)} partners)")
+                return None
+            return {partner_id: (streams[partner_id]['stream'].getvalue(), None) for partner_id in partner_ids}
+        finally:
+            for stream_data in streams.values():
+                if stream_data['stream']:
+                    stream_data['stream'].close()
+
+    @api.model
+    def _ifn_render_parallel(self, report, partner_ids, data=None):
+        """Rend un lot partenaire par partenaire via un pool borné : {id: (pdf, erreur)}
+
+        Chaque thread rend avec son propre curseur : il ne voit que les données
+        validées (commit), pas les modifications en cours de la transaction
+        appelante. Les appelants doivent donc valider leurs modifications des
+        partenaires avant le rendu (les assistants rendent des partenaires
+        existants, sans les modifier).
+        """
+        workers = self._get_render_workers()
+        if workers == 1 or getattr(threading.current_thread(), 'testing', False):
+            return {partner_id: render_partner_pdf(self.env, report.id, partner_id, data)
+                    for partner_id in partner_ids}
+
+        registry, uid, context = self.env.registry, self.env.uid, dict(self.env.context)
+
+        def render(partner_id):
+            with registry.cursor() as cr:
+                return render_partner_pdf(api.Environment(cr, uid, context), report.id, partner_id, data)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(partner_ids, executor.map(render, partner_ids)))
+
+    @api.model
+    def _ifn_generate_attestations(self, partners, template_ref, data=None, filename_func=None, zip_name=None):
+        """Rend les attestations, joint les nouvelles aux partenaires et les regroupe dans une archive ZIP
+
+        L'archive est écrite sur disque au fil du rendu puis déplacée telle
+        quelle dans le filestore : elle n'est jamais chargée en mémoire.
+        Retourne (partenaires rendus, pièce jointe ZIP, erreurs).
+        """
+        report = self._get_report(template_ref)
+        filename_func = filename_func or (lambda partner: f"Attestation_{partner.x_ifn_uid}.pdf")
+        Attachment = self.env['ir.attachment']
+        rendered_ids = []
+        errors = []
+        pending = []
+        batch_size = self._get_batch_size()
+
+        # Archive écrite dans le répertoire du filestore : déplacement sans copie
+        storage_dir = Attachment._filestore() if Attachment._storage() == 'file' else None
+        if storage_dir:
+            os.makedirs(storage_dir, exist_ok=True)
+        buffer = tempfile.NamedTemporaryFile(dir=storage_dir, suffix='.zip', delete=False)
+        try:
+            with buffer, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for partner, pdf, error, from_cache in self._ifn_render_attestations(report, partners, data):
+                    if error:
+                        errors.append(f"Erreur pour {partner.name}: {error}")
+                        continue
+                    filename = filename_func(partner)
+                    archive.writestr(filename, pdf)
+                    rendered_ids.append(partner.id)
+                    # Attestation servie par le cache : déjà conservée, pas de nouvelle pièce jointe
+                    if from_cache:
+                        continue
+                    pending.append({
+                        'name': filename,
+                        'type': 'binary',
+                        'raw': pdf,
+                        'mimetype': 'application/pdf',
+                        'res_model': 'res.partner',
+                        'res_id': partner.id,
+                        'description': f'Attestation IFN - {partner.name}',
+                    })
+                    # Pièces jointes créées par lot : un seul lot de PDF en mémoire
+                    if len(pending) >= batch_size:
+                        Attachment.create(pending)
+                        pending = []
+                if pending:
+                    Attachment.create(pending)
+
+            zip_attachment = Attachment
+            if rendered_ids:
+                zip_attachment = self._ifn_create_attachment_from_file(buffer.name, {
+                    'name': zip_name or f"Attestations_IFN_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                    'type': 'binary',
+                    'mimetype': 'application/zip',
+                })
+        finally:
+            if os.path.exists(buffer.name):
+                os.unlink(buffer.name)
+
+        _logger.info(f"Attestations rendered: {len(rendered_ids)} generated, {len(errors)} errors")
+        return self.env['res.partner'].browse(rendered_ids), zip_attachment, errors
+
+    @api.model
+    def _ifn_create_attachment_from_file(self, path, vals):
+        """Crée une pièce jointe dont le contenu est le fichier `path`, sans le charger en mémoire
+
+        Avec le stockage filestore, le fichier est déplacé à l'emplacement de
+        son empreinte SHA1 et la pièce jointe y est reliée directement ; avec
+        le stockage en base, le contenu doit être lu.
+        """
+        Attachment = self.env['ir.attachment']
+        if Attachment._storage() != 'file':
+            with open(path, 'rb') as file:
+                return Attachment.create(dict(vals, raw=file.read()))
+
+        sha = hashlib.sha1()
+        file_size = 0
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(FILE_BLOCK_SIZE), b''):
+                sha.update(block)
+                file_size += len(block)
+        checksum = sha.hexdigest()
+        store_fname = f'{checksum[:2]}/{checksum}'
+        full_path = Attachment._full_path(store_fname)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            shutil.move(path, full_path)
+            # Supprimé par le nettoyage du filestore si la transaction échoue
+            Attachment._mark_for_gc(store_fname)
+
+        attachment = Attachment.create(vals)
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, file_size = %s, checksum = %s
+             WHERE id = %s
+        """, [store_fname, file_size, checksum, attachment.id])
+        attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'raw', 'datas'])
+        return attachment
 
 
 class IFNPartnerAttestationWizard(models.TransientModel):
@@ -97,6 +356,7 @@ class IFNPartnerAttestationWizard(models.TransientModel):
     generated_count = fields.Integer('Attestations générées', readonly=True)
     error_count = fields.Integer('Erreurs', readonly=True)
     errors = fields.Text('Erreurs détaillées', readonly=True)
+    zip_attachment_id = fields.Many2one('ir.attachment', string='Archive ZIP', readonly=True)
 
     def action_generate_attestations(self):
         """Génère les attestations pour les partenaires sélectionnés"""
@@ -105,11 +365,6 @@ class IFNPartnerAttestationWizard(models.TransientModel):
         if not self.partner_ids:
             raise UserError(_('Veuillez sélectionner au moins un partenaire'))
 
-        # Initialiser les compteurs
-        self.generated_count = 0
-        self.error_count = 0
-        self.errors = ''
-
         # Vérifier que tous les partenaires ont les informations requises
         invalid_partners = self.partner_ids.filtered(
             lambda p: not p.x_ifn_uid or p.x_ifn_profile_status != 'validated'
@@ -119,59 +374,49 @@ class IFNPartnerAttestationWizard(models.TransientModel):
             names = ', '.join(invalid_partners.mapped('name'))
             raise UserError(_('Les partenaires suivants n\'ont pas de UID ou un profil validé: %s') % names)
 
-        # Générer les attestations
-        for partner in self.partner_ids:
-            try:
-                self._generate_single_attestation(partner)
-                self.generated_count += 1
-            except Exception as e:
-                self.error_count += 1
-                error_msg = f"Erreur pour {partner.name}: {str(e)}\n"
-                self.errors += error_msg
+        # Rendu par lots (une passe wkhtmltopdf par lot) et archive ZIP
+        rendered, zip_attachment, errors = self.env['ifn.attestation.renderer']._ifn_generate_attestations(
+            self.partner_ids,
+            self._get_template_ref(),
+            data=self._get_report_data(),
+            filename_func=self._generate_filename,
+        )
+        self.write({
+            'generated_count': len(rendered),
+            'error_count': len(errors),
+            'errors': '\n'.join(errors),
+            'zip_attachment_id': zip_attachment.id,
+        })
+
+        # Logger l'action
+        self.env['ifn.audit.log'].create([{
+            'object_model': 'res.partner',
+            'object_id': partner.id,
+            'action': 'data_export',
+            'category': 'business',
+            'user_id': self.env.uid,
+            'details': f"Attestation {self.attestation_type} generated for {partner.name}",
+        } for partner in rendered])
 
         # Afficher le résultat
         return self._show_generation_result()
 
-    def _generate_single_attestation(self, partner):
-        """Génère une attestation pour un partenaire"""
-        # Préparer le contexte du rapport
-        report_context = {
-            'wizard': self,
-            'partner': partner,
-            'attestation_data': self._prepare_attestation_data(partner),
-            'company': self.env.company,
-            'generation_date': fields.Date.today(),
-            'generation_time': fields.Datetime.now(),
+    def _get_report_data(self):
+        """Options transmises au rapport (sérialisables, partagées par tous les rendus)"""
+        return {
+            'options': {
+                'attestation_type': self.attestation_type,
+                'layout_template': self.layout_template,
+                'include_photo': self.include_photo,
+                'include_geo': self.include_geo,
+                'include_qr': self.include_qr,
+                'include_validation': self.include_validation,
+                'watermark': self.watermark,
+                'background_color': self.background_color,
+                'footer_text': self.footer_text,
+            },
         }
 
-        # Sélectionner le template selon le type et le layout
-        template_ref = self._get_template_ref()
-
-        # Générer le rapport
-        report = self.env.ref(template_ref)._render_qweb_pdf([partner.id], data=report_context)
-
-        # Créer un attachment avec l'attestation
-        filename = self._generate_filename(partner)
-
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'type': 'binary',
-            'datas': base64.b64encode(report[0]),
-            'res_model': 'res.partner',
-            'res_id': partner.id,
-            'description': f'Attestation IFN - {partner.name}',
-        })
-
-        # Logger l'action
-        self.env['ifn.audit.log'].log_action(
-            object_model='res.partner',
-            object_id=partner.id,
-            action='attestation_generated',
-            details=f"Attestation {self.attestation_type} generated for {partner.name}"
-        )
-
-        return attachment
-
     def _get_template_ref(self):
         """Retourne la référence du template selon le type et layout"""
         template_mapping = {
@@ -258,8 +503,9 @@ class IFNPartnerAttestationWizard(models.TransientModel):
         }
 
     def action_download_all_attestations(self):
-        """Crée un ZIP avec toutes les attestations générées"""
-        if self.generated_count == 0:
+        """Télécharge l'archive ZIP des attestations générées"""
+        self.ensure_one()
+        if self.generated_count == 0 or not self.zip_attachment_id:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -270,33 +516,23 @@ class IFNPartnerAttestationWizard(models.TransientModel):
                 }
             }
 
-        # TODO: Implémenter la création de ZIP avec toutes les attestations
-        # Pour l'instant, retourner une notification
         return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Fonctionnalité en développement'),
-                'message': _('Le téléchargement groupé sera disponible prochainement'),
-                'type': 'info',
-            }
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.zip_attachment_id.id}?download=true',
+            'target': 'self',
         }
 
     def action_preview_attestation(self):
-        """Prévisualise l'attestation pour le premier partenaire"""
+        """Prévisualise l'attestation pour le premier partenaire (servie depuis le cache)"""
         if not self.partner_ids:
             raise UserError(_('Veuillez sélectionner au moins un partenaire'))
 
         partner = self.partner_ids[0]
+        attachment = self.env['ifn.attestation.renderer']._ifn_get_attestation_attachment(
+            partner, self._get_template_ref(), data=self._get_report_data())
 
         return {
-            'type': 'ir.actions.report',
-            'report_name': self._get_template_ref(),
-            'report_type': 'qweb-pdf',
-            'res_ids': [partner.id],
-            'data': {
-                'wizard_id': self.id,
-                'preview_mode': True,
-            },
-            'context': self.env.context,
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?access_token={attachment.generate_access_token()[0]}',
+            'target': 'new',
         }
\ No newline at end of file
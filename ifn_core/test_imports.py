@@ -24,6 +24,14 @@ try:
     from models import ifn_audit_log
     from models import ifn_kpi_snapshot
     from models import ifn_mixin
+    from models import ifn_geo
+    from models import ifn_search
+    from models import ifn_data_check
+    from models import ifn_partner_import
+    from models import ifn_import_job
+    from models import ifn_qr_regeneration_job
+    from models import ifn_qr_backup
+    from models import ifn_attestation_cache
     print("✅ Tous les modèles importés avec succès")
 
     # Test imports des wizards
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+from . import test_import_job
+from . import test_import_ranges
+from . import test_member_counters
+from . import test_zone_hierarchy
+from . import test_qr_backup
+from . import test_attestation_cache
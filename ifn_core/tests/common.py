@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import TransactionCase
+
+
+class IFNCommon(TransactionCase):
+    """Référentiels IFN partagés par les tests : un marché et sa coopérative"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.market = cls.env['ifn.market'].create({'name': 'Marché Test Adjamé', 'code': 'TSTADJ'})
+        cls.market_2 = cls.env['ifn.market'].create({'name': 'Marché Test Cocody', 'code': 'TSTCOC'})
+        cls.coop = cls.env['ifn.coop'].create({
+            'name': 'Coop Test Adjamé',
+            'code': 'TSTCOOP',
+            'market_id': cls.market.id,
+        })
+
+    @classmethod
+    def _create_partner(cls, name, **vals):
+        """Partenaire IFN marchand, rattaché au marché de test sauf indication contraire"""
+        return cls.env['res.partner'].create(dict({
+            'name': name,
+            'x_ifn_role': 'merchant',
+            'x_ifn_market_id': cls.market.id,
+        }, **vals))
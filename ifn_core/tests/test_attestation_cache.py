@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo.tests import tagged
+
+from .common import IFNCommon
+
+PDF = b'%PDF-1.4 attestation de test'
+VARIANT = {
+    'attestation_type': 'membership',
+    'layout': 'modern',
+    'report_name': 'ifn_core.test_attestation',
+    'template_checksum': 'test',
+    'variant_key': 'test-variant',
+}
+
+
+@tagged('post_install', '-at_install')
+class TestAttestationCache(IFNCommon):
+    """Cache des attestations : succès tant que le partenaire et ses référentiels n'ont pas changé"""
+
+    def setUp(self):
+        super().setUp()
+        self.Cache = self.env['ifn.attestation.cache'].sudo()
+        self.partner = self._create_partner('Awa Attestation', x_ifn_coop_id=self.coop.id)
+
+    def _lookup(self):
+        return self.Cache._ifn_lookup(self.partner, VARIANT).get(self.partner.id)
+
+    def test_hit_and_miss_across_version_bump(self):
+        self.assertFalse(self._lookup(), "Cache vide : échec")
+
+        entry = self.Cache._ifn_store(self.partner, VARIANT, {self.partner.id: PDF})[self.partner.id]
+        self.assertEqual(entry.version, self.partner.x_ifn_version)
+        self.assertEqual(entry.attachment_id.raw, PDF)
+        self.assertEqual(self._lookup(), entry, "Même version : succès")
+        self.assertFalse(self.Cache._ifn_lookup(self.partner, dict(VARIANT, variant_key='other')),
+                         "Autre variante de rendu : échec")
+
+        self.partner._ifn_bump_version()
+        self.assertFalse(self._lookup(), "Nouvelle version du partenaire : échec")
+
+        new_entry = self.Cache._ifn_store(self.partner, VARIANT, {self.partner.id: PDF})[self.partner.id]
+        self.assertEqual(new_entry.version, self.partner.x_ifn_version)
+        self.assertEqual(self._lookup(), new_entry)
+
+    def test_miss_after_coop_change(self):
+        entry = self.Cache._ifn_store(self.partner, VARIANT, {self.partner.id: PDF})[self.partner.id]
+        self.assertEqual(self._lookup(), entry)
+
+        # Les write_date d'une même transaction sont identiques : dater le rendu avant la modification
+        entry.related_write_date -= timedelta(minutes=1)
+        self.coop.name = 'Coop Test Renommée'
+        self.coop.flush_recordset()
+        self.assertFalse(self._lookup(), "Coopérative modifiée depuis le rendu : échec")
+
+        # Un nouveau rendu remplace l'entrée périmée de même clé
+        new_entry = self.Cache._ifn_store(self.partner, VARIANT, {self.partner.id: PDF})[self.partner.id]
+        self.assertFalse(entry.exists())
+        self.assertEqual(self._lookup(), new_entry)
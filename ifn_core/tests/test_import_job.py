@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import base64
+
+from odoo.tests import tagged
+
+from .common import IFNCommon
+
+IMPORT_CSV = """Nom,Email,Téléphone,Rôle,Marché
+Awa Import Test,awa.import@example.com,+225 0700000001,merchant,Marché Test Adjamé
+Kouassi Import Test,kouassi.import@example.com,+225 0700000002,producer,Marché Test Adjamé
+Awa Import Doublon,awa.import@example.com,+225 0700000003,merchant,Marché Test Adjamé
+"""
+
+
+@tagged('post_install', '-at_install')
+class TestImportJob(IFNCommon):
+    """Cycle de vie d'une tâche d'import : en attente, pré-passe, plages, clôture"""
+
+    def _launch(self, dry_run=False):
+        wizard = self.env['ifn.import.partner.wizard'].create({
+            'import_file': base64.b64encode(IMPORT_CSV.encode()),
+            'import_filename': 'partenaires.csv',
+        })
+        action = wizard.action_validate_import() if dry_run else wizard.action_import_partners()
+        return self.env['ifn.import.job'].browse(action['res_id'])
+
+    def _run_crons(self):
+        """Pré-passe et plages, puis clôture (déclenchée par la dernière plage)"""
+        Job = self.env['ifn.import.job']
+        Job._cron_process_import_jobs(time_budget=60)
+        Job._cron_process_import_jobs(time_budget=60)
+
+    def _imported_partners(self):
+        return self.env['res.partner'].search([
+            ('email', 'in', ['awa.import@example.com', 'kouassi.import@example.com']),
+        ])
+
+    def test_import_job_lifecycle(self):
+        job = self._launch()
+        self.assertEqual(job.state, 'queued')
+
+        self._run_crons()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.rows_expected, 3)
+        self.assertEqual(job.rows_done, 3)
+        self.assertEqual((job.imported_count, job.skipped_count, job.error_count), (2, 1, 0))
+        self.assertEqual(job.result_line_ids.mapped('status'), ['skipped'])
+        self.assertFalse(job.range_ids.filtered('rows_snapshot'), "Les instantanés des plages terminées sont supprimés")
+
+        partners = self._imported_partners()
+        self.assertEqual(len(partners), 2)
+        self.assertEqual(partners.x_ifn_market_id, self.market)
+        self.assertTrue(all(partners.mapped('x_ifn_qr')))
+        self.assertEqual(self.market.partner_count, 2, "Les effectifs sont recalés à la clôture")
+
+    def test_dry_run_writes_nothing(self):
+        partner_count = self.env['res.partner'].search_count([])
+        market_count = self.env['ifn.market'].search_count([])
+
+        job = self._launch(dry_run=True)
+        self._run_crons()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual((job.imported_count, job.skipped_count, job.error_count), (2, 1, 0))
+        self.assertEqual(self.env['res.partner'].search_count([]), partner_count)
+        self.assertEqual(self.env['ifn.market'].search_count([]), market_count)
+        self.assertFalse(self._imported_partners())
+
+    def test_import_after_dry_run(self):
+        dry_run = self._launch(dry_run=True)
+        self._run_crons()
+
+        action = dry_run.action_import_after_dry_run()
+        job = self.env['ifn.import.job'].browse(action['res_id'])
+        self.assertFalse(job.dry_run)
+        self.assertNotEqual(job.attachment_id, dry_run.attachment_id)
+        self._run_crons()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(len(self._imported_partners()), 2)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestImportRangeClaim(TransactionCase):
+    """Réservation concurrente des plages par les workers (FOR UPDATE SKIP LOCKED)
+
+    Les workers utilisent chacun leur curseur : la tâche et ses plages sont
+    validées (commit) pour leur être visibles, puis supprimées au nettoyage.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            attachment = env['ir.attachment'].create({
+                'name': 'plages.csv',
+                'raw': b'Nom\n',
+                'res_model': 'ifn.import.job',
+            })
+            job = env['ifn.import.job'].create({'attachment_id': attachment.id, 'state': 'running'})
+            ranges = env['ifn.import.job.range'].create([
+                {'job_id': job.id, 'row_start': 0, 'row_end': 100},
+                {'job_id': job.id, 'row_start': 100, 'row_end': 200},
+            ])
+            self.job_id, self.attachment_id, self.range_ids = job.id, attachment.id, ranges.ids
+        self.addCleanup(self._delete_job)
+
+    def _delete_job(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['ifn.import.job'].browse(self.job_id).unlink()
+            env['ir.attachment'].browse(self.attachment_id).unlink()
+
+    def test_workers_claim_distinct_ranges(self):
+        with self.registry.cursor() as cr_a, self.registry.cursor() as cr_b:
+            range_a = api.Environment(cr_a, SUPERUSER_ID, {})['ifn.import.job.range']._ifn_claim_range()
+            # Le worker A garde sa plage verrouillée : le worker B passe à la suivante sans attendre
+            range_b = api.Environment(cr_b, SUPERUSER_ID, {})['ifn.import.job.range']._ifn_claim_range()
+            self.assertEqual(range_a.id, self.range_ids[0])
+            self.assertEqual(range_b.id, self.range_ids[1])
+            cr_a.rollback()
+            cr_b.rollback()
+
+    def test_released_range_is_claimed_again(self):
+        with self.registry.cursor() as cr_a:
+            range_a = api.Environment(cr_a, SUPERUSER_ID, {})['ifn.import.job.range']._ifn_claim_range()
+            self.assertEqual(range_a.id, self.range_ids[0])
+            cr_a.rollback()
+        with self.registry.cursor() as cr_b:
+            range_b = api.Environment(cr_b, SUPERUSER_ID, {})['ifn.import.job.range']._ifn_claim_range()
+            self.assertEqual(range_b.id, self.range_ids[0], "Une réservation annulée libère la plage")
+            cr_b.rollback()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import IFNCommon
+
+
+@tagged('post_install', '-at_install')
+class TestMemberCounters(IFNCommon):
+    """Effectifs tenus par variations (deltas) : toujours égaux au recalage complet"""
+
+    def assertCounts(self, market_count, market_2_count, coop_members, coop_active_members):
+        self.env.invalidate_all()
+        self.assertEqual(self.market.partner_count, market_count)
+        self.assertEqual(self.market_2.partner_count, market_2_count)
+        self.assertEqual(self.coop.member_count, coop_members)
+        self.assertEqual(self.coop.active_member_count, coop_active_members)
+
+    def assertCountsReconciled(self, *counts):
+        """Effectifs attendus, inchangés par le recalage complet"""
+        self.assertCounts(*counts)
+        self.env['res.partner']._ifn_reconcile_member_counts()
+        self.assertCounts(*counts)
+
+    def test_deltas_match_reconciliation(self):
+        awa = self._create_partner('Awa Compteur', x_ifn_coop_id=self.coop.id)
+        kouassi = self._create_partner('Kouassi Compteur', x_ifn_coop_id=self.coop.id)
+        self._create_partner('Fanta Compteur')
+        self.assertCountsReconciled(3, 0, 2, 2)
+
+        # Changement de marché
+        kouassi.x_ifn_market_id = self.market_2
+        self.assertCountsReconciled(2, 1, 2, 2)
+
+        # Archivage : hors effectif du marché et des membres actifs, toujours membre
+        awa.active = False
+        self.assertCountsReconciled(1, 1, 2, 1)
+
+        # Réactivation et sortie de la coopérative, en un seul write sur le lot
+        (awa | kouassi).write({'active': True, 'x_ifn_coop_id': False})
+        self.assertCountsReconciled(2, 1, 0, 0)
+
+        kouassi.unlink()
+        self.assertCountsReconciled(2, 0, 0, 0)
+
+    def test_deferred_counters_are_reconciled(self):
+        Partner = self.env['res.partner'].with_context(ifn_defer_counters=True)
+        Partner.create([{
+            'name': f'Membre différé {index}',
+            'x_ifn_role': 'producer',
+            'x_ifn_market_id': self.market.id,
+            'x_ifn_coop_id': self.coop.id,
+        } for index in range(3)])
+        self.assertCounts(0, 0, 0, 0)
+
+        self.assertEqual(self.env['res.partner']._ifn_reconcile_member_counts(), 2,
+                         "Le marché et la coopérative ont dérivé")
+        self.assertCountsReconciled(3, 0, 3, 3)
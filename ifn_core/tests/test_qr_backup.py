@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+
+from odoo.tests import tagged
+
+from .common import IFNCommon
+from ..models.ifn_mixin import render_qr_image
+
+
+@tagged('post_install', '-at_install')
+class TestQRBackup(IFNCommon):
+    """Sauvegardes QR dédoublonnées par empreinte de l'image"""
+
+    def _set_qr(self, partners, qr_string):
+        partners.with_context(ifn_no_track=True).write({'x_ifn_qr': render_qr_image(qr_string)})
+
+    def test_backup_dedupe_on_checksum(self):
+        Backup = self.env['ifn.qr.backup']
+        awa = self._create_partner('Awa Sauvegarde')
+        kouassi = self._create_partner('Kouassi Sauvegarde')
+        self._set_qr(awa | kouassi, 'IFN-QR-TEST-1')
+
+        backups = Backup._ifn_backup_partners(awa | kouassi)
+        self.assertEqual(len(backups), 2, "Une ligne par partenaire")
+        self.assertEqual(len(backups.attachment_id), 1, "Une seule pièce jointe pour une même image")
+        raw = base64.b64decode(awa.x_ifn_qr)
+        self.assertEqual(set(backups.mapped('checksum')), {hashlib.sha1(raw).hexdigest()})
+
+        # Même image : rien n'est réindexé
+        self.assertFalse(Backup._ifn_backup_partners(awa | kouassi))
+
+        # Nouvelle image pour un partenaire : une ligne et une pièce jointe de plus
+        self._set_qr(awa, 'IFN-QR-TEST-2')
+        new_backups = Backup._ifn_backup_partners(awa | kouassi)
+        self.assertEqual(new_backups.partner_id, awa)
+        self.assertNotEqual(new_backups.attachment_id, backups.attachment_id)
+        self.assertEqual(Backup.search_count([('partner_id', 'in', (awa | kouassi).ids)]), 3)
+
+        # Retour à une image déjà sauvegardée pour ce partenaire : rien n'est réindexé
+        self._set_qr(awa, 'IFN-QR-TEST-1')
+        self.assertFalse(Backup._ifn_backup_partners(awa))
+
+        # Image déjà stockée pour un autre partenaire : nouvelle ligne, même pièce jointe
+        fanta = self._create_partner('Fanta Sauvegarde')
+        self._set_qr(fanta, 'IFN-QR-TEST-1')
+        fanta_backup = Backup._ifn_backup_partners(fanta)
+        self.assertEqual(fanta_backup.attachment_id, backups.attachment_id)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+
+from .common import IFNCommon
+
+
+@tagged('post_install', '-at_install')
+class TestZoneHierarchy(IFNCommon):
+    """Chemin matérialisé (parent_path) des zones et domaine de leur sous-arbre"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Zone = cls.env['ifn.zone']
+        cls.region = Zone.create({'name': 'Région Test', 'code': 'TSTREG', 'zone_type': 'administrative'})
+        cls.district = Zone.create({
+            'name': 'District Test', 'code': 'TSTDIS', 'parent_id': cls.region.id,
+            'market_ids': [(6, 0, cls.market.ids)],
+        })
+        cls.commune = Zone.create({'name': 'Commune Test', 'code': 'TSTCOM', 'parent_id': cls.district.id})
+        cls.archived = Zone.create({
+            'name': 'Zone Archivée Test', 'code': 'TSTARC', 'parent_id': cls.region.id,
+            'market_ids': [(6, 0, cls.market_2.ids)],
+            'active': False,
+        })
+
+    def test_parent_path(self):
+        self.assertEqual(self.region.parent_path, f'{self.region.id}/')
+        self.assertEqual(self.commune.parent_path, f'{self.region.id}/{self.district.id}/{self.commune.id}/')
+        self.assertEqual((self.region.level, self.district.level, self.commune.level), (0, 1, 2))
+
+        # Déplacer une zone met à jour le chemin de toute sa descendance
+        self.district.parent_id = False
+        self.assertEqual(self.commune.parent_path, f'{self.district.id}/{self.commune.id}/')
+        self.assertEqual(self.env['ifn.zone'].search([('id', 'child_of', self.region.ids)]), self.region)
+
+    def test_subtree_domain_matches_counters(self):
+        self._create_partner('Awa Zone')
+        self._create_partner('Kouassi Zone', x_ifn_market_id=self.market_2.id)
+        self._create_partner('Fanta Zone', x_ifn_market_id=self.market_2.id)
+
+        self.assertEqual(self.region.subtree_market_count, 2)
+        self.assertEqual(self.region.subtree_partner_count, 3)
+        domain = self.region.get_subtree_partner_domain()
+        self.assertEqual(self.env['res.partner'].search_count(domain), 3,
+                         "Les sous-zones archivées sont incluses, comme dans les compteurs")
+
+        self.assertEqual(self.district.subtree_partner_count, 1)
+        self.assertEqual(self.env['res.partner'].search_count(self.district.get_subtree_partner_domain()), 1)
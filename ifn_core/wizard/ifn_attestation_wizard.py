@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import base64
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
@@ -57,6 +56,7 @@ class IFNPartnerAttestationWizard(models.TransientModel):
     generated_count = fields.Integer('Attestations générées', readonly=True)
     error_count = fields.Integer('Erreurs', readonly=True)
     errors = fields.Text('Erreurs détaillées', readonly=True)
+    zip_attachment_id = fields.Many2one('ir.attachment', string='Archive ZIP', readonly=True)
 
     def action_generate_attestations(self):
         """Génère les attestations pour les partenaires sélectionnés"""
@@ -74,56 +74,39 @@ class IFNPartnerAttestationWizard(models.TransientModel):
             names = ', '.join(invalid_partners.mapped('name'))
             raise UserError(_('Les partenaires suivants n\'ont pas de UID ou un profil validé: %s') % names)
 
-        # Initialiser les compteurs
-        self.generated_count = 0
-        self.error_count = 0
-        self.errors = ''
-
-        # Générer les attestations
-        for partner in self.partner_ids:
-            try:
-                self._generate_single_attestation(partner)
-                self.generated_count += 1
-            except Exception as e:
-                self.error_count += 1
-                error_msg = f"Erreur pour {partner.name}: {str(e)}\n"
-                self.errors += error_msg
+        # Rendu par lots (une passe wkhtmltopdf par lot) et archive ZIP
+        rendered, zip_attachment, errors = self.env['ifn.attestation.renderer']._ifn_generate_attestations(
+            self.partner_ids,
+            self._get_template_ref(),
+            data=self._get_report_data(),
+            filename_func=self._generate_filename,
+        )
+        self.write({
+            'generated_count': len(rendered),
+            'error_count': len(errors),
+            'errors': '\n'.join(errors),
+            'zip_attachment_id': zip_attachment.id,
+        })
 
         # Afficher le résultat
         return self._show_generation_result()
 
-    def _generate_single_attestation(self, partner):
-        """Génère une attestation pour un partenaire"""
-        # Préparer le contexte du rapport
-        report_context = {
-            'wizard': self,
-            'partner': partner,
-            'attestation_data': self._prepare_attestation_data(partner),
-            'company': self.env.company,
-            'generation_date': fields.Date.today(),
-            'generation_time': fields.Datetime.now(),
+    def _get_report_data(self):
+        """Options transmises au rapport (sérialisables, partagées par tous les rendus)"""
+        return {
+            'options': {
+                'attestation_type': self.attestation_type,
+                'layout_template': self.layout_template,
+                'include_photo': self.include_photo,
+                'include_geo': self.include_geo,
+                'include_qr': self.include_qr,
+                'include_validation': self.include_validation,
+                'watermark': self.watermark,
+                'background_color': self.background_color,
+                'footer_text': self.footer_text,
+            },
         }
 
-        # Sélectionner le template selon le type et le layout
-        template_ref = self._get_template_ref()
-
-        # Générer le rapport
-        report = self.env.ref(template_ref)._render_qweb_pdf([partner.id], data=report_context)
-
-        # Créer un attachment avec l'attestation
-        filename = self._generate_filename(partner)
-
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'type': 'binary',
-            'datas': base64.b64encode(report[0]),
-            'res_model': 'res.partner',
-            'res_id': partner.id,
-            'description': f'Attestation IFN - {partner.name}',
-        })
-
-        return attachment
-
     def _get_template_ref(self):
         """Retourne la référence du template selon le type et layout"""
         template_mapping = {
@@ -191,21 +174,37 @@ class IFNPartnerAttestationWizard(models.TransientModel):
             }
         }
 
+    def action_download_all_attestations(self):
+        """Télécharge l'archive ZIP des attestations générées"""
+        self.ensure_one()
+        if self.generated_count == 0 or not self.zip_attachment_id:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Aucune attestation'),
+                    'message': _('Aucune attestation n\'a été générée'),
+                    'type': 'warning',
+                }
+            }
+
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.zip_attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
     def action_preview_attestation(self):
-        """Prévisualise l'attestation pour le premier partenaire"""
+        """Prévisualise l'attestation pour le premier partenaire (servie depuis le cache)"""
         if not self.partner_ids:
             raise UserError(_('Veuillez sélectionner au moins un partenaire'))
 
         partner = self.partner_ids[0]
+        attachment = self.env['ifn.attestation.renderer']._ifn_get_attestation_attachment(
+            partner, self._get_template_ref(), data=self._get_report_data())
 
         return {
-            'type': 'ir.actions.report',
-            'report_name': self._get_template_ref(),
-            'report_type': 'qweb-pdf',
-            'res_ids': [partner.id],
-            'data': {
-                'wizard_id': self.id,
-                'preview_mode': True,
-            },
-            'context': self.env.context,
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?access_token={attachment.generate_access_token()[0]}',
+            'target': 'new',
         }
\ No newline at end of file
@@ -2,9 +2,6 @@
 
 from odoo import models, fields, api, _
 import base64
-import io
-import qrcode
-import json
 import logging
 from datetime import datetime
 
@@ -26,8 +23,8 @@ class IFNQRRegenerateWizard(models.TransientModel):
                                   help='Génère une nouvelle référence QR pour chaque partenaire')
     update_generation_date = fields.Boolean('Mettre à jour date génération', default=True,
                                           help='Met à jour la date de génération du QR')
-    backup_existing = fields.Boolean='False', default=True,
-                              help='Sauvegarde les anciens QR codes avant régénération'
+    backup_existing = fields.Boolean('Sauvegarder anciens QR', default=True,
+                                     help='Sauvegarde les anciens QR codes avant régénération')
 
     # Filtres
     include_inactive = fields.Boolean('Inclure partenaires inactifs', default=False)
@@ -45,12 +42,13 @@ class IFNQRRegenerateWizard(models.TransientModel):
     market_filter_id = fields.Many2one('ifn.market', string='Filtrer par marché')
     coop_filter_id = fields.Many2one('ifn.coop', string='Filtrer par coopérative')
 
-    # Statistiques et résultats
+    # Statistiques et résultats (avancement de la tâche de fond)
     total_partners = fields.Integer('Total partenaires', readonly=True, compute='_compute_stats')
-    processed_count = fields.Integer('Nombre traité', readonly=True)
-    success_count = fields.Integer('Nombre réussi', readonly=True)
-    error_count = fields.Integer('Nombre erreur', readonly=True)
-    errors = fields.Text('Erreurs', readonly=True)
+    job_id = fields.Many2one('ifn.qr.regeneration.job', string='Tâche de régénération', readonly=True)
+    processed_count = fields.Integer(related='job_id.processed_count')
+    success_count = fields.Integer(related='job_id.success_count')
+    error_count = fields.Integer(related='job_id.error_count')
+    errors = fields.Text(related='job_id.errors')
 
     @api.depends('regenerate_all', 'partner_ids', 'role_filter', 'market_filter_id', 'coop_filter_id',
                  'include_inactive', 'include_unvalidated')
@@ -101,17 +99,16 @@ class IFNQRRegenerateWizard(models.TransientModel):
         return domain
 
     def action_regenerate_qr(self):
-        """Lance la régénération des QR codes"""
+        """Lance la régénération des QR codes en tâche de fond"""
         self.ensure_one()
 
-        # Obtenir la liste des partenaires
+        # Sélection des partenaires
         if self.regenerate_all:
             domain = self._get_partner_domain()
-            partners = self.env['res.partner'].search(domain)
         else:
-            partners = self.partner_ids
+            domain = [('id', 'in', self.partner_ids.ids)]
 
-        if not partners:
+        if not self.regenerate_all and not self.partner_ids:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -122,82 +119,20 @@ class IFNQRRegenerateWizard(models.TransientModel):
                 }
             }
 
-        # Initialiser les compteurs
-        self.processed_count = 0
-        self.success_count = 0
-        self.error_count = 0
-        self.errors = ''
-
-        # Traiter chaque partenaire
-        for partner in partners:
-            try:
-                self._regenerate_partner_qr(partner)
-                self.success_count += 1
-            except Exception as e:
-                self.error_count += 1
-                error_msg = f"Erreur pour {partner.name}: {str(e)}\n"
-                self.errors += error_msg
-                _logger.error(f"QR regeneration error for partner {partner.id}: {str(e)}")
-
-            self.processed_count += 1
-
-        # Afficher le résultat
-        return self._show_result()
-
-    def _regenerate_partner_qr(self, partner):
-        """Régénère le QR code pour un partenaire"""
-        partner.ensure_one()
-
-        # Sauvegarder l'ancien QR si demandé
-        if self.backup_existing and partner.x_ifn_qr:
-            self._backup_qr_code(partner)
-
-        # Générer le nouveau QR
-        partner._ifn_generate_qr()
-
-        # Mettre à jour les métadonnées
-        if self.update_generation_date:
-            partner.x_ifn_qr_generated_date = fields.Datetime.now()
-
-        # Logger l'action
-        self.env['ifn.audit.log'].log_action(
-            object_model='res.partner',
-            object_id=partner.id,
-            action='qr_regenerated',
-            details=f"QR code regenerated for partner {partner.name} (UID: {partner.x_ifn_uid})"
+        self.job_id = self.env['ifn.qr.regeneration.job']._ifn_enqueue(
+            domain,
+            backup_existing=self.backup_existing,
+            update_qr_ref=self.update_qr_ref,
+            update_generation_date=self.update_generation_date,
         )
 
-    def _backup_qr_code(self, partner):
-        """Crée une sauvegarde de l'ancien QR code"""
-        attachment_name = f"qr_backup_{partner.id}_{partner.x_ifn_uid}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-
-        self.env['ir.attachment'].create({
-            'name': attachment_name,
-            'type': 'binary',
-            'datas': partner.x_ifn_qr,
-            'res_model': 'res.partner',
-            'res_id': partner.id,
-            'description': f'Backup QR code for {partner.name} before regeneration',
-        })
-
-    def _show_result(self):
-        """Affiche le résultat de la régénération"""
-        if self.error_count == 0:
-            message = _('%s QR codes ont été régénérés avec succès') % self.success_count
-            notification_type = 'success'
-        else:
-            message = _('Régénération terminée: %s réussis, %s erreurs') % (self.success_count, self.error_count)
-            notification_type = 'warning'
-
         return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Régénération QR terminée'),
-                'message': message,
-                'type': notification_type,
-                'sticky': self.error_count > 0,
-            }
+            'type': 'ir.actions.act_window',
+            'name': _('Régénération QR en cours'),
+            'view_mode': 'form',
+            'res_model': 'ifn.qr.regeneration.job',
+            'res_id': self.job_id.id,
+            'target': 'current',
         }
 
     def action_export_errors(self):